@@ -1,23 +1,50 @@
+import time
+# Taken before the imports below, so the startup report covers all of them.
+IMPORT_STARTED = time.perf_counter()
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from git import Repo, GitCommandError
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from git import GitCommandError
 from .schema.user_request import UserStartRequest, UserChatRequest
 import os
+import json
 import shutil
-from langchain_core.messages import SystemMessage
-from .utils.ingest_repo import ingest_repo
-import stat
-from .utils.chat import SYSTEM_PROMPT,LLM_OUTPUT,format_file_symbol_table
+from .utils.ingest_repo import ingest_repo, update_repo, EMBEDDING_CACHE, FILE_CACHE, PARSED_TEXT_CACHE, DOCUMENT_PARSER
+from .utils.git_sync import head_commit, changed_files, checkout, remote_head, deadline_after, GitTimeout, GitCancelled
+from .utils.clone_strategy import clone_strategy
+from .utils.sessions import SessionStore, WORKSPACE_DIR
+from .utils.jobs import JobScheduler, JobError
+from .utils.registry import IndexRegistry
+from .utils.chat import SYSTEM_PROMPT,LLM_OUTPUT,LLM_OUTPUT_STREAM,QUERY_CLASSIFIER,ANSWER_CACHE
+from .utils.metrics import METRICS, cache_gauges
+from .utils.timing import stage
+from .utils.startup import startup_report
 from fastapi.middleware.cors import CORSMiddleware
 
 
-CHAT_HISTORY=[]
-FILE_SYMBOL_TABLE=[]
-file_table_str=""
+REGISTRY = IndexRegistry()
+SESSIONS = SessionStore(registry=REGISTRY)
+JOBS = JobScheduler()
+CLONER = clone_strategy()
+STARTUP = {}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    STARTUP.update(startup_report(IMPORT_STARTED, IMPORT_FINISHED))
+    logging.getLogger("uvicorn.error").info("Startup report: %s", json.dumps(STARTUP))
+    yield
+    DOCUMENT_PARSER.close()
+
+
 app = FastAPI(
     title="Codebase Chatbot API",
     description="Ask questions about code repos using RAG & Advanced LLM Reasoning.",
-    version="1"
+    version="1",
+    lifespan=lifespan
 )
 app.add_middleware(
     CORSMiddleware,
@@ -28,23 +55,6 @@ app.add_middleware(
 )
 
 
-def on_rm_error(func, path, exc_info):
-    if not os.access(path, os.W_OK):
-        os.chmod(path, stat.S_IWRITE)
-    func(path)
-
-def cleanup():
-    workspace_dir = os.path.abspath("workspace")
-    if os.path.exists(workspace_dir):
-        shutil.rmtree(workspace_dir, onerror=on_rm_error)
-    
-    chroma_code_path = os.path.abspath("/chroma_code_db")
-    chroma_noncode_path = os.path.abspath("/chroma_noncode_db")
-    for path in [chroma_code_path, chroma_noncode_path]:
-        if os.path.exists(path):
-            shutil.rmtree(path, onerror=on_rm_error)
-
-
 
 @app.get("/")
 def home():
@@ -60,68 +70,251 @@ def memory():
         "free_gb": round(free / (1024 ** 3), 2),
     }
 
-    workspace_dir = os.path.abspath("workspace")
-    files = []
-    for root, dirs, file_list in os.walk(workspace_dir):
-        for file in file_list:
-            file_path = os.path.join(root, file)
-            files.append(file_path)
-
     return JSONResponse(
         status_code=200,
         content={
             "disk": disk_info,
-            "files_in_workspace": files
+            "startup": STARTUP,
+            "workspace": workspace_stats(),
+            "embedding_cache": EMBEDDING_CACHE.stats(),
+            "file_cache": FILE_CACHE.stats(),
+            "parsed_text_cache": PARSED_TEXT_CACHE.stats(),
+            "sessions": SESSIONS.stats(),
+            "index_registry": REGISTRY.stats(),
+            "query_classifier": QUERY_CLASSIFIER.stats(),
+            "answer_cache": ANSWER_CACHE.stats(),
         }
     )
 
-    
+
+def workspace_stats():
+    # Totals come from the scan reports of the indexes in memory, so nothing is walked.
+    checkouts = sum(1 for entry in os.scandir(WORKSPACE_DIR) if entry.is_dir()) if os.path.isdir(WORKSPACE_DIR) else 0
+    repos = SESSIONS.repos_snapshot()
+    return {
+        "checkouts": checkouts,
+        "indexed_repos": sum(1 for repo in repos if repo.ready),
+        "indexed_files": sum(repo.scan_report.files_kept for repo in repos if repo.scan_report),
+        "indexed_bytes": sum(repo.scan_report.bytes_kept for repo in repos if repo.scan_report),
+    }
+
+
+@app.get('/metrics')
+def metrics():
+    classifier = QUERY_CLASSIFIER.stats()
+    caches = {
+        "embedding": EMBEDDING_CACHE.stats(),
+        "file": FILE_CACHE.stats(),
+        "parsed_text": PARSED_TEXT_CACHE.stats(),
+        "answer": ANSWER_CACHE.stats(),
+        "index_registry": REGISTRY.stats(),
+        "query_classifier": {
+            "hits": classifier["fast_path"] + classifier["memo_hits"],
+            "misses": classifier["llm_fallbacks"],
+            "hit_rate": classifier["fast_path_hit_rate"],
+        },
+    }
+    sessions = SESSIONS.stats()
+    gauges = cache_gauges(caches) + [
+        ("sessions", "Live chat sessions.", [({}, sessions["sessions"])]),
+        ("repos", "Repository indexes held in memory.", [({}, sessions["repos"])]),
+    ]
+    if STARTUP:
+        gauges.append(("startup_import_seconds", "Time taken to import the app.", [({}, STARTUP["import_seconds"])]))
+    return PlainTextResponse(METRICS.render(gauges), media_type="text/plain; version=0.0.4")
+
+
 
 
 @app.post("/init-chat")
 def init(request : UserStartRequest):
-    CHAT_HISTORY.clear()
-    global FILE_SYMBOL_TABLE
-    global file_table_str
-    FILE_SYMBOL_TABLE.clear()
-    CHAT_HISTORY.append(SystemMessage(content=SYSTEM_PROMPT))
+    repo_url = str(request.repo_url)
+    # The pin keeps the index alive until its ingest job finishes, even if every session on it expires.
+    repo = SESSIONS.acquire_repo(repo_url)
+    session = SESSIONS.create(repo, SYSTEM_PROMPT)
+    job, created = JOBS.submit(repo_url, lambda job: prepare_repo(repo, job))
+    if not created:
+        SESSIONS.release_repo(repo)
+    return {
+        "message": "Repository ingestion started",
+        "job_id": job.id,
+        "session_id": session.id
+    }
+
 
-    repo_url = request.repo_url
-    repo_name = str(repo_url).rstrip("/").split("/")[-1]
+@app.get("/jobs/{job_id}")
+def job_status(job_id : str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
 
-    cleanup()
 
-    workspace_dir = os.path.abspath("workspace")
-    new_repo_path = os.path.join(workspace_dir, repo_name)
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id : str):
+    job = JOBS.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
 
+
+def prepare_repo(repo, job):
     try:
-        Repo.clone_from(repo_url, new_repo_path, depth=1)
-        FILE_SYMBOL_TABLE=ingest_repo(new_repo_path)
-        file_table_str = format_file_symbol_table(FILE_SYMBOL_TABLE)
-        return {
-            "message": "Repository cloned successfully",
-            "local_path": new_repo_path
-        }
+        with repo.lock:
+            if job.cancelled.is_set():
+                raise GitCancelled("cancelled before it started")
+            if repo.ready:
+                return refresh(repo, job)
+            job.phase("resolve")
+            commit = remote_head(repo.repo_url, job.cancelled)
+            entry = REGISTRY.lookup(repo.repo_url, commit) if commit else None
+            if entry is not None:
+                # Built before at this exact commit: attach instead of cloning and embedding again.
+                with stage("registry_load"):
+                    repo.attach(entry, REGISTRY.load_state(entry))
+                return {
+                    "message": "Repository index loaded from cache",
+                    "local_path": repo.path,
+                    "commit": repo.commit
+                }
+            job.phase("clone")
+            repo.remove_checkout()
+            with stage("clone"):
+                CLONER.clone(repo.repo_url, repo.path, commit, job.cancelled)
+            with stage("ingest", mode="full"):
+                ingest_repo(repo.path, repo, progress=job)
+            job.phase("persist")
+            repo.commit = head_commit(repo.path)
+            REGISTRY.register(repo, SESSIONS.repo_keys())
+            return {
+                "message": "Repository cloned successfully",
+                "local_path": repo.path,
+                "scan": repo.scan_report.to_dict()
+            }
+    except GitTimeout:
+        raise JobError(504, f"Git timed out after {CLONER.timeout}s")
+    except GitCancelled:
+        raise JobError(409, "Job cancelled")
     except GitCommandError as e:
-        if "not found" in str(e).lower():
-            raise HTTPException(status_code=404, detail="Repository not found or private")
+        if "not found" in str(e).lower() or "could not read username" in str(e).lower():
+            raise JobError(404, "Repository not found or private")
         elif "authentication" in str(e).lower():
-            raise HTTPException(status_code=401, detail="Authentication failed")
+            raise JobError(401, "Authentication failed")
         else:
-            raise HTTPException(status_code=400, detail=f"Git error: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
-    
-    
+            raise JobError(400, f"Git error: {str(e)}")
+    finally:
+        SESSIONS.release_repo(repo)
+
+
+def refresh(repo, job):
+    job.phase("clone")
+    with stage("fetch"):
+        new_commit = CLONER.fetch(repo.repo_url, repo.path, job.cancelled)
+    changed, removed = [], []
+    scan = None
+    if new_commit != repo.commit:
+        changed, removed = changed_files(repo.path, repo.commit, new_commit)
+        checkout(repo.path, new_commit, deadline_after(CLONER.timeout), job.cancelled)
+        with stage("ingest", mode="incremental"):
+            update_repo(changed, removed, repo, progress=job)
+        job.phase("persist")
+        repo.commit = new_commit
+        REGISTRY.register(repo, SESSIONS.repo_keys())
+        scan = repo.scan_report.to_dict()
+    return {
+        "message": "Repository updated incrementally",
+        "local_path": repo.path,
+        "changed_files": len(changed),
+        "removed_files": len(removed),
+        "scan": scan
+    }
+
+
 
 @app.post("/start-chat")
 def start(request : UserChatRequest):
+    session = SESSIONS.get(request.session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session, please initialise the repo again")
+    if not session.repo.ready:
+        raise HTTPException(status_code=409, detail="Repository is still being ingested")
     query = request.query
     try:
-        result = LLM_OUTPUT(query,CHAT_HISTORY,FILE_SYMBOL_TABLE,file_table_str)
+        with session.lock:
+            result = LLM_OUTPUT(query,session.chat_history,session.repo,request.k,not request.bypass_cache)
         return {
             "message": result,
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
-   
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# How long a streamed question waits for the previous turn of its session before giving up with 409.
+SESSION_BUSY_TIMEOUT_SECONDS = float(os.getenv("SESSION_BUSY_TIMEOUT_SECONDS", "30"))
+
+
+async def acquire_turn(session, timeout=SESSION_BUSY_TIMEOUT_SECONDS):
+    """Takes the session's turn lock without tying up a thread. It polls, so a request
+    cancelled while waiting can never end up holding the lock."""
+    deadline = time.monotonic() + timeout
+    while not session.lock.acquire(blocking=False):
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+class TurnStream(StreamingResponse):
+    """Streams an answer while holding its session's turn lock, which is released
+    however the response ends: finished, failed or cut off by the client."""
+
+    def __init__(self, content, session, **kwargs):
+        super().__init__(content, **kwargs)
+        self.session = session
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                # Runs the generator's own cleanup now rather than whenever it is collected.
+                await self.body_iterator.aclose()
+            finally:
+                self.session.lock.release()
+
+
+@app.post("/start-chat/stream")
+async def start_stream(request : UserChatRequest):
+    session = await run_in_threadpool(SESSIONS.get, request.session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session, please initialise the repo again")
+    if not session.repo.ready:
+        raise HTTPException(status_code=409, detail="Repository is still being ingested")
+    if not await acquire_turn(session):
+        raise HTTPException(status_code=409, detail="The previous question in this session is still being answered")
+
+    async def events():
+        try:
+            message = ""
+            async for token in LLM_OUTPUT_STREAM(request.query, session.chat_history, session.repo, request.k, not request.bypass_cache):
+                message += token
+                yield sse("token", {"token": token})
+            yield sse("done", {"message": message})
+        except Exception as e:
+            yield sse("error", {"detail": f"Internal error: {str(e)}"})
+
+    # Nothing between taking the lock and handing it to the response can fail or be cancelled.
+    return TurnStream(
+        events(),
+        session,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Taken last, so the startup report's import time ends here rather than when the server starts.
+IMPORT_FINISHED = time.perf_counter()
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel, HttpUrl, Field, field_validator
 
 class UserStartRequest(BaseModel):
@@ -22,8 +23,22 @@ class UserStartRequest(BaseModel):
 
 
 class UserChatRequest(BaseModel):
+    session_id : str = Field(
+        ...,
+        description="Session ID returned by /init-chat",
+    )
     query : str = Field(
         ...,
         description="Your Question about the repo",
         example="What is this repo about ?"
+    )
+    k : Optional[int] = Field(
+        None,
+        ge=1,
+        le=20,
+        description="Chunks to retrieve per store for code questions (default 3)",
+    )
+    bypass_cache : bool = Field(
+        False,
+        description="Skip the shared answer cache and generate a fresh answer",
     )
\ No newline at end of file
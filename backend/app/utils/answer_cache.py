@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .query_classifier import normalise
+
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+# Entries hold the retrieved context too, which is most of their size.
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(64 * 1024 ** 2)))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+# Cosine similarity a new question needs to reuse the answer to an earlier one.
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+# Answers to these do not depend on the conversation so far, so they can be shared across sessions.
+CACHEABLE_CATEGORIES = {"GENERAL", "FILE", "FUNCTION&CLASS"}
+
+
+class CachedAnswer:
+    def __init__(self, query, category, answer, context, vector):
+        self.query = query
+        self.category = category
+        self.answer = answer
+        self.context = context
+        self.vector = vector
+        self.created = time.monotonic()
+        self.size = len(answer.encode("utf-8", errors="ignore")) + len(context.encode("utf-8", errors="ignore"))
+
+
+class AnswerCache:
+    """Answers to history-independent questions, shared by every session on the
+    same repo commit. A question hits on its normalised text, or else on the
+    closest earlier question whose embedding is at least `similarity` alike.
+    Entries expire `ttl_seconds` after they were stored, however often they are
+    hit; past `max_entries` or `max_bytes` the least recently used go first."""
+
+    def __init__(self, embeddings, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+                 similarity=ANSWER_CACHE_SIMILARITY, enabled=ANSWER_CACHE_ENABLED, max_bytes=ANSWER_CACHE_MAX_BYTES):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self.enabled = enabled
+        # (scope, normalised query) -> CachedAnswer, oldest use first.
+        self.entries = OrderedDict()
+        # The same keys, oldest stored first: hits reorder `entries` but not this.
+        self.by_age = OrderedDict()
+        self.total_bytes = 0
+        # scope -> its keys in `entries`, so a lookup only compares questions about the same commit.
+        self.by_scope = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def scope(repo, k=None):
+        # The commit pins the answer to the code it was given; k changes what RAG retrieves.
+        return (repo.repo_url, repo.commit, k)
+
+    def _vector(self, query):
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self):
+        now = time.monotonic()
+        while self.by_age:
+            key = next(iter(self.by_age))
+            if now - self.entries[key].created < self.ttl_seconds:
+                break
+            self._remove(key)
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        self.total_bytes -= self.entries.pop(key).size
+        del self.by_age[key]
+        keys = self.by_scope[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.by_scope[key[0]]
+
+    def get(self, query, repo, k=None):
+        """(answer, context) for an earlier equivalent question, or None."""
+        if not self.enabled or repo.commit is None:
+            return None
+        scope = self.scope(repo, k)
+        key = (scope, normalise(query))
+        with self.lock:
+            self._expire()
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry.answer, entry.context
+            candidates = [(other, self.entries[other]) for other in self.by_scope.get(scope, ())]
+        if candidates:
+            vector = self._vector(query)
+            scores = np.stack([entry.vector for _, entry in candidates]) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity:
+                best_key, entry = candidates[best]
+                with self.lock:
+                    # Embedding ran without the lock, so the entry may have been replaced or expired since.
+                    if self.entries.get(best_key) is entry and time.monotonic() - entry.created < self.ttl_seconds:
+                        self.entries.move_to_end(best_key)
+                        self.hits += 1
+                        self.similar_hits += 1
+                        return entry.answer, entry.context
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, query, category, answer, context, repo, k=None):
+        if not self.enabled or repo.commit is None or category not in CACHEABLE_CATEGORIES or not answer:
+            return
+        key = (self.scope(repo, k), normalise(query))
+        entry = CachedAnswer(query, category, answer, context, self._vector(query))
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = entry
+            self.by_age[key] = entry
+            self.total_bytes += entry.size
+            self.by_scope.setdefault(key[0], set()).add(key)
+            self._expire()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
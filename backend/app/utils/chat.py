@@ -1,12 +1,21 @@
-from langchain_openai import ChatOpenAI
 from app.schema.model_outputs import ClassificationOutput, MultipleFilesSelection, SingleFileSelection
 from langchain_core.prompts import PromptTemplate
-from app.utils.ingest_repo import NONCODE_VECTOR_STORE_RETRIVER,CODE_VECTOR_STORE_RETRIEVER,validate_and_read_file
+from app.utils.symbol_index import read_lines
+from app.utils.query_classifier import QueryClassifier
+from app.utils.file_selection import shortlist_files, directory_summary, format_shortlist
+from app.utils.context_budget import assemble_file_context
+from app.utils.answer_cache import AnswerCache
+from app.utils.lexical_index import RETRIEVAL_POOL
+from app.utils.ingest_repo import CODE_EMBEDDING_MODEL
+import os
+import time
+from fastapi.concurrency import run_in_threadpool
 from langchain_core.runnables import RunnableLambda,RunnableBranch
-from langchain_core.messages import HumanMessage, AIMessage
+from app.utils.history import fallback_summary
+from app.utils.models import chat_model, structured_model
+from app.utils.timing import stage, observe
 
 
-CHAT_MODEL = ChatOpenAI(model="provider-3/gpt-4.1-nano")
 SYSTEM_PROMPT ="""
 You are an expert AI assistant specialized in answering questions about a GitHub code repository.
 Your tasks include:
@@ -28,7 +37,6 @@ Be precise, technical, and helpful in your answers.
 """
 
 
-classification_model = ChatOpenAI(model="provider-3/gpt-4.1-nano").with_structured_output(ClassificationOutput)
 classification_prompt = PromptTemplate.from_template("""
 You are a classifier that analyzes software engineering user questions about a github code repository.
 Classify each question into exactly one of these categories: GENERAL, FILE, FUNCTION&CLASS, FOLLOWUP.
@@ -95,7 +103,11 @@ A user has asked the following question:
 {query}
 
 Your task is to decide which specific files from the repository are relevant to answering this question.
-Below is the list of all available files in the repository, each assigned a unique index:
+Below is an overview of the repository's directory layout:
+
+{directory_summary}
+
+And a shortlist of candidate files from the repository, each assigned a unique index:
 
 {file_symbol_table}
 
@@ -106,7 +118,6 @@ Instructions:
     {{ "file_indices": [1, 5, 8] }}    OR    {{ "file_indices": [-1] }}
 - Do NOT include any explanation or extra text. Only the JSON object with numeric values.
 """)
-relevant_multiple_files_model = ChatOpenAI(model="provider-3/gpt-4.1-nano").with_structured_output(MultipleFilesSelection)
 
 
 
@@ -126,11 +137,37 @@ Your task is to:
 {{ "file_index": 3 }}     OR    {{ "file_index": -1 }}
 - Do NOT include any explanation or extra text. Only the JSON object with an integer value.
 """)
-relevant_single_file_model = ChatOpenAI(model="provider-3/gpt-4.1-nano").with_structured_output(SingleFileSelection)
 
 
 
 
+summary_prompt = PromptTemplate.from_template("""
+You are maintaining a running summary of a conversation between a user and an assistant about a GitHub code repository.
+Update the existing summary with the new exchanges below. Keep file names, function and class names, decisions and open questions.
+Write at most 200 words of plain prose. Return only the updated summary.
+
+EXISTING SUMMARY:
+{summary}
+
+NEW EXCHANGES:
+{exchanges}
+""")
+
+
+def format_exchanges(turns):
+    return "\n".join(f"User: {question}\nAssistant: {answer}\n" for question, answer, _ in turns)
+
+
+def summarise(summary, turns):
+    prompt = summary_prompt.invoke({"summary": summary or "(none)", "exchanges": format_exchanges(turns)})
+    return chat_model().invoke(prompt).content.strip() or fallback_summary(summary, turns)
+
+
+async def asummarise(summary, turns):
+    prompt = summary_prompt.invoke({"summary": summary or "(none)", "exchanges": format_exchanges(turns)})
+    return (await chat_model().ainvoke(prompt)).content.strip() or fallback_summary(summary, turns)
+
+
 final_prompt = PromptTemplate.from_template("""
 USER QUESTION: {query}
 
@@ -151,15 +188,105 @@ def format_file_symbol_table(symbol_table):
 
 
 
+MAX_DEFINITION_LINES = 200
+
+
+def symbol_context(user_query, symbol_index):
+    names = symbol_index.find_in_query(user_query)
+    if not names:
+        return None
+
+    output = "SYMBOL DEFINITIONS:-----\n"
+    ind = 1
+    for name in names[:3]:
+        for symbol in symbol_index.lookup(name)[:3]:
+            end_line = min(symbol["end_line"], symbol["start_line"] + MAX_DEFINITION_LINES - 1)
+            content = read_lines(symbol["file"], symbol["start_line"], end_line)
+            output+=f"""{ind}.  {symbol['kind']} {symbol['name']}  File: {symbol['file']} (lines {symbol['start_line']}-{symbol['end_line']})\n Content:-\n{content}\n"""
+            ind+=1
+
+    output+="\nCALLERS:-----\n"
+    ind = 1
+    for name in names[:3]:
+        for path, line, enclosing in symbol_index.callers(name):
+            where = f"in {enclosing['kind']} {enclosing['name']}" if enclosing else "at module level"
+            content = read_lines(path, max(1, line - 3), line + 3)
+            output+=f"""{ind}.  {name} called {where}  File: {path} (line {line})\n Content:-\n{content}\n"""
+            ind+=1
+    if ind == 1:
+        output+="No Callers Found\n"
+    return output
+
+
+GENERAL_VECTOR_PREFILTER = os.getenv("GENERAL_VECTOR_PREFILTER", "1") == "1"
+RAG_K = 3
+GENERAL_PREFILTER_K = 10
+
+
+def vector_search(user_query, REPO, k, prefetch=None):
+    """(code docs, non-code docs) for the query, searching both stores at once."""
+    prefetched = prefetch is not None and prefetch.k >= k
+    with stage("vector_search", source="prefetch" if prefetched else "direct"):
+        if prefetched:
+            code_results, non_code_results = prefetch.vectors()
+            return code_results[:k], non_code_results[:k]
+        # Only one search goes to the pool; the other runs on the calling thread.
+        code_future = RETRIEVAL_POOL.submit(REPO.code_retriever.get_relevant_documents, user_query, k=k)
+        non_code_results = REPO.noncode_retriever.get_relevant_documents(user_query, k=k)
+        return code_future.result(), non_code_results
+
+
+class Prefetch:
+    """Cheap retrieval started while the LLM classifier is still running: both vector
+    searches, the exact symbol lookup and filename resolution. Whatever the chosen
+    branch does not ask for is cancelled or simply dropped."""
+
+    def __init__(self, user_query, REPO, k=None):
+        self.k = max(k or RAG_K, GENERAL_PREFILTER_K if GENERAL_VECTOR_PREFILTER else 0)
+        self.futures = {
+            "code": RETRIEVAL_POOL.submit(REPO.code_retriever.get_relevant_documents, user_query, k=self.k),
+            "non_code": RETRIEVAL_POOL.submit(REPO.noncode_retriever.get_relevant_documents, user_query, k=self.k),
+            "symbols": RETRIEVAL_POOL.submit(symbol_context, user_query, REPO.symbol_index),
+            "files": RETRIEVAL_POOL.submit(REPO.file_index.resolve, user_query),
+        }
+
+    def vectors(self):
+        return self.futures["code"].result(), self.futures["non_code"].result()
+
+    def symbols(self):
+        return self.futures["symbols"].result()
+
+    def files(self):
+        return self.futures["files"].result()
+
+    def cancel(self):
+        for future in self.futures.values():
+            future.cancel()
+
+
+def chunk_location(metadata):
+    # Chunks indexed before structure-aware chunking carry no line range.
+    if "start_line" not in metadata:
+        return ""
+    where = f" (lines {metadata['start_line']}-{metadata['end_line']}"
+    return where + (f", {metadata['symbols'].replace(',', ', ')})" if metadata.get("symbols") else ")")
+
+
 def RAG(inputs):
     user_query = inputs["query"]
+    REPO = inputs["REPO"]
+    prefetch = inputs.get("PREFETCH")
+    # A question naming a known function or class is answered from its definition directly.
+    exact = prefetch.symbols() if prefetch else symbol_context(user_query, REPO.symbol_index)
+    if exact is not None:
+        return exact
+
     output = "CODE RELATED CONTEXT:-----\n"
-    code_results = CODE_VECTOR_STORE_RETRIEVER.get_relevant_documents(user_query,k=3)
-    non_code_results= NONCODE_VECTOR_STORE_RETRIVER.get_relevant_documents(user_query,k=3)
+    code_results, non_code_results = vector_search(user_query, REPO, inputs.get("K") or RAG_K, prefetch)
 
     if(len(code_results)!=0):
         for ind,doc in enumerate(code_results,1):
-            output+=f"""{ind}.  File: {doc.metadata['file_path']}\n Content:-\n{doc.page_content}\n"""
+            output+=f"""{ind}.  File: {doc.metadata['file_path']}{chunk_location(doc.metadata)}\n Content:-\n{doc.page_content}\n"""
     else:
         output+="No Code Files Are There\n"
 
@@ -177,65 +304,122 @@ rag_runnable = RunnableLambda(RAG)
 def comman_chain(inputs):
     prompt = final_prompt.invoke(inputs).text
     CHAT_HISTORY = inputs["CHAT_HISTORY"]
-    CHAT_HISTORY.append(HumanMessage(content=prompt))
-    result = CHAT_MODEL.invoke(CHAT_HISTORY).content
+    result = chat_model().invoke(CHAT_HISTORY.messages(prompt)).content
     return result
 comman_chain_runnable = RunnableLambda(comman_chain)
 
 
 def follow_up(inputs):
+    # History only keeps questions and answers, so the previous turn's context is passed on again.
+    previous = inputs["CHAT_HISTORY"].last_context
+    if previous and previous not in ("No Context Needed.", "No Context Needed"):
+        return previous
     return "A follow-up question is asked, No context Needed."
 follow_up_runnable = RunnableLambda(follow_up)
     
 
+def general_candidates(user_query, REPO, prefetch=None):
+    vector_hits = []
+    if GENERAL_VECTOR_PREFILTER:
+        code_results, non_code_results = vector_search(user_query, REPO, GENERAL_PREFILTER_K, prefetch)
+        for doc in code_results + non_code_results:
+            ind = REPO.file_index.index_of(doc.metadata["file_path"])
+            if ind is not None:
+                vector_hits.append(ind)
+    return shortlist_files(user_query, REPO.file_index, vector_hits)
+
+
 def GENERAL(inputs):
-    general_chain = relevant_multiple_files_prompt | relevant_multiple_files_model 
-    relevant_files = general_chain.invoke(inputs).file_indices
-    output = ""
+    REPO = inputs["REPO"]
     FILES_SYMBOL_TABLE = inputs["FILES_DATA"]
-    cnt=1
+    # Only a bounded shortlist reaches the LLM, so the prompt does not grow with the repo.
+    shortlist, candidates = format_shortlist(general_candidates(inputs["query"], REPO, inputs.get("PREFETCH")), REPO.file_index)
+    general_chain = relevant_multiple_files_prompt | structured_model(MultipleFilesSelection)
+    with stage("select_files", category="GENERAL"):
+        relevant_files = general_chain.invoke({
+            "query":inputs["query"],
+            "directory_summary":directory_summary(REPO.file_index),
+            "file_symbol_table":shortlist
+        }).file_indices
+    if(len(relevant_files)==0 or relevant_files[0]==-1):
+        return "No Context Needed."
+    paths = [FILES_SYMBOL_TABLE[candidates[file_ind-1]]['path'] for file_ind in relevant_files if 0 <= file_ind-1 < len(candidates)]
+    # File contents are cut to the parts relevant to the query once they exceed the token budget.
+    return assemble_file_context(inputs["query"], list(dict.fromkeys(paths)))
 
-    if(relevant_files[0]==-1):
-        output = "No Context Needed."
-    else:
-        for file_ind in (relevant_files):
-            if(file_ind - 1 <0 or file_ind-1 >= len(FILES_SYMBOL_TABLE) ):
-                continue
-            else:
-                content,filename = validate_and_read_file(FILES_SYMBOL_TABLE[file_ind-1]['path'])
-                if(content==None):
-                    continue
-                output+=f"""{cnt}.  Filename: {filename} \nContents:-\n{content}\n"""
-                cnt+=1
+general_runnable = RunnableLambda(GENERAL)
 
-    return output
 
-general_runnable = RunnableLambda(GENERAL)
 
+MAX_FILE_CANDIDATES = 10
 
 
 def single_file(inputs):
-    single_file_chain = relevant_single_file_prompt | relevant_single_file_model
-    relevant_files = single_file_chain.invoke(inputs).file_index
-    output = ""
     FILES_SYMBOL_TABLE = inputs["FILES_DATA"]
-    if(relevant_files == -1):
-        output = "No Context Needed."
-    else:
-        if(relevant_files-1 <0 or relevant_files-1>= len(FILES_SYMBOL_TABLE)):
-            output=""
-        else:
-            content,filename = validate_and_read_file(FILES_SYMBOL_TABLE[relevant_files-1]['path'])
-            if(content!=None):
-                output+=f"""1.  Filename: {filename} \nContents:-\n{content}\n"""
-
-    return output
+    REPO = inputs["REPO"]
+    # Resolved locally from the file index; the LLM only breaks ties between a few candidates.
+    prefetch = inputs.get("PREFETCH")
+    candidates = (prefetch.files() if prefetch else REPO.file_index.resolve(inputs["query"]))[:MAX_FILE_CANDIDATES]
+    if(len(candidates)==0):
+        return "No Context Needed."
+
+    relevant_file = candidates[0]
+    if(len(candidates)>1):
+        single_file_chain = relevant_single_file_prompt | structured_model(SingleFileSelection)
+        shortlist = format_file_symbol_table([FILES_SYMBOL_TABLE[i] for i in candidates])
+        with stage("select_files", category="FILE"):
+            choice = single_file_chain.invoke({"query":inputs["query"],"file_symbol_table":shortlist}).file_index
+        if(choice-1 <0 or choice-1>= len(candidates)):
+            return "No Context Needed."
+        relevant_file = candidates[choice-1]
+
+    return assemble_file_context(inputs["query"], [FILES_SYMBOL_TABLE[relevant_file]['path']])
 single_file_runnable = RunnableLambda(single_file)
 
 
 
 
-classification_chain = classification_prompt | classification_model
+def classification_chain():
+    return classification_prompt | structured_model(ClassificationOutput)
+
+
+QUERY_CLASSIFIER = QueryClassifier()
+# Query embeddings land in the embedding cache, so retrieval for a miss does not embed the query twice.
+ANSWER_CACHE = AnswerCache(CODE_EMBEDDING_MODEL)
+
+
+def cached_answer(query,REPO,k=None):
+    """(answer, context) for an equivalent earlier question about the same commit, or None.
+    Anything that reads as a follow-up depends on this conversation, so it never hits."""
+    category, confidence = QUERY_CLASSIFIER.guess(query,REPO)
+    if category == "FOLLOWUP" and confidence >= QUERY_CLASSIFIER.threshold:
+        return None
+    with stage("answer_cache"):
+        return ANSWER_CACHE.get(query,REPO,k)
+
+
+# Both return (category, prefetch). Retrieval is only speculated when the LLM has to
+# classify; a local fast-path answer is instant and leaves nothing to overlap with.
+def classify(query,REPO,k=None):
+    category = QUERY_CLASSIFIER.fast_path(query,REPO)
+    prefetch = None
+    if category is None:
+        prefetch = Prefetch(query,REPO,k)
+        with stage("classify_llm"):
+            category = classification_chain().invoke({"query":query}).label.value
+        QUERY_CLASSIFIER.remember(query,REPO,category)
+    return category, prefetch
+
+
+async def aclassify(query,REPO,k=None):
+    category = QUERY_CLASSIFIER.fast_path(query,REPO)
+    prefetch = None
+    if category is None:
+        prefetch = Prefetch(query,REPO,k)
+        with stage("classify_llm"):
+            category = (await classification_chain().ainvoke({"query":query})).label.value
+        QUERY_CLASSIFIER.remember(query,REPO,category)
+    return category, prefetch
 
 branched_chain = RunnableBranch(
         (lambda inputs: inputs["category"] == "FUNCTION&CLASS", rag_runnable),
@@ -246,12 +430,66 @@ branched_chain = RunnableBranch(
 )
 
 
-def LLM_OUTPUT(query,CHAT_HISTORY,FILE_SYMBOL_TABLE,file_table_str):
-    classification_result = classification_chain.invoke({"query":query}).label.value
-    INPUTS = {"category":classification_result,"query":query,"CHAT_HISTORY":CHAT_HISTORY,"file_symbol_table":file_table_str,"FILES_DATA":FILE_SYMBOL_TABLE}
-    context = branched_chain.invoke(INPUTS)
+def LLM_OUTPUT(query,CHAT_HISTORY,REPO,k=None,use_cache=True):
+    cached = cached_answer(query,REPO,k) if use_cache else None
+    if cached is not None:
+        # No compaction on a hit, so it makes no LLM call at all; the next miss catches up.
+        CHAT_HISTORY.add_turn(query, *cached)
+        return cached[0]
+    with stage("classify"):
+        classification_result, prefetch = classify(query,REPO,k)
+    INPUTS = {"category":classification_result,"query":query,"CHAT_HISTORY":CHAT_HISTORY,"FILES_DATA":REPO.file_symbol_table,"REPO":REPO,"PREFETCH":prefetch,"K":k}
+    try:
+        with stage("retrieve", category=classification_result):
+            context = branched_chain.invoke(INPUTS)
+    finally:
+        if prefetch is not None:
+            prefetch.cancel()
     INPUTS["context"]=context
-    result = comman_chain_runnable.invoke(INPUTS)
-    CHAT_HISTORY.append(AIMessage(content=result))
+    with stage("generate"):
+        result = comman_chain_runnable.invoke(INPUTS)
+    CHAT_HISTORY.add_turn(query, result, context)
+    # Stored even when the cache was bypassed, so a forced refresh replaces the old answer.
+    ANSWER_CACHE.put(query, classification_result, result, context, REPO, k)
+    with stage("summarise"):
+        CHAT_HISTORY.compact(summarise)
     return result
 
+
+async def LLM_OUTPUT_STREAM(query,CHAT_HISTORY,REPO,k=None,use_cache=True):
+    # Both cache calls embed the query, which must not hold up the event loop.
+    cached = await run_in_threadpool(cached_answer,query,REPO,k) if use_cache else None
+    if cached is not None:
+        CHAT_HISTORY.add_turn(query, *cached)
+        yield cached[0]
+        return
+    with stage("classify"):
+        classification_result, prefetch = await aclassify(query,REPO,k)
+    INPUTS = {"category":classification_result,"query":query,"CHAT_HISTORY":CHAT_HISTORY,"FILES_DATA":REPO.file_symbol_table,"REPO":REPO,"PREFETCH":prefetch,"K":k}
+    try:
+        with stage("retrieve", category=classification_result):
+            context = await branched_chain.ainvoke(INPUTS)
+    finally:
+        if prefetch is not None:
+            prefetch.cancel()
+    INPUTS["context"]=context
+    prompt = final_prompt.invoke(INPUTS).text
+    result = ""
+    started = time.perf_counter()
+    first = True
+    try:
+        async for chunk in chat_model().astream(CHAT_HISTORY.messages(prompt)):
+            if chunk.content:
+                if first:
+                    observe("first_token", time.perf_counter() - started)
+                    first = False
+                result += chunk.content
+                yield chunk.content
+    finally:
+        # Also runs when the client disconnects mid-answer, so the partial answer is remembered.
+        CHAT_HISTORY.add_turn(query, result, context)
+        observe("generate", time.perf_counter() - started)
+    # Only a complete answer is shared with other sessions.
+    await run_in_threadpool(ANSWER_CACHE.put, query, classification_result, result, context, REPO, k)
+    with stage("summarise"):
+        await CHAT_HISTORY.acompact(asummarise)
@@ -0,0 +1,173 @@
+import abc
+import contextlib
+import fcntl
+import hashlib
+import os
+import re
+import shutil
+import time
+
+from .git_sync import CLONE_TIMEOUT_SECONDS, GIT_POLL_SECONDS, GitCancelled, GitTimeout, deadline_after, fetch_latest, run_git
+from .ingest_repo import EXT_TO_LANGUAGE, EXT_TO_LOADER
+from .scan_policy import SCAN_SKIP_DIRS
+
+
+# "mirror" (worktrees of a cached blobless mirror), "partial" (a blobless clone per
+# checkout) or "full" (a plain shallow clone, downloading every file).
+CLONE_STRATEGY = os.getenv("CLONE_STRATEGY", "mirror")
+MIRROR_CACHE_DIR = os.path.abspath(os.getenv("MIRROR_CACHE_DIR", "../repo_mirrors"))
+# Which files partial and mirror checkouts download: "text" leaves out binary formats
+# and the directories the scan skips anyway, "ingested" keeps only the extensions that
+# get chunked, "all" checks out everything.
+CLONE_SPARSE = os.getenv("CLONE_SPARSE", "text")
+CLONE_FILTER = "blob:none"
+# Never ingested: the scan drops them as binary after reading them.
+BINARY_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".tif", ".tiff", ".psd",
+    ".mp3", ".wav", ".ogg", ".flac", ".mp4", ".mov", ".avi", ".mkv", ".webm",
+    ".woff", ".woff2", ".ttf", ".otf", ".eot",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".tar", ".jar", ".war", ".whl",
+    ".exe", ".dll", ".so", ".dylib", ".a", ".o", ".obj", ".class", ".pyc", ".wasm",
+    ".bin", ".dat", ".db", ".sqlite", ".npy", ".npz", ".pkl", ".pt", ".pth", ".onnx", ".h5", ".parquet",
+}
+
+
+def sparse_patterns(mode=CLONE_SPARSE):
+    """Non-cone sparse-checkout patterns for `mode`, or None to check out every file."""
+    if mode == "ingested":
+        extensions = sorted(set(EXT_TO_LANGUAGE) | set(EXT_TO_LOADER))
+        # .gitattributes stays for the scan's linguist-vendored/generated checks.
+        return [f"*{ext}" for ext in extensions] + [".gitattributes"]
+    if mode == "text":
+        extensions = sorted(BINARY_EXTENSIONS | {ext.upper() for ext in BINARY_EXTENSIONS})
+        return ["/*"] + [f"!*{ext}" for ext in extensions] + [f"!{name}/" for name in sorted(SCAN_SKIP_DIRS)]
+    return None
+
+
+class CloneStrategy(abc.ABC):
+    """Gets a repo's files into a working directory. Each clone or fetch gives up after
+    `timeout` seconds in total (GitTimeout), or once its `cancel` event is set
+    (GitCancelled)."""
+
+    def __init__(self, sparse=CLONE_SPARSE, timeout=CLONE_TIMEOUT_SECONDS):
+        self.sparse = sparse
+        self.timeout = timeout
+
+    @abc.abstractmethod
+    def clone(self, repo_url, path, commit=None, cancel=None):
+        """Checks out the remote HEAD at `path`. `commit` is what the caller resolved that
+        HEAD to, if anything; strategies that can skip a download with it do so."""
+
+    def fetch(self, repo_url, path, cancel=None):
+        """Downloads the remote HEAD into the checkout at `path` without checking it out,
+        and returns its commit."""
+        return fetch_latest(path, deadline_after(self.timeout), cancel)
+
+    def _sparse_checkout(self, path, deadline, cancel):
+        patterns = sparse_patterns(self.sparse)
+        if patterns:
+            run_git(["sparse-checkout", "set", "--no-cone", *patterns], cwd=path, deadline=deadline, cancel=cancel)
+
+
+class FullClone(CloneStrategy):
+    """A shallow clone of every file."""
+
+    def clone(self, repo_url, path, commit=None, cancel=None):
+        run_git(["clone", "-q", "--depth=1", repo_url, path], deadline=deadline_after(self.timeout), cancel=cancel)
+
+
+class PartialClone(CloneStrategy):
+    """A shallow blobless clone: only the files inside the sparse checkout are downloaded."""
+
+    def clone(self, repo_url, path, commit=None, cancel=None):
+        deadline = deadline_after(self.timeout)
+        run_git(
+            ["clone", "-q", "--depth=1", f"--filter={CLONE_FILTER}", "--no-checkout", repo_url, path],
+            deadline=deadline, cancel=cancel,
+        )
+        self._sparse_checkout(path, deadline, cancel)
+        run_git(["checkout", "-q", "--detach", "HEAD"], cwd=path, deadline=deadline, cancel=cancel)
+
+
+class MirrorClone(CloneStrategy):
+    """Checkouts are worktrees of a bare, shallow, blobless mirror kept per repo URL under
+    `root`. A repeat clone at an unchanged commit downloads nothing, a newer one only the
+    difference, and blobs fetched for one checkout are shared with the next. Git runs
+    on a mirror hold a lock file, so concurrent inits (threads or processes) queue."""
+
+    def __init__(self, root=MIRROR_CACHE_DIR, **kwargs):
+        super().__init__(**kwargs)
+        self.root = root
+
+    def mirror_path(self, repo_url):
+        url = repo_url.strip().rstrip("/")
+        url = url[:-4] if url.endswith(".git") else url
+        name = re.sub(r"[^A-Za-z0-9._-]", "_", url.rsplit("/", 1)[-1])[:50] or "repo"
+        return os.path.join(self.root, f"{name}-{hashlib.sha1(url.lower().encode()).hexdigest()[:16]}.git")
+
+    @contextlib.contextmanager
+    def _locked(self, mirror, deadline, cancel):
+        os.makedirs(self.root, exist_ok=True)
+        with open(mirror + ".lock", "w") as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if cancel is not None and cancel.is_set():
+                        raise GitCancelled("cancelled while waiting for the mirror")
+                    if time.monotonic() > deadline:
+                        raise GitTimeout("timed out waiting for the mirror")
+                    time.sleep(GIT_POLL_SECONDS)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _update(self, repo_url, mirror, commit, deadline, cancel):
+        """Makes the mirror's HEAD the remote HEAD and returns it. Skips the fetch when
+        HEAD is already `commit`."""
+        if not os.path.isdir(mirror):
+            partial = mirror + ".partial"
+            shutil.rmtree(partial, ignore_errors=True)
+            run_git(
+                ["clone", "-q", "--bare", "--depth=1", f"--filter={CLONE_FILTER}", repo_url, partial],
+                deadline=deadline, cancel=cancel,
+            )
+            os.replace(partial, mirror)
+            return run_git(["rev-parse", "HEAD"], cwd=mirror)
+        if commit is not None and run_git(["rev-parse", "HEAD"], cwd=mirror) == commit:
+            return commit
+        latest = fetch_latest(mirror, deadline, cancel)
+        run_git(["update-ref", "HEAD", latest], cwd=mirror)
+        return latest
+
+    def clone(self, repo_url, path, commit=None, cancel=None):
+        deadline = deadline_after(self.timeout)
+        mirror = self.mirror_path(repo_url)
+        with self._locked(mirror, deadline, cancel):
+            commit = self._update(repo_url, mirror, commit, deadline, cancel)
+            # Forgets worktrees whose checkout was deleted, so `path` can be used again.
+            run_git(["worktree", "prune"], cwd=mirror)
+            run_git(["worktree", "add", "-q", "--no-checkout", "--detach", path, commit], cwd=mirror, deadline=deadline, cancel=cancel)
+            self._sparse_checkout(path, deadline, cancel)
+            # Downloads the blobs of the checked out files into the mirror.
+            run_git(["checkout", "-q", "--detach", commit], cwd=path, deadline=deadline, cancel=cancel)
+
+    def fetch(self, repo_url, path, cancel=None):
+        if not os.path.isfile(os.path.join(path, ".git")):
+            # A standalone clone, made before the strategy was switched.
+            return super().fetch(repo_url, path, cancel)
+        deadline = deadline_after(self.timeout)
+        mirror = self.mirror_path(repo_url)
+        with self._locked(mirror, deadline, cancel):
+            return self._update(repo_url, mirror, None, deadline, cancel)
+
+
+CLONE_STRATEGIES = {"mirror": MirrorClone, "partial": PartialClone, "full": FullClone}
+
+
+def clone_strategy(name=CLONE_STRATEGY, **kwargs):
+    if name not in CLONE_STRATEGIES:
+        raise ValueError(f"Unknown CLONE_STRATEGY {name!r}")
+    return CLONE_STRATEGIES[name](**kwargs)
@@ -0,0 +1,158 @@
+import os
+
+
+# Chunks grow by whole definitions up to the target; only a definition larger than
+# the maximum on its own is cut further, at its members or else at blank lines.
+CODE_CHUNK_TARGET_CHARS = int(os.getenv("CODE_CHUNK_TARGET_CHARS", "3500"))
+CODE_CHUNK_MAX_CHARS = int(os.getenv("CODE_CHUNK_MAX_CHARS", "5000"))
+COMMENT_PREFIXES = ("#", "//", "/*", "*", "--", "@")
+
+
+class Segment:
+    """Lines [start, end) of a file (0-based), and the definitions they hold.
+    `children` are the nested definitions it can be cut at, named under `qualifier`."""
+
+    def __init__(self, start, end, names=(), children=(), qualifier=""):
+        self.start = start
+        self.end = end
+        self.names = list(names)
+        self.children = children
+        self.qualifier = qualifier
+
+    def size(self, offsets):
+        return offsets[self.end] - offsets[self.start]
+
+
+def _nest(symbols):
+    """Turns a flat symbol list into (symbol, children) trees by line containment, so
+    pattern-matched languages (which record no parents) nest methods in classes too."""
+    roots = []
+    stack = []
+    for symbol in sorted(symbols, key=lambda s: (s["start_line"], -s["end_line"])):
+        node = (symbol, [])
+        while stack and symbol["start_line"] > stack[-1][0]["end_line"]:
+            stack.pop()
+        if stack and symbol["end_line"] <= stack[-1][0]["end_line"]:
+            stack[-1][1].append(node)
+        else:
+            roots.append(node)
+        stack.append(node)
+    return roots
+
+
+def _leading_comments(lines, start, floor):
+    """Moves `start` up over the comment lines directly above a definition."""
+    while start > floor and lines[start - 1].strip().startswith(COMMENT_PREFIXES):
+        start -= 1
+    return start
+
+
+def _segments(lines, nodes, start, end, qualifier=""):
+    """Covers lines [start, end) with one segment per definition in `nodes` and one
+    per stretch of code between them."""
+    segments = []
+    cursor = start
+    for symbol, children in nodes:
+        first = max(_leading_comments(lines, symbol["start_line"] - 1, cursor), cursor)
+        last = min(symbol["end_line"], end)
+        if last <= first:
+            continue
+        if first > cursor:
+            segments.append(Segment(cursor, first))
+        name = f"{qualifier}{symbol['name']}"
+        segments.append(Segment(first, last, [name], children, f"{name}."))
+        cursor = last
+    if cursor < end:
+        segments.append(Segment(cursor, end))
+    return segments
+
+
+def _split_lines(lines, offsets, segment, max_chars):
+    """Cuts an oversized stretch with no usable members into pieces of at most
+    `max_chars`, preferring to cut after a blank line."""
+    pieces = []
+    start = segment.start
+    size = 0
+    last_blank = None
+    for i in range(segment.start, segment.end):
+        line_size = len(lines[i]) + 1
+        if size + line_size > max_chars and i > start:
+            cut = last_blank + 1 if last_blank is not None and last_blank + 1 > start else i
+            pieces.append(Segment(start, cut, segment.names))
+            start = cut
+            size = offsets[i] - offsets[start]
+            last_blank = None
+            if size + line_size > max_chars and i > start:
+                pieces.append(Segment(start, i, segment.names))
+                start = i
+                size = 0
+        size += line_size
+        if not lines[i].strip():
+            last_blank = i
+    if start < segment.end:
+        pieces.append(Segment(start, segment.end, segment.names))
+    return pieces
+
+
+def _fit(lines, offsets, segments, max_chars):
+    """Replaces every segment larger than `max_chars` by smaller ones: its members
+    when it has any (the header stays with the first), blank-line cuts otherwise."""
+    fitted = []
+    for segment in segments:
+        if segment.size(offsets) <= max_chars:
+            fitted.append(segment)
+        elif segment.children:
+            inner = _segments(lines, segment.children, segment.start, segment.end, segment.qualifier)
+            for piece in inner:
+                if not piece.names:
+                    piece.names = list(segment.names)
+            fitted.extend(_fit(lines, offsets, inner, max_chars))
+        else:
+            fitted.extend(_split_lines(lines, offsets, segment, max_chars))
+    return fitted
+
+
+def _merge(offsets, segments, target_chars):
+    """Packs neighbouring segments into chunks of up to `target_chars`."""
+    chunks = []
+    current = None
+    size = 0
+    for segment in segments:
+        segment_size = segment.size(offsets)
+        if current is not None and size + segment_size <= target_chars:
+            current.end = segment.end
+            current.names.extend(n for n in segment.names if n not in current.names)
+            size += segment_size
+            continue
+        if current is not None:
+            chunks.append(current)
+        current = Segment(segment.start, segment.end, segment.names)
+        size = segment_size
+    if current is not None:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_code(text, symbols, target_chars=CODE_CHUNK_TARGET_CHARS, max_chars=CODE_CHUNK_MAX_CHARS):
+    """Splits a source file along its definitions (as found by `extract_symbols`).
+    Each chunk is a dict with its text, 1-based start/end lines, the main symbol and
+    every symbol it contains (comma separated, as vector store metadata is flat)."""
+    lines = text.splitlines()
+    # offsets[i] is where line i starts, counting one newline per line.
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line) + 1)
+    segments = _fit(lines, offsets, _segments(lines, _nest(symbols), 0, len(lines)), max_chars)
+    chunks = []
+    for chunk in _merge(offsets, segments, target_chars):
+        body = "\n".join(lines[chunk.start:chunk.end])
+        if not body.strip():
+            continue
+        chunks.append({
+            "text": body,
+            "start_line": chunk.start + 1,
+            "end_line": chunk.end,
+            "symbol": chunk.names[0] if chunk.names else "",
+            "symbols": ",".join(chunk.names),
+        })
+    return chunks
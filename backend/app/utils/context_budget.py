@@ -0,0 +1,187 @@
+import heapq
+import mmap
+import os
+from pathlib import Path
+
+from .file_index import words
+from .ingest_repo import EXT_TO_LOADER, validate_and_read_file
+from .tokens import count_tokens
+from .timing import stage
+
+
+# Whole-file context is capped per request; each file gets an equal share of what is left.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000"))
+# Files are scored in segments of roughly this many bytes, cut at a newline when there is one.
+SEGMENT_BYTES = int(os.getenv("CONTEXT_SEGMENT_BYTES", "2048"))
+# Bytes of a single file scanned for relevant segments; the rest is never read.
+MAX_SCAN_BYTES = int(os.getenv("CONTEXT_MAX_SCAN_BYTES", str(4 * 1024 * 1024)))
+# Below this a file is read whole rather than memory-mapped.
+MMAP_MIN_BYTES = 64 * 1024
+
+
+def is_streamable(path):
+    """Plain-text files can be read straight from disk in windows; rich formats
+    (markdown, pdf, docx, notebooks) have to go through their loader first."""
+    loader = EXT_TO_LOADER.get(Path(path).suffix.lower())
+    return loader is None or loader == "TextLoader"
+
+
+def _segments_of_buffer(buffer, limit):
+    """Yields (first line number, bytes) segments of a bytes-like buffer."""
+    line = 1
+    start = 0
+    end_of_scan = min(len(buffer), limit)
+    while start < end_of_scan:
+        end = min(start + SEGMENT_BYTES, end_of_scan)
+        if end < end_of_scan:
+            # Prefer to end on a newline; minified one-line files are hard-cut at twice the size.
+            newline = buffer.find(b"\n", end, min(start + 2 * SEGMENT_BYTES, end_of_scan))
+            end = newline + 1 if newline != -1 else min(start + 2 * SEGMENT_BYTES, end_of_scan)
+        segment = bytes(buffer[start:end])
+        yield line, segment
+        line += segment.count(b"\n")
+        start = end
+
+
+def file_segments(path, limit=MAX_SCAN_BYTES):
+    """Yields (first line number, text) segments of a file on disk, memory-mapping
+    large files so only the scanned windows are paged in."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, "rb") as f:
+        if size < MMAP_MIN_BYTES:
+            buffer = f.read()
+            for line, segment in _segments_of_buffer(buffer, limit):
+                yield line, segment.decode("utf-8", errors="replace")
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line, segment in _segments_of_buffer(mapped, limit):
+                yield line, segment.decode("utf-8", errors="replace")
+
+
+def text_segments(text, limit=MAX_SCAN_BYTES):
+    data = text.encode("utf-8")
+    for line, segment in _segments_of_buffer(data, limit):
+        yield line, segment.decode("utf-8", errors="replace")
+
+
+def select_segments(segments, query, token_budget):
+    """Keeps the segments that best match the query words, within `token_budget`,
+    returned in file order. The first segment (imports, headers, front matter)
+    gets a small bonus so short answers still see how the file starts. Reading
+    stops once segments matching every query word fill the budget, since ties go
+    to earlier segments and nothing later could take their place."""
+    query_words = words(query)
+    kept = []
+    held = 0
+    # Tokens of segments with the best score any segment can get.
+    best_held = 0
+    for position, (line, text) in enumerate(segments):
+        score = len(query_words & words(text)) + (0.5 if position == 0 else 0.0)
+        tokens = count_tokens(text)
+        # Min-heap on score; position breaks ties in favour of earlier segments.
+        heapq.heappush(kept, (score, -position, line, text, tokens))
+        held += tokens
+        # Never hold much more than could possibly fit.
+        while held > token_budget * 2 and len(kept) > 1:
+            held -= heapq.heappop(kept)[4]
+        if score >= len(query_words):
+            best_held += tokens
+            if best_held >= token_budget:
+                break
+
+    chosen = []
+    used = 0
+    for score, neg_position, line, text, tokens in sorted(kept, reverse=True):
+        if used + tokens > token_budget:
+            continue
+        chosen.append((-neg_position, line, text))
+        used += tokens
+    chosen.sort()
+    return chosen
+
+
+def render_segments(chosen, total_segments, more=False):
+    """Joins chosen segments, marking the gaps left by dropped ones. `more` says the
+    file goes on past the `total_segments` that were read."""
+    if len(chosen) == total_segments and not more:
+        return "".join(text for _, _, text in chosen)
+    output = ""
+    expected = 0
+    for position, line, text in chosen:
+        if position != expected:
+            output += f"\n... (omitted, resumes at line {line}) ...\n"
+        output += text
+        expected = position + 1
+    if expected != total_segments or more:
+        output += "\n... (rest of file omitted) ...\n"
+    return output
+
+
+class _Counted:
+    """Wraps a segment iterator to remember how many segments it produced, and
+    whether it was read to the end."""
+
+    def __init__(self, segments):
+        self.segments = segments
+        self.count = 0
+        self.exhausted = False
+
+    def __iter__(self):
+        for item in self.segments:
+            self.count += 1
+            yield item
+        self.exhausted = True
+
+
+def read_file_within_budget(path, query, token_budget):
+    """Returns (text, filename) for one file, cut down to the parts most relevant
+    to the query when the whole file does not fit in `token_budget`, or (None, None)."""
+    if not os.path.isfile(path):
+        return None, None
+    filename = Path(path).name
+    if is_streamable(path):
+        segments = _Counted(file_segments(path))
+    else:
+        content, filename = validate_and_read_file(path)
+        if content is None:
+            return None, None
+        segments = _Counted(text_segments(content))
+    chosen = select_segments(segments, query, token_budget)
+    if not chosen:
+        return None, None
+    truncated = os.path.getsize(path) > MAX_SCAN_BYTES and is_streamable(path)
+    text = render_segments(chosen, segments.count, more=not segments.exhausted)
+    if truncated:
+        text += f"\n... (file is larger than {MAX_SCAN_BYTES} bytes; only the start was searched) ...\n"
+    return text, filename
+
+
+def assemble_file_context(query, paths, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Numbered "Filename/Contents" blocks for `paths`, together kept within
+    `token_budget`. Each file gets an equal share of the budget left, so a small
+    file leaves room for the large ones after it."""
+    with stage("read_files"):
+        return _assemble(query, paths, token_budget)
+
+
+def _assemble(query, paths, token_budget):
+    output = ""
+    cnt = 1
+    remaining = token_budget
+    for left, path in zip(range(len(paths), 0, -1), paths):
+        share = remaining // left
+        if share <= 0:
+            break
+        try:
+            content, filename = read_file_within_budget(path, query, share)
+        except (OSError, ValueError):
+            continue
+        if content is None:
+            continue
+        block = f"""{cnt}.  Filename: {filename} \nContents:-\n{content}\n"""
+        output += block
+        remaining -= count_tokens(block)
+        cnt += 1
+    return output
@@ -0,0 +1,280 @@
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+from functools import lru_cache
+
+from charset_normalizer import from_path
+
+from .timing import count, stage
+
+try:
+    import resource
+except ImportError:
+    # Windows has no resource module; workers there run without a memory limit.
+    resource = None
+
+
+# Loaders for these can spend minutes or gigabytes on one bad file, so they run in
+# worker processes that are killed when they overrun.
+ISOLATED_EXTENSIONS = {".pdf", ".docx", ".rst", ".md", ".ipynb"}
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+PARSE_TIMEOUT_SECONDS = float(os.getenv("PARSE_TIMEOUT_SECONDS", "60"))
+# Address space limit per worker process, 0 for none. Counts mapped libraries and
+# models as well as the heap, so raise it if a loader's imports alone run into it.
+PARSE_MEMORY_MB = int(os.getenv("PARSE_MEMORY_MB", "2048"))
+PARSED_TEXT_CACHE_PATH = os.getenv("PARSED_TEXT_CACHE_PATH", "../parsed_text_cache.db")
+PARSED_TEXT_CACHE_MAX_BYTES = int(os.getenv("PARSED_TEXT_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+
+
+@lru_cache(maxsize=None)
+def loader_class(name):
+    from langchain_community import document_loaders
+    return getattr(document_loaders, name)
+
+
+def load_with(loader_name, filepath):
+    """Documents from langchain_community's `loader_name`, decoded with the detected encoding."""
+    best = from_path(filepath).best()
+    loader = loader_class(loader_name)(filepath, encoding=best.encoding if best else None)
+    return loader.load()
+
+
+def plain_text(filepath, ext):
+    """Best-effort text without the document loaders, for files they failed on."""
+    if ext == ".pdf":
+        from pypdf import PdfReader
+        return "\n\n".join(page.extract_text() or "" for page in PdfReader(filepath).pages)
+    if ext == ".docx":
+        with zipfile.ZipFile(filepath) as archive:
+            xml = archive.read("word/document.xml").decode("utf-8", errors="ignore")
+        return html.unescape(re.sub(r"<[^>]+>", "", xml.replace("</w:p>", "\n")))
+    with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+    if ext == ".ipynb":
+        return "\n\n".join("".join(cell.get("source", "")) for cell in json.loads(text).get("cells", []))
+    return text
+
+
+def _serve(conn, memory_bytes):
+    """Worker process loop: answers (path, ext, loader_name, method) requests with
+    (True, text) or (False, error) until the pipe closes."""
+    if resource is not None and memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    while True:
+        try:
+            path, ext, loader_name, method = conn.recv()
+        except EOFError:
+            return
+        try:
+            if method == "loader":
+                text = "\n\n".join(doc.page_content for doc in load_with(loader_name, path))
+            else:
+                text = plain_text(path, ext)
+            conn.send((True, text))
+        except Exception as e:
+            # MemoryError included: the limit turns runaway allocations into an error here.
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class ParseWorker:
+    """One worker process, reused for request after request until it overruns or dies."""
+
+    def __init__(self, memory_bytes):
+        # Spawned rather than forked: the parent has embedding and request threads running.
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_conn, memory_bytes), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    @property
+    def alive(self):
+        return self.process.is_alive()
+
+    def run(self, request, timeout):
+        """(ok, text or error, transient). A transient failure is the worker overrunning
+        or dying, which may not happen again on a less loaded machine."""
+        try:
+            self.conn.send(request)
+            if not self.conn.poll(timeout):
+                self.stop()
+                return False, f"timed out after {timeout}s", True
+            return (*self.conn.recv(), False)
+        except (EOFError, OSError):
+            # The pipe breaks when the worker dies mid-request (killed by the OS, a crash in native code).
+            self.stop()
+            return False, f"worker exited with code {self.process.exitcode}", True
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class ParsedTextCache:
+    """On-disk text of parsed documents keyed by sha256(extension + file bytes), so a
+    document is parsed once however many repos, commits or paths it turns up in.
+    Least recently used entries go once the stored bytes exceed `max_bytes`."""
+
+    def __init__(self, path=PARSED_TEXT_CACHE_PATH, max_bytes=PARSED_TEXT_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = 0
+        # Opened when first needed: chunking processes import this module but never read the cache.
+        self._conn = None
+        self._open_lock = threading.Lock()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            with self._open_lock:
+                if self._conn is None:
+                    self._conn = self._open()
+        return self._conn
+
+    @property
+    def total_bytes(self):
+        # Summed when the database opens.
+        return self._total_bytes if self.conn else 0
+
+    @total_bytes.setter
+    def total_bytes(self, value):
+        self._total_bytes = value
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS parsed ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS parsed_last_used ON parsed(last_used)")
+        conn.commit()
+        self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM parsed").fetchone()[0]
+        return conn
+
+    @staticmethod
+    def key(ext, content):
+        return hashlib.sha256(ext.encode() + b"\0" + content).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT text FROM parsed WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE parsed SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, text):
+        size = len(text.encode("utf-8", errors="surrogatepass"))
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM parsed WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO parsed VALUES (?, ?, ?, ?)", (key, text, size, time.time()))
+            self.total_bytes += size - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        # Free down to 90% of the cap so we don't evict again on the very next insert.
+        to_free = self.total_bytes - int(self.max_bytes * 0.9)
+        for key, size in self.conn.execute("SELECT key, size FROM parsed ORDER BY last_used").fetchall():
+            if to_free <= 0:
+                break
+            self.conn.execute("DELETE FROM parsed WHERE key = ?", (key,))
+            to_free -= size
+            self.total_bytes -= size
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM parsed").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class DocumentParser:
+    """Parses documents with their loaders in up to `workers` worker processes, each
+    limited to `memory_mb` of address space and `timeout` seconds per file. When the
+    loader fails, overruns or takes its worker down, the file is parsed again with
+    plain_text, and becomes empty text if that fails too. Text is cached by content
+    unless either attempt overran, crashed or failed outright, so those files are
+    tried again next time. Workers start on demand and stop when the parser is
+    closed; use it as a context manager."""
+
+    def __init__(self, cache, workers=PARSE_WORKERS, timeout=PARSE_TIMEOUT_SECONDS, memory_mb=PARSE_MEMORY_MB):
+        self.cache = cache
+        self.timeout = timeout
+        self.memory_bytes = memory_mb * 1024 ** 2
+        self.slots = threading.Semaphore(max(1, workers))
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            workers, self.idle = self.idle, []
+        for worker in workers:
+            worker.stop()
+
+    def _run(self, request):
+        with self.slots:
+            with self.lock:
+                worker = self.idle.pop() if self.idle else None
+            if worker is None or not worker.alive:
+                if worker is not None:
+                    worker.stop()
+                worker = ParseWorker(self.memory_bytes)
+            result = worker.run(request, self.timeout)
+            if worker.alive:
+                with self.lock:
+                    self.idle.append(worker)
+            return result
+
+    def parse(self, filepath, ext, loader_name):
+        """The text of the document at `filepath`, as `loader_name` would give it."""
+        with open(filepath, "rb") as f:
+            key = self.cache.key(ext, f.read())
+        text = self.cache.get(key)
+        if text is not None:
+            count("document_parses", outcome="cached")
+            return text
+        with stage("parse_document", ext=ext):
+            ok, text, transient = self._run((str(filepath), ext, loader_name, "loader"))
+            outcome = "loader"
+            if not ok:
+                ok, text, plain_transient = self._run((str(filepath), ext, loader_name, "plain"))
+                transient = transient or plain_transient
+                outcome = "plain_text" if ok else "failed"
+                text = text if ok else ""
+        count("document_parses", outcome=outcome)
+        # A fallback forced by a timeout or a dead worker is worse than the loader's text
+        # would have been, and an empty one is no text at all, so neither is kept for good.
+        if ok and not transient:
+            self.cache.put(key, text)
+        return text
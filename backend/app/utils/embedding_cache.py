@@ -0,0 +1,181 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "../embedding_cache.db")
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# SQLite caps the number of bound parameters per statement.
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """On-disk vector cache keyed by sha256(model name + chunk text), evicting the
+    least recently used vectors once the stored bytes exceed `max_bytes`."""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = 0
+        # The database is opened on first use, so importing the app creates no file.
+        self._conn = None
+        self._open_lock = threading.Lock()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            with self._open_lock:
+                if self._conn is None:
+                    self._conn = self._open()
+        return self._conn
+
+    @property
+    def total_bytes(self):
+        # Summed when the database opens.
+        return self._total_bytes if self.conn else 0
+
+    @total_bytes.setter
+    def total_bytes(self, value):
+        self._total_bytes = value
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        conn.commit()
+        self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        return conn
+
+    @staticmethod
+    def key(model_name, text):
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8", errors="surrogatepass")).hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        now = time.time()
+        with self.lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                if rows:
+                    self.conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({marks})", [now, *batch]
+                    )
+            self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items):
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self.lock:
+            existing = 0
+            for start in range(0, len(rows), _SQL_BATCH):
+                batch = [row[0] for row in rows[start:start + _SQL_BATCH]]
+                marks = ",".join("?" * len(batch))
+                existing += self.conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE key IN ({marks})", batch
+                ).fetchone()[0]
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self.total_bytes += sum(row[2] for row in rows) - existing
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        # Free down to 90% of the cap so we don't evict again on the very next insert.
+        to_free = self.total_bytes - int(self.max_bytes * 0.9)
+        while to_free > 0:
+            rows = self.conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_used LIMIT ?", (_SQL_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                victims.append((key,))
+                to_free -= size
+                self.total_bytes -= size
+                if to_free <= 0:
+                    break
+            self.conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embedding model so only texts missing from the cache reach the API.
+    `model_factory` is called once, on the first embedding request."""
+
+    def __init__(self, model_factory, cache):
+        self.model_factory = model_factory
+        self.cache = cache
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self.model_factory()
+        return self._model
+
+    @property
+    def model_name(self):
+        return getattr(self.model, "model", None) or type(self.model).__name__
+
+    def embed_documents(self, texts):
+        keys = [self.cache.key(self.model_name, text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing[key] = text
+        if missing:
+            vectors = self.model.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        key = self.cache.key(f"{self.model_name}:query", text)
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key]
+        vector = self.model.embed_query(text)
+        self.cache.put_many({key: vector})
+        return vector
@@ -0,0 +1,123 @@
+"""Deterministic local stand-ins for the chat and embedding models, used when
+MODEL_BACKEND=fake (benchmarks and offline runs). Only imported in that mode."""
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from app.schema.model_outputs import Category, ClassificationOutput, MultipleFilesSelection, SingleFileSelection
+
+
+# Simulated latency of the stand-ins: per LLM call, per streamed token, and per embedding request.
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+FAKE_LLM_TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", "0"))
+FAKE_EMBED_LATENCY_MS = float(os.getenv("FAKE_EMBED_LATENCY_MS", "0"))
+FAKE_EMBED_DIM = int(os.getenv("FAKE_EMBED_DIM", "1536"))
+
+
+def _sleep_ms(ms):
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+def _prompt_text(value):
+    if hasattr(value, "to_string"):
+        return value.to_string()
+    if isinstance(value, list):
+        return "\n".join(str(getattr(m, "content", m)) for m in value)
+    return str(value)
+
+
+class FakeChatModel(BaseChatModel):
+    """Stand-in chat model: a fixed-shape answer derived from the prompt, after a
+    simulated delay, streamed word by word."""
+
+    model_name: str = "fake-chat"
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _answer(self, messages):
+        prompt = _prompt_text(messages)
+        digest = zlib.crc32(prompt.encode("utf-8", errors="ignore"))
+        return f"Stand-in answer {digest:08x} for a prompt of {len(prompt)} characters. " * 4
+
+    def _usage(self, messages, answer):
+        # Words stand in for tokens, so token metrics have something to count offline.
+        prompt_tokens = len(_prompt_text(messages).split())
+        answer_tokens = len(answer.split())
+        return {"input_tokens": prompt_tokens, "output_tokens": answer_tokens, "total_tokens": prompt_tokens + answer_tokens}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        _sleep_ms(FAKE_LLM_LATENCY_MS)
+        answer = self._answer(messages)
+        _sleep_ms(FAKE_LLM_TOKEN_MS * len(answer.split()))
+        message = AIMessage(content=answer, usage_metadata=self._usage(messages, answer))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        _sleep_ms(FAKE_LLM_LATENCY_MS)
+        answer = self._answer(messages)
+        for word in answer.split(" "):
+            _sleep_ms(FAKE_LLM_TOKEN_MS)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, answer)))
+
+
+FAKE_FILE_WORDS = re.compile(r"\w\.(py|js|ts|md|json|txt|ya?ml|toml)\b")
+FAKE_SYMBOL_WORDS = re.compile(r"\w\(\)|\b\w+_\w+\b|\b(function|class|method)\b")
+FAKE_GENERAL_WORDS = re.compile(r"\b(install|project|repo|repository|setup|overview)\b", re.IGNORECASE)
+
+
+def _fake_label(prompt):
+    """Keyword rules over the question at the end of the classification prompt."""
+    question = _prompt_text(prompt).rsplit("Question:", 1)[-1]
+    if FAKE_FILE_WORDS.search(question):
+        return Category.FILE
+    if FAKE_SYMBOL_WORDS.search(question):
+        return Category.FUNCTION_CLASS
+    if FAKE_GENERAL_WORDS.search(question):
+        return Category.GENERAL
+    return Category.FOLLOW_UP
+
+
+def fake_structured(schema):
+    def respond(prompt):
+        _sleep_ms(FAKE_LLM_LATENCY_MS)
+        if schema is ClassificationOutput:
+            return ClassificationOutput(label=_fake_label(prompt))
+        if schema is MultipleFilesSelection:
+            return MultipleFilesSelection(file_indices=[1, 2])
+        if schema is SingleFileSelection:
+            return SingleFileSelection(file_index=1)
+        raise ValueError(f"No stand-in output for {schema.__name__}")
+    return RunnableLambda(respond)
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic hashed bag-of-words vectors, so similar texts still land close."""
+
+    def __init__(self, dim=FAKE_EMBED_DIM):
+        self.dim = dim
+        self.model = f"fake-embeddings-{dim}"
+
+    def _vector(self, text):
+        buckets = [zlib.crc32(word.encode("utf-8", errors="ignore")) % self.dim for word in text.split()]
+        vector = np.bincount(buckets, minlength=self.dim).astype(np.float32) if buckets else np.ones(self.dim, np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        _sleep_ms(FAKE_EMBED_LATENCY_MS)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        _sleep_ms(FAKE_EMBED_LATENCY_MS)
+        return self._vector(text)
@@ -0,0 +1,84 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+FILE_CACHE_MAX_BYTES = int(os.getenv("FILE_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+# A single file may take at most this share of the cache, so one huge file can't flush it.
+FILE_CACHE_MAX_ENTRY_SHARE = 0.25
+
+
+def file_version(path):
+    """(mtime_ns, size) of a file, the part of the cache key that changes on edit."""
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class FileContentCache:
+    """In-memory LRU of decoded file text keyed by (path, mtime, size), so files
+    shown to the model are not re-detected and re-parsed on every question.
+    Ingest fills it with the text its loaders already produced."""
+
+    def __init__(self, max_bytes=FILE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        """Returns (text, filename) for an unchanged cached file, otherwise None."""
+        path = str(path)
+        try:
+            version = file_version(path)
+        except OSError:
+            return None
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(path)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, path, text, filename, version=None):
+        """Caches `text` for `path` at `version` (taken now when not given; pass the
+        version stat'ed before reading to avoid caching text newer than its key)."""
+        path = str(path)
+        size = len(text.encode("utf-8", errors="surrogatepass"))
+        if size > self.max_bytes * FILE_CACHE_MAX_ENTRY_SHARE:
+            return
+        try:
+            version = version or file_version(path)
+        except OSError:
+            return
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= old[3]
+            self.entries[path] = (version, text, filename, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= evicted[3]
+
+    def discard_under(self, root):
+        """Drops every entry below `root`, for when a checkout is deleted."""
+        prefix = os.path.join(str(root), "")
+        with self.lock:
+            for path in [p for p in self.entries if p.startswith(prefix)]:
+                self.total_bytes -= self.entries.pop(path)[3]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
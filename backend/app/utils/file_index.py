@@ -0,0 +1,100 @@
+import difflib
+import os
+import re
+from collections import defaultdict
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    process = None
+
+
+FILENAME_TOKEN = re.compile(r"[\w.\-/\\]+")
+WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+FUZZY_CUTOFF = 85
+
+
+def words(text):
+    """Lower-cased words of a path or query, splitting camelCase and separators."""
+    return {w.lower() for w in WORD.findall(text) if len(w) > 1}
+
+
+def filename_tokens(query):
+    tokens = []
+    for token in FILENAME_TOKEN.findall(query):
+        token = token.strip(".-/\\").replace("\\", "/").lower()
+        if token:
+            tokens.append(token)
+    return tokens
+
+
+class FileIndex:
+    """Lookup of repo files by relative path, path suffix, basename, stem and fuzzy
+    basename, built once per ingest. Results are indices into the file symbol table
+    it was built from."""
+
+    def __init__(self, file_symbol_table, root):
+        self.root = str(root)
+        self.by_relpath = {}
+        self.by_suffix = defaultdict(list)
+        self.by_basename = defaultdict(list)
+        self.by_stem = defaultdict(list)
+        # Per table index: the repo-relative path as shown to the LLM, and the words in it.
+        self.relpaths = []
+        self.path_words = []
+        for i, entry in enumerate(file_symbol_table):
+            display = os.path.relpath(entry["path"], self.root).replace(os.sep, "/")
+            self.relpaths.append(display)
+            self.path_words.append(words(display))
+            relpath = display.lower()
+            self.by_relpath[relpath] = i
+            parts = relpath.split("/")
+            # "a/b/c.py" is reachable as "b/c.py" too; the bare basename has its own map.
+            for start in range(1, len(parts) - 1):
+                self.by_suffix["/".join(parts[start:])].append(i)
+            basename = entry["filename"].lower()
+            self.by_basename[basename].append(i)
+            stem = basename.split(".")[0]
+            if stem and stem != basename:
+                self.by_stem[stem].append(i)
+        self.basenames = list(self.by_basename)
+
+    def index_of(self, path):
+        relpath = os.path.relpath(path, self.root).replace(os.sep, "/").lower()
+        return self.by_relpath.get(relpath)
+
+    def exact(self, token):
+        if token in self.by_relpath:
+            return [self.by_relpath[token]]
+        if token in self.by_suffix:
+            return self.by_suffix[token]
+        return self.by_basename.get(token, [])
+
+    def stem(self, token):
+        return self.by_stem.get(token, [])
+
+    def fuzzy(self, token):
+        # Only tokens that look like file names are worth a fuzzy match ("utlis.py").
+        basename = token.split("/")[-1]
+        if "." not in basename:
+            return []
+        if process is not None:
+            close = [m[0] for m in process.extract(basename, self.basenames, scorer=fuzz.ratio, limit=5, score_cutoff=FUZZY_CUTOFF)]
+        else:
+            close = difflib.get_close_matches(basename, self.basenames, n=5, cutoff=FUZZY_CUTOFF / 100)
+        return [i for name in close for i in self.by_basename[name]]
+
+    def mentions(self, query):
+        """Table indices of files named in the query by path, path suffix or basename."""
+        found = [i for token in filename_tokens(query) for i in self.exact(token)]
+        return list(dict.fromkeys(found))
+
+    def resolve(self, query):
+        """Candidates for the file a query is about, from the most specific tier
+        (exact path / suffix / basename, then stem, then fuzzy) that matches anything."""
+        tokens = filename_tokens(query)
+        for lookup in (self.exact, self.stem, self.fuzzy):
+            found = [i for token in tokens for i in lookup(token)]
+            if found:
+                return list(dict.fromkeys(found))
+        return []
@@ -0,0 +1,106 @@
+import os
+from collections import Counter
+
+from .file_index import words
+from .tokens import count_tokens
+
+
+GENERAL_SHORTLIST_SIZE = int(os.getenv("GENERAL_SHORTLIST_SIZE", "40"))
+GENERAL_TABLE_TOKEN_BUDGET = int(os.getenv("GENERAL_TABLE_TOKEN_BUDGET", "2000"))
+TREE_SUMMARY_TOKEN_BUDGET = int(os.getenv("TREE_SUMMARY_TOKEN_BUDGET", "600"))
+
+# Directories whose contents are almost never what a question is about.
+VENDORED_DIRS = {
+    "node_modules", "bower_components", "vendor", "third_party", "third-party", "external", "deps",
+    "dist", "build", "out", "target", "bin", "obj", "coverage", ".next", ".nuxt", ".venv", "venv",
+    "env", "site-packages", "__pycache__", ".idea", ".vscode", ".github", "generated", "gen",
+}
+# Files that describe a repo as a whole, preferred for overview questions.
+OVERVIEW_FILES = {
+    "readme", "contributing", "license", "changelog", "setup.py", "setup.cfg", "pyproject.toml",
+    "package.json", "requirements.txt", "dockerfile", "docker-compose.yml", "makefile", "cargo.toml",
+    "go.mod", "pom.xml", "build.gradle", "gemfile", "composer.json", "main.py", "app.py", "index.js",
+}
+STOPWORDS = {
+    "the", "and", "for", "with", "this", "that", "what", "how", "does", "are", "is", "can", "you",
+    "repo", "repository", "project", "code", "codebase", "about", "from", "which", "where", "who",
+    "why", "when", "into", "there", "use", "used", "using", "have", "has", "its", "of", "to", "in",
+    "do", "it", "be", "an", "or", "on", "me", "my", "i", "a",
+}
+
+
+def is_vendored(relpath):
+    relpath = relpath.lower()
+    parts = relpath.split("/")[:-1]
+    return any(part in VENDORED_DIRS for part in parts) or ".min." in relpath
+
+
+def shortlist_files(query, file_index, vector_hits=(), top_n=GENERAL_SHORTLIST_SIZE):
+    """Top-N file table indices for a repo-level question, scored by query/path word
+    overlap, overview-file priors, path depth and optional vector-search hits."""
+    query_words = words(query) - STOPWORDS
+    hits = Counter(vector_hits)
+    scored = []
+    for i, relpath in enumerate(file_index.relpaths):
+        if is_vendored(relpath):
+            continue
+        basename = relpath.split("/")[-1].lower()
+        depth = relpath.count("/")
+        score = 2.0 * len(query_words & file_index.path_words[i])
+        score += 1.5 * min(hits.get(i, 0), 3)
+        if basename in OVERVIEW_FILES or basename.split(".")[0] in OVERVIEW_FILES:
+            score += 2.0 / (1 + depth)
+        if score > 0:
+            scored.append((score - 0.1 * depth, i))
+    if not scored:
+        # Nothing matched: show the shallowest files so the model still sees the repo's top level.
+        scored = [(-relpath.count("/"), i) for i, relpath in enumerate(file_index.relpaths) if not is_vendored(relpath)]
+    scored.sort(key=lambda item: -item[0])
+    return [i for _, i in scored[:top_n]]
+
+
+def directory_summary(file_index, token_budget=TREE_SUMMARY_TOKEN_BUDGET, max_depth=2):
+    """Directory tree with file counts, vendored/generated directories collapsed
+    to a single line and everything below `max_depth` folded into its parent."""
+    counts = Counter()
+    collapsed = set()
+    for relpath in file_index.relpaths:
+        parts = relpath.split("/")[:-1]
+        for depth in range(len(parts)):
+            directory = "/".join(parts[:depth + 1])
+            counts[directory] += 1
+            if parts[depth].lower() in VENDORED_DIRS:
+                collapsed.add(directory)
+                break
+            if depth + 1 >= max_depth:
+                break
+
+    lines = [f"./ ({len(file_index.relpaths)} files)"]
+    used = count_tokens(lines[0])
+    for directory in sorted(counts):
+        if any(directory.startswith(c + "/") for c in collapsed):
+            continue
+        indent = "  " * directory.count("/")
+        note = ", vendored/generated, collapsed" if directory in collapsed else ""
+        line = f"{indent}{directory.split('/')[-1]}/ ({counts[directory]} files{note})"
+        used += count_tokens(line)
+        if used > token_budget:
+            lines.append("  ...")
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def format_shortlist(candidates, file_index, token_budget=GENERAL_TABLE_TOKEN_BUDGET):
+    """Numbered candidate list cut to fit `token_budget`; returns (text, indices kept)."""
+    lines = []
+    kept = []
+    used = 0
+    for i in candidates:
+        line = f"{len(kept) + 1}.  Path: {file_index.relpaths[i]}"
+        used += count_tokens(line)
+        if used > token_budget:
+            break
+        lines.append(line)
+        kept.append(i)
+    return "\n".join(lines), kept
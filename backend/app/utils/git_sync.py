@@ -0,0 +1,123 @@
+import os
+import signal
+import subprocess
+import time
+from pathlib import Path
+from git import GitCommandError, Repo
+
+
+# Clones and fetches give up after this long; resolving the remote HEAD after a much shorter time.
+CLONE_TIMEOUT_SECONDS = int(os.getenv("CLONE_TIMEOUT_SECONDS", "600"))
+LS_REMOTE_TIMEOUT_SECONDS = 30
+# How often a running git command checks for its deadline and for cancellation.
+GIT_POLL_SECONDS = 0.2
+
+
+class GitTimeout(Exception):
+    pass
+
+
+class GitCancelled(Exception):
+    pass
+
+
+def deadline_after(seconds):
+    return time.monotonic() + seconds
+
+
+def run_git(args, cwd=None, deadline=None, cancel=None):
+    """Runs `git *args` and returns its stripped stdout, raising GitCommandError when it
+    fails. git and the helpers it spawns are killed once the monotonic `deadline` passes
+    (GitTimeout) or the `cancel` event is set (GitCancelled)."""
+    if cancel is not None and cancel.is_set():
+        raise GitCancelled(f"git {args[0]} was cancelled")
+    command = ["git", *args]
+    # Never wait on a credential prompt; private repos fail with a proper error instead.
+    env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+    process = subprocess.Popen(
+        command, cwd=cwd, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, text=True, start_new_session=True,
+    )
+    while True:
+        try:
+            out, err = process.communicate(timeout=GIT_POLL_SECONDS)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel is not None and cancel.is_set():
+                _kill(process)
+                raise GitCancelled(f"git {args[0]} was cancelled")
+            if deadline is not None and time.monotonic() > deadline:
+                _kill(process)
+                raise GitTimeout(f"git {args[0]} timed out")
+    if process.returncode != 0:
+        raise GitCommandError(command, process.returncode, err)
+    return out.strip()
+
+
+def _kill(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.communicate()
+
+
+def head_commit(repo_path):
+    return Repo(repo_path).head.commit.hexsha
+
+
+def fetch_latest(repo_path, deadline=None, cancel=None):
+    # Shallow fetch keeps the refresh as cheap as the original depth=1 clone.
+    run_git(["fetch", "--depth=1", "origin", "HEAD"], cwd=repo_path, deadline=deadline, cancel=cancel)
+    return run_git(["rev-parse", "FETCH_HEAD"], cwd=repo_path)
+
+
+def changed_files(repo_path, old_commit, new_commit):
+    """Returns (changed, removed) absolute paths between two commits."""
+    repo = Repo(repo_path)
+    output = repo.git.diff("--name-status", "--no-renames", "-z", old_commit, new_commit)
+    fields = [field for field in output.split("\0") if field]
+    changed = []
+    removed = []
+    for status, rel_path in zip(fields[0::2], fields[1::2]):
+        path = str(Path(repo_path) / rel_path)
+        if status.startswith("D"):
+            removed.append(path)
+        else:
+            changed.append(path)
+    return changed, removed
+
+
+def checkout(repo_path, commit, deadline=None, cancel=None):
+    # In a partial clone this also downloads the blobs the new commit needs.
+    run_git(["reset", "-q", "--hard", commit], cwd=repo_path, deadline=deadline, cancel=cancel)
+
+
+def tracked_files(repo_path):
+    """Repo-relative paths in the git index; .gitignored files are never tracked.
+    Files outside a sparse checkout (tagged "S") are left out."""
+    output = Repo(repo_path).git.ls_files("-z", "-t")
+    return [entry[2:] for entry in output.split("\0") if entry and not entry.startswith("S ")]
+
+
+def path_attributes(repo_path, rel_paths, attributes, batch_size=500):
+    """{path: {attribute: value}} from .gitattributes, for attributes that are set."""
+    repo = Repo(repo_path)
+    found = {}
+    for start in range(0, len(rel_paths), batch_size):
+        output = repo.git.check_attr("-z", *attributes, "--", *rel_paths[start:start + batch_size])
+        fields = output.split("\0")
+        for path, attribute, value in zip(fields[0::3], fields[1::3], fields[2::3]):
+            if value not in ("unspecified", "unset", "false"):
+                found.setdefault(path, {})[attribute] = value
+    return found
+
+
+def remote_head(repo_url, cancel=None):
+    """Commit the remote's HEAD points at, without cloning; None if it can't be resolved.
+    Setting `cancel` still stops it with GitCancelled."""
+    try:
+        output = run_git(["ls-remote", repo_url, "HEAD"], deadline=deadline_after(LS_REMOTE_TIMEOUT_SECONDS), cancel=cancel)
+    except (GitCommandError, GitTimeout):
+        return None
+    return output.split()[0] if output else None
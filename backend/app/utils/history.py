@@ -0,0 +1,90 @@
+import os
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from .tokens import count_tokens
+
+
+# Past turns are kept verbatim until they pass this many tokens, then the oldest are summarised.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+# The most recent turns are never folded into the summary.
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "2"))
+SUMMARY_FALLBACK_CHARS = 300
+
+
+def fallback_summary(summary, turns):
+    """Used when the summariser fails: the previous summary plus the folded questions."""
+    lines = [summary] if summary else []
+    for question, answer, _ in turns:
+        lines.append(f"- User asked: {question[:SUMMARY_FALLBACK_CHARS]}")
+    return "\n".join(lines)
+
+
+class ChatHistory:
+    """Conversation state for one session. Past turns keep only the question and the
+    answer, never the retrieved context, and once they exceed `token_budget` the
+    oldest are compacted into a running summary. The last turn's context is kept
+    on its own so a FOLLOWUP question can reuse it."""
+
+    def __init__(self, system_prompt, token_budget=HISTORY_TOKEN_BUDGET, keep_turns=HISTORY_KEEP_TURNS):
+        self.system = SystemMessage(content=system_prompt)
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary = ""
+        # (question, answer, tokens)
+        self.turns = []
+        self.last_context = ""
+
+    def __len__(self):
+        return len(self.turns)
+
+    def messages(self, prompt):
+        """The messages to send for a new turn whose user message is `prompt`."""
+        messages = [self.system]
+        if self.summary:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}"))
+        for question, answer, _ in self.turns:
+            messages.append(HumanMessage(content=question))
+            messages.append(AIMessage(content=answer))
+        messages.append(HumanMessage(content=prompt))
+        return messages
+
+    def add_turn(self, question, answer, context):
+        self.turns.append((question, answer, count_tokens(question) + count_tokens(answer)))
+        self.last_context = context
+
+    def pending_compaction(self):
+        """Oldest turns to fold into the summary, enough to bring the rest to half the budget."""
+        total = sum(turn[2] for turn in self.turns)
+        if total <= self.token_budget:
+            return []
+        foldable = len(self.turns) - self.keep_turns
+        count = 0
+        while count < foldable and total > self.token_budget // 2:
+            total -= self.turns[count][2]
+            count += 1
+        return self.turns[:count]
+
+    def apply_summary(self, summary, folded):
+        self.summary = summary
+        self.turns = self.turns[len(folded):]
+
+    def compact(self, summarise):
+        folded = self.pending_compaction()
+        if not folded:
+            return
+        try:
+            summary = summarise(self.summary, folded)
+        except Exception:
+            summary = fallback_summary(self.summary, folded)
+        self.apply_summary(summary, folded)
+
+    async def acompact(self, asummarise):
+        folded = self.pending_compaction()
+        if not folded:
+            return
+        try:
+            summary = await asummarise(self.summary, folded)
+        except Exception:
+            summary = fallback_summary(self.summary, folded)
+        self.apply_summary(summary, folded)
@@ -1,25 +1,48 @@
-from langchain_chroma import Chroma
-from langchain_community.document_loaders import (
-    UnstructuredMarkdownLoader,
-    TextLoader,
-    UnstructuredPDFLoader,
-    UnstructuredWordDocumentLoader,
-    UnstructuredRSTLoader,
-    NotebookLoader
-)
 from langchain_core.documents import Document
 from langchain.text_splitter import Language, RecursiveCharacterTextSplitter
-from langchain_openai.embeddings import OpenAIEmbeddings
 from dotenv import load_dotenv
 from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
 import os
-from charset_normalizer import from_path
+import pickle
+from types import SimpleNamespace
+from .embedding_cache import EmbeddingCache, CachedEmbeddings
+from .models import embedding_model
+from .timing import count, stage
+from .file_cache import FileContentCache, file_version
+from .document_parser import DocumentParser, ParsedTextCache, ISOLATED_EXTENSIONS, PARSE_WORKERS, load_with
+from .symbol_index import SymbolIndex, extract_symbols
+from .code_chunker import chunk_code
+from .file_index import FileIndex
+from .scan_policy import ScanReport, scan_repo
 
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 #CODE_EMBEDDING_MODEL = VoyageEmbeddings(model="voyage-code-3")
-CODE_EMBEDDING_MODEL = OpenAIEmbeddings(model="provider-3/text-embedding-3-small")
-NON_CODE_EMBEDDING_MODEL = OpenAIEmbeddings(model="provider-3/text-embedding-3-small")
+EMBEDDING_CACHE = EmbeddingCache()
+FILE_CACHE = FileContentCache()
+PARSED_TEXT_CACHE = ParsedTextCache()
+# Shared by every request that reads a document, so their workers are started once
+# and their number stays bounded however many requests come in.
+DOCUMENT_PARSER = DocumentParser(PARSED_TEXT_CACHE)
+# The embedding client behind these is only built on the first embedding request.
+CODE_EMBEDDING_MODEL = CachedEmbeddings(embedding_model, EMBEDDING_CACHE)
+NON_CODE_EMBEDDING_MODEL = CachedEmbeddings(embedding_model, EMBEDDING_CACHE)
+CHROMA_CODE_DIR = os.getenv("CHROMA_CODE_DIR", "../chroma_code_db")
+CHROMA_NONCODE_DIR = os.getenv("CHROMA_NONCODE_DIR", "../chroma_noncode_db")
+# "chroma", or "mmap" for the compact memory-mapped store in vector_store.py.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+# Ingestion pipeline tuning: chunking processes, chunks per embedding request,
+# and how many embedding/upsert batches may be in flight at once.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 4))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
 EXT_TO_LANGUAGE = {
     ".py": Language.PYTHON,
     ".js": Language.JS,
@@ -41,42 +64,58 @@ EXT_TO_LANGUAGE = {
     ".tsx":Language.TS
 }
 
+# Loader class names from langchain_community.document_loaders. They are imported on
+# first use, so the Unstructured stack only loads once a matching file turns up.
+# ISOLATED_EXTENSIONS are parsed by DocumentParser in worker processes.
 EXT_TO_LOADER = {
-    ".md": UnstructuredMarkdownLoader,
-    ".txt": TextLoader,
-    ".log":TextLoader,
-    ".gitignore": TextLoader,
-    ".rst": UnstructuredRSTLoader,
-    ".pdf": UnstructuredPDFLoader,
-    ".docx": UnstructuredWordDocumentLoader,
-    ".ipynb": NotebookLoader,
-    ".yml": TextLoader,
-    ".yaml": TextLoader,
-    ".json": TextLoader,
-    ".toml": TextLoader,
-    ".xml": TextLoader,  
-    ".tex": TextLoader,
+    ".md": "UnstructuredMarkdownLoader",
+    ".txt": "TextLoader",
+    ".log": "TextLoader",
+    ".gitignore": "TextLoader",
+    ".rst": "UnstructuredRSTLoader",
+    ".pdf": "UnstructuredPDFLoader",
+    ".docx": "UnstructuredWordDocumentLoader",
+    ".ipynb": "NotebookLoader",
+    ".yml": "TextLoader",
+    ".yaml": "TextLoader",
+    ".json": "TextLoader",
+    ".toml": "TextLoader",
+    ".xml": "TextLoader",
+    ".tex": "TextLoader",
 }
-NONCODE_VECTOR_STORE = Chroma(
-    collection_name="repo_noncode_chunks",
-    embedding_function=CODE_EMBEDDING_MODEL,
-    persist_directory="../chroma_noncode_db"
-)
-CODE_VECTOR_STORE = Chroma(
-    collection_name="repo_code_chunks",
-    embedding_function=CODE_EMBEDDING_MODEL,
-    persist_directory="../chroma_code_db"
-)
-CODE_VECTOR_STORE_RETRIEVER  = CODE_VECTOR_STORE.as_retriever()
-NONCODE_VECTOR_STORE_RETRIVER = NONCODE_VECTOR_STORE.as_retriever()
-
-def code_file_chunks(lang_enum,file_path):
-    splitter = RecursiveCharacterTextSplitter.from_language(language=lang_enum)
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-        code = f.read()
-        chunks = splitter.split_text(code)
 
-    return chunks
+
+def load_documents(filepath, ext):
+    return load_with(EXT_TO_LOADER[ext], filepath)
+
+
+@lru_cache(maxsize=None)
+def chroma_client(persist_directory):
+    # One client per directory, shared by every repo's collections; chromadb is imported here.
+    import chromadb
+    return chromadb.PersistentClient(path=persist_directory)
+
+
+# Every repo gets its own pair of collections, named after a hash of its URL.
+def open_vector_stores(repo_key):
+    if VECTOR_BACKEND == "mmap":
+        from .vector_store import MmapVectorStore
+        return (
+            MmapVectorStore(f"repo_code_chunks_{repo_key}", CODE_EMBEDDING_MODEL),
+            MmapVectorStore(f"repo_noncode_chunks_{repo_key}", NON_CODE_EMBEDDING_MODEL),
+        )
+    from langchain_chroma import Chroma
+    code_store = Chroma(
+        collection_name=f"repo_code_chunks_{repo_key}",
+        embedding_function=CODE_EMBEDDING_MODEL,
+        client=chroma_client(CHROMA_CODE_DIR)
+    )
+    noncode_store = Chroma(
+        collection_name=f"repo_noncode_chunks_{repo_key}",
+        embedding_function=NON_CODE_EMBEDDING_MODEL,
+        client=chroma_client(CHROMA_NONCODE_DIR)
+    )
+    return code_store, noncode_store
 
 
 def non_code_file_chunks(DATA):
@@ -92,16 +131,18 @@ def non_code_file_chunks(DATA):
 
 def validate_and_read_file(path):
     if os.path.isfile(path):
+        cached = FILE_CACHE.get(path)
+        if cached is not None:
+            return cached
+        version = file_version(path)
         file_path = Path(path)
         filename = file_path.name
         ext = file_path.suffix.lower()
         docs=None
-        if(ext in EXT_TO_LOADER):
-            loader_cls = EXT_TO_LOADER[ext]
-            result = from_path(file_path)
-            encoding = result.best().encoding
-            loader = loader_cls(file_path,encoding=encoding)
-            docs = loader.load()
+        if ext in ISOLATED_EXTENSIONS:
+            docs = [Document(page_content=DOCUMENT_PARSER.parse(file_path, ext, EXT_TO_LOADER[ext]))]
+        elif(ext in EXT_TO_LOADER):
+            docs = load_documents(file_path, ext)
         else:
             with open(file_path, 'r', encoding='utf-8') as f:
                 text = f.read()
@@ -115,6 +156,7 @@ def validate_and_read_file(path):
             )
             docs = [doc] 
         final_text = "\n\n".join(doc.page_content for doc in docs)
+        FILE_CACHE.put(path, final_text, filename, version)
         return (final_text,filename)
         
     else:
@@ -122,97 +164,315 @@ def validate_and_read_file(path):
 
 
 
-def save_code_embeddings(code_files_info):
-    ALL_CHUNKS = []
-    METADATA = []
+# The embedding models are cache-backed, so add_texts only sends chunks it has never seen to the API.
+def save_embeddings(store, texts, metadatas):
+    ids = [f"{m['file_path']}::{m['chunk_id']}" for m in metadatas]
+    store.add_texts(texts=texts, metadatas=metadatas, ids=ids)
 
-    for f in code_files_info:
-        for i, chunk in enumerate(f["chunks"]):
-            ALL_CHUNKS.append(chunk)
-            METADATA.append({
-                "file_path": f["path"],
-                "language": f["language"],
-                "chunk_id": i
-            })
 
-    CODE_VECTOR_STORE = Chroma.from_texts(
-                    collection_name="repo_code_chunks",
-                    texts=ALL_CHUNKS,
-                    embedding=CODE_EMBEDDING_MODEL,
-                    metadatas=METADATA,
-                    persist_directory="../chroma_code_db"
-                )
+class IngestProgress:
+    """Receives phase changes and counters from the ingestion pipeline.
+    The base class ignores them; background jobs override both methods."""
+
+    def phase(self, name):
+        pass
+
+    def count(self, **counts):
+        pass
+
+
+def chunk_file(filepath):
+    # Runs inside the chunking process pool, so it only returns plain data: chunks are
+    # dicts of text plus metadata. Loader output is handed back as `decoded`
+    # (version, text) for the file cache.
+    filepath = Path(filepath)
+    ext = filepath.suffix.lower()
+    code_chunks = []
+    non_code_chunks = []
+    symbols, calls = [], []
+    decoded = None
+    if ext in EXT_TO_LANGUAGE:
+        with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
+            code = f.read()
+        symbols, calls = extract_symbols(str(filepath), code, ext)
+        # Cut along definitions, so a retrieved chunk holds whole functions and classes.
+        code_chunks = chunk_code(code, symbols)
+    if ext in EXT_TO_LOADER:
+        version = file_version(filepath)
+        docs = load_documents(filepath, ext)
+        non_code_chunks = [{"text": doc.page_content} for doc in non_code_file_chunks(docs)]
+        decoded = (version, "\n\n".join(doc.page_content for doc in docs))
+    return str(filepath), ext, code_chunks, non_code_chunks, symbols, calls, decoded
+
+
+def chunk_document(filepath, parser):
+    """chunk_file's result for a document that `parser` reads in a worker process."""
+    filepath = Path(filepath)
+    ext = filepath.suffix.lower()
+    version = file_version(filepath)
+    text = parser.parse(filepath, ext, EXT_TO_LOADER[ext])
+    non_code_chunks = [{"text": doc.page_content} for doc in non_code_file_chunks([Document(page_content=text)])]
+    return str(filepath), ext, [], non_code_chunks, [], [], (version, text)
+
+
+def chunk_files(paths, workers, progress):
+    """chunk_file's tuple for each of `paths`. A file that fails to chunk is logged,
+    counted as failed and left out, rather than failing the whole ingest."""
+    with DocumentParser(PARSED_TEXT_CACHE) as parser:
+        if workers <= 1:
+            for filepath in paths:
+                try:
+                    if filepath.suffix.lower() in ISOLATED_EXTENSIONS:
+                        result = chunk_document(filepath, parser)
+                    else:
+                        result = chunk_file(filepath)
+                except Exception:
+                    chunk_failed(filepath, progress)
+                    continue
+                yield result
+            return
+        yield from _chunk_in_pools(paths, workers, parser, progress)
+
+
+def chunk_failed(filepath, progress):
+    logger.exception("Skipping %s: chunking failed", filepath)
+    count("ingest_file_failures", ext=filepath.suffix.lower())
+    progress.count(files_failed=1)
+
+
+def _chunk_in_pools(paths, workers, parser, progress):
+    # Keep only a small window of files in flight so memory does not grow with repo size.
+    max_in_flight = workers * 4
+    # Spawned rather than forked: the parent has embedding, request and parser threads running.
+    context = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    # Files that were in flight when a chunking process died; one of them may have killed it.
+    suspects = []
+    pending = {}
+
+    def restart(broken):
+        broken.shutdown(wait=False, cancel_futures=True)
+        logger.warning("A chunking process died, restarting the pool")
+        count("ingest_pool_restarts")
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context)
 
+    def submit(filepath):
+        nonlocal pool
+        try:
+            future = pool.submit(chunk_file, filepath)
+        except BrokenProcessPool:
+            pool = restart(pool)
+            future = pool.submit(chunk_file, filepath)
+        pending[future] = (filepath, pool)
 
+    def results(futures):
+        nonlocal pool
+        for future in futures:
+            filepath, owner = pending.pop(future)
+            try:
+                yield future.result()
+            except BrokenProcessPool:
+                if owner is pool:
+                    pool = restart(pool)
+                suspects.append(filepath)
+            except Exception:
+                chunk_failed(filepath, progress)
 
-def save_non_code_embeddings(non_code_files_info):
-    ALL_CHUNKS = []
-    METADATA = []
+    # Documents wait on their parser worker from a thread, next to the chunking processes.
+    try:
+        with ThreadPoolExecutor(max_workers=PARSE_WORKERS) as parse_pool:
+            for filepath in paths:
+                ext = filepath.suffix.lower()
+                if ext not in EXT_TO_LANGUAGE and ext not in EXT_TO_LOADER:
+                    yield str(filepath), ext, [], [], [], [], None
+                    continue
+                if ext in ISOLATED_EXTENSIONS:
+                    pending[parse_pool.submit(chunk_document, filepath, parser)] = (filepath, None)
+                else:
+                    submit(filepath)
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from results(done)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from results(done)
+    finally:
+        pool.shutdown(cancel_futures=True)
+    yield from _chunk_suspects(suspects, context, progress)
 
-    for f in non_code_files_info:
-        for i, chunk in enumerate(f["chunks"]):
-            ALL_CHUNKS.append(chunk.page_content)
-            METADATA.append({
-                "file_path": f["path"],
-                "language":f["language"],
+
+def _chunk_suspects(paths, context, progress):
+    """Chunks files that were in flight when a chunking process died, one at a time in a
+    process of their own, so the file that kills it again fails alone and is skipped."""
+    pool = None
+    try:
+        for filepath in paths:
+            if pool is None:
+                pool = ProcessPoolExecutor(max_workers=1, mp_context=context)
+            try:
+                yield pool.submit(chunk_file, filepath).result()
+            except BrokenProcessPool:
+                pool.shutdown(wait=False)
+                pool = None
+                chunk_failed(filepath, progress)
+            except Exception:
+                chunk_failed(filepath, progress)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+class ChunkBatcher:
+    """Groups chunks into fixed-size batches and embeds/upserts them on a thread pool,
+    blocking once `max_pending` batches are in flight. Chunks go into the store's
+    lexical index as they arrive."""
+
+    def __init__(self, store, lexical_index, batch_size, pool, max_pending, progress):
+        self.store = store
+        self.lexical_index = lexical_index
+        self.progress = progress
+        self.batch_size = batch_size
+        self.pool = pool
+        self.max_pending = max_pending
+        self.pending = set()
+        self.texts = []
+        self.metadatas = []
+
+    def add(self, path, language, chunks):
+        for i, chunk in enumerate(chunks):
+            self.texts.append(chunk["text"])
+            self.metadatas.append({
+                **{key: value for key, value in chunk.items() if key != "text"},
+                "file_path": path,
+                "language": language,
                 "chunk_id": i
             })
-    
-    NONCODE_VECTOR_STORE = Chroma.from_texts(
-        collection_name="repo_noncode_chunks",
-        texts=ALL_CHUNKS,
-        embedding=CODE_EMBEDDING_MODEL,
-        metadatas=METADATA,
-        persist_directory="../chroma_noncode_db"
-    )
+            self.lexical_index.add(f"{path}::{i}", path, chunk["text"])
+            if len(self.texts) >= self.batch_size:
+                self.submit()
+
+    def submit(self):
+        if len(self.pending) >= self.max_pending:
+            done, self.pending = wait(self.pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        self.pending.add(self.pool.submit(self.save, self.texts, self.metadatas))
+        self.texts = []
+        self.metadatas = []
 
+    def save(self, texts, metadatas):
+        with stage("embed_batch"):
+            save_embeddings(self.store, texts, metadatas)
+        self.progress.count(chunks_embedded=len(texts))
 
-def ingest_repo(repo_path):
-    CODE_FILES_INFO = []
-    FILES_SYMBOL_TABLE = []
-    NON_CODE_FILES_INFO = []
+    def flush(self):
+        if self.texts:
+            self.submit()
+        for future in as_completed(self.pending):
+            future.result()
+        self.pending = set()
+
+
+def counted(paths, progress):
+    for filepath in paths:
+        progress.count(files_found=1)
+        yield filepath
+    # The scan is done; files it found may still be chunking.
+    progress.phase("chunk")
+
+
+def ingest_files(paths, index, workers, batch_size, progress):
+    # Scanning, chunking and embedding overlap; the reported phase is the earliest one still running.
+    progress.phase("scan")
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as embed_pool:
+        code_batches = ChunkBatcher(index.code_store, index.code_lexical, batch_size, embed_pool, EMBED_CONCURRENCY, progress)
+        non_code_batches = ChunkBatcher(index.noncode_store, index.noncode_lexical, batch_size, embed_pool, EMBED_CONCURRENCY, progress)
+
+        with stage("ingest_chunk"):
+            for path, ext, code_chunks, non_code_chunks, symbols, calls, decoded in chunk_files(counted(paths, progress), workers, progress):
+                progress.count(files_chunked=1, chunks_total=len(code_chunks) + len(non_code_chunks))
+                if decoded is not None:
+                    FILE_CACHE.put(path, decoded[1], Path(path).name, decoded[0])
+                index.symbol_index.add_file(path, symbols, calls)
+                index.file_symbol_table.append(
+                    {
+                        "path":path,
+                        "language":ext,
+                        "filename": Path(path).name
+                    }
+                )
+                if ext in EXT_TO_LANGUAGE:
+                    code_batches.add(path, EXT_TO_LANGUAGE[ext].name, code_chunks)
+                if ext in EXT_TO_LOADER:
+                    non_code_batches.add(path, ext, non_code_chunks)
+
+        progress.phase("embed")
+        with stage("ingest_flush"):
+            code_batches.flush()
+            non_code_batches.flush()
+
+
+def left_behind(paths, live, staged):
+    """Chunk ids `live` held for `paths` that the re-indexed `staged` no longer has."""
+    return [doc_id for path in paths for doc_id in live.by_file.get(path, ()) if doc_id not in staged.doc_lengths]
+
+
+def ingest_repo(repo_path, index, workers=None, batch_size=None, progress=None):
+    """Builds everything `index` holds for the repo at `repo_path`: its vector store
+    collections and their lexical indexes, file table, file index and symbol index.
+    Files the scan policy skips are listed in `index.scan_report`."""
+    workers = workers or INGEST_WORKERS
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    progress = progress or IngestProgress()
     repo_path = Path(repo_path)
 
-    for filepath in repo_path.rglob("*"):
-        if ".git" in filepath.parts:
-            continue
-        if filepath.is_file():
-            filename = filepath.name
-            ext = filepath.suffix.lower()
-            FILES_SYMBOL_TABLE.append(
-                {
-                    "path":str(filepath),
-                    "language":ext,
-                    "filename": filename
-                }
-            )
+    index.code_store.reset_collection()
+    index.noncode_store.reset_collection()
+    index.file_symbol_table = []
+    index.symbol_index = SymbolIndex()
+    index.code_lexical.clear()
+    index.noncode_lexical.clear()
+    index.scan_report = ScanReport()
+    ingest_files(scan_repo(repo_path, index.scan_report), index, workers, batch_size, progress)
+    index.file_index = FileIndex(index.file_symbol_table, repo_path)
+
+    return index.file_symbol_table
+
+
+def update_repo(changed_paths, removed_paths, index, workers=None, batch_size=None, progress=None):
+    """Re-index only the given files. The file table, symbol, lexical and file indexes are
+    rebuilt from copies beside the live ones and swapped in at the end, so chats reading
+    `index` meanwhile keep seeing a complete index. New chunks are upserted into the vector
+    stores under their ids; the ones the update leaves behind are deleted after the swap."""
+    workers = workers or INGEST_WORKERS
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    progress = progress or IngestProgress()
+    stale = {str(p) for p in changed_paths} | {str(p) for p in removed_paths}
+    if not stale:
+        return index.file_symbol_table
+
+    # A pickle round trip copies these much faster than deepcopy does.
+    state = {field: pickle.loads(pickle.dumps(getattr(index, field), pickle.HIGHEST_PROTOCOL))
+             for field in ("symbol_index", "code_lexical", "noncode_lexical", "scan_report")}
+    state["file_symbol_table"] = [entry for entry in index.file_symbol_table if entry["path"] not in stale]
+    for path in stale:
+        state["symbol_index"].remove_file(path)
+        state["code_lexical"].remove_file(path)
+        state["noncode_lexical"].remove_file(path)
+    root = index.file_index.root
+    for path in stale:
+        state["scan_report"].forget(os.path.relpath(path, root).replace(os.sep, "/"))
+    existing = [os.path.relpath(p, root).replace(os.sep, "/") for p in changed_paths if Path(p).is_file()]
+    staged = SimpleNamespace(code_store=index.code_store, noncode_store=index.noncode_store, **state)
+    ingest_files(scan_repo(root, staged.scan_report, existing), staged, workers, batch_size, progress)
+
+    leftovers = [
+        (index.code_store, left_behind(stale, index.code_lexical, staged.code_lexical)),
+        (index.noncode_store, left_behind(stale, index.noncode_lexical, staged.noncode_lexical)),
+    ]
+    index.swap(state)
+    for store, ids in leftovers:
+        if ids:
+            store.delete(ids=ids)
 
-            if ext in EXT_TO_LANGUAGE:
-                lang_enum = EXT_TO_LANGUAGE[ext]
-                chunks = code_file_chunks(lang_enum,filepath)
-                CODE_FILES_INFO.append({
-                    "path": str(filepath),
-                    "language": lang_enum.name,
-                    "chunks": chunks
-                })
-
-            if ext in EXT_TO_LOADER:
-                loader_cls = EXT_TO_LOADER[ext]
-                result = from_path(filepath)
-                encoding = result.best().encoding
-                loader = loader_cls(filepath,encoding=encoding)
-                docs = loader.load()
-                chunks = non_code_file_chunks(docs)
-                NON_CODE_FILES_INFO.append({
-                    "path": str(filepath),
-                    "language":ext,
-                    "chunks": chunks
-                })
-            
-    #print(CODE_FILES_INFO)
-
-    if(len(CODE_FILES_INFO)!=0):
-        save_code_embeddings(CODE_FILES_INFO)
-    if(len(NON_CODE_FILES_INFO)!=0):
-        save_non_code_embeddings(NON_CODE_FILES_INFO)
-    return FILES_SYMBOL_TABLE
+    return index.file_symbol_table
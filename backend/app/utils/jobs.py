@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .ingest_repo import IngestProgress
+
+
+MAX_CONCURRENT_INGESTS = int(os.getenv("MAX_CONCURRENT_INGESTS", "2"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+
+class JobError(Exception):
+    """Raised by a job to fail with a specific HTTP-style status code."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class Job(IngestProgress):
+    def __init__(self, repo_url):
+        self.id = uuid.uuid4().hex
+        self.repo_url = repo_url
+        self.status = "queued"
+        self.current_phase = "queued"
+        self.counts = {"files_found": 0, "files_chunked": 0, "files_failed": 0, "chunks_total": 0, "chunks_embedded": 0}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        # Set by JobScheduler.cancel; git commands run for the job stop when it is.
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+
+    def phase(self, name):
+        self.current_phase = name
+
+    def count(self, **counts):
+        with self.lock:
+            for key, value in counts.items():
+                self.counts[key] = self.counts.get(key, 0) + value
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "job_id": self.id,
+                "repo_url": self.repo_url,
+                "status": self.status,
+                "phase": self.current_phase,
+                **self.counts,
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobScheduler:
+    """Runs clone/ingest jobs on a bounded pool. Submitting a repo URL that already has
+    a queued or running job returns that job instead of starting another."""
+
+    def __init__(self, max_workers=MAX_CONCURRENT_INGESTS):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self.jobs = {}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def submit(self, repo_url, fn):
+        """Returns (job, created). `fn(job)` is only scheduled when created is True."""
+        with self.lock:
+            self._prune()
+            job = self.in_flight.get(repo_url)
+            if job is not None:
+                return job, False
+            job = Job(repo_url)
+            self.jobs[job.id] = job
+            self.in_flight[repo_url] = job
+        self.pool.submit(self._run, job, fn)
+        return job, True
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Asks a job to stop. Its git commands are killed; ingestion already under way
+        runs to the end."""
+        job = self.get(job_id)
+        if job is not None and job.finished_at is None:
+            job.cancelled.set()
+        return job
+
+    def _run(self, job, fn):
+        job.status = "running"
+        try:
+            job.result = fn(job)
+            job.status = "done"
+            job.phase("done")
+        except JobError as e:
+            job.error = {"status_code": e.status_code, "detail": e.detail}
+            job.status = "cancelled" if job.cancelled.is_set() else "failed"
+        except Exception as e:
+            job.error = {"status_code": 500, "detail": f"Internal error: {str(e)}"}
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            with self.lock:
+                self.in_flight.pop(job.repo_url, None)
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self.jobs[job_id]
@@ -0,0 +1,187 @@
+import heapq
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal rank fusion constant; 60 is the value from the original RRF paper.
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Each ranker contributes this many times k candidates to the fusion.
+HYBRID_FANOUT = int(os.getenv("HYBRID_FANOUT", "3"))
+# Optional CPU cross-encoder used to rerank fused results, e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2".
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "")
+# Threads for retrieval work, shared by hybrid retrievers and the chat pipeline's prefetch.
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "8"))
+RETRIEVAL_POOL = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+SUBWORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+
+def tokenize(text):
+    """Identifiers as written (lower-cased) plus their camelCase/snake_case parts,
+    so `getUserName` matches both "getusername" and "user"."""
+    tokens = []
+    for identifier in IDENTIFIER.findall(text):
+        lowered = identifier.lower()
+        tokens.append(lowered)
+        parts = SUBWORD.findall(identifier)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts if len(part) > 1)
+    return tokens
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index over one vector store's chunks, using the
+    same ids as the store so hits can be fetched back from it."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.postings = defaultdict(dict)
+            self.doc_terms = {}
+            self.doc_lengths = {}
+            self.total_length = 0
+            # path -> chunk ids, for removing a file again
+            self.by_file = defaultdict(list)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def add(self, doc_id, path, text):
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        with self.lock:
+            # Ids embed their path, so a known id is already listed under it in by_file.
+            known = doc_id in self.doc_lengths
+            if known:
+                self._remove_doc(doc_id)
+            for term, tf in counts.items():
+                self.postings[term][doc_id] = tf
+            self.doc_terms[doc_id] = tuple(counts)
+            self.doc_lengths[doc_id] = length
+            self.total_length += length
+            if not known:
+                self.by_file[path].append(doc_id)
+
+    def _remove_doc(self, doc_id):
+        for term in self.doc_terms.pop(doc_id, ()):
+            docs = self.postings[term]
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id, 0)
+
+    def remove_file(self, path):
+        with self.lock:
+            for doc_id in self.by_file.pop(path, []):
+                self._remove_doc(doc_id)
+
+    def search(self, query, k):
+        """Top-k (doc id, BM25 score) for the query."""
+        terms = set(tokenize(query))
+        with self.lock:
+            n = len(self.doc_lengths)
+            if n == 0:
+                return []
+            average = self.total_length / n
+            scores = defaultdict(float)
+            for term in terms:
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / average)
+                    scores[doc_id] += idf * tf * (BM25_K1 + 1) / norm
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """The configured cross-encoder, loaded on first use; None when disabled or
+    sentence-transformers is not installed."""
+    global _reranker
+    if not RERANKER_MODEL:
+        return None
+    with _reranker_lock:
+        if _reranker is None:
+            try:
+                from sentence_transformers import CrossEncoder
+                _reranker = CrossEncoder(RERANKER_MODEL, device="cpu")
+            except ImportError:
+                _reranker = False
+        return _reranker or None
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuses ranked id lists into one, best first."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def doc_id(metadata):
+    return f"{metadata['file_path']}::{metadata['chunk_id']}"
+
+
+class HybridRetriever:
+    """Vector and BM25 retrieval over one store, fused with reciprocal rank fusion
+    and optionally reranked on CPU. Quacks like the store's own retriever."""
+
+    def __init__(self, store, lexical_index, fanout=HYBRID_FANOUT, pool=RETRIEVAL_POOL):
+        self.store = store
+        self.lexical_index = lexical_index
+        self.fanout = fanout
+        self.pool = pool
+
+    def get_relevant_documents(self, query, k=4):
+        depth = k * self.fanout
+        # The pool embeds the query and searches the store while BM25 runs here. A search
+        # still queued once BM25 is done is taken back and run here too, so a call made
+        # from a pool thread never waits on a pool that is full of such calls.
+        vector_future = self.pool.submit(self.store.similarity_search, query, k=depth)
+        lexical_hits = self.lexical_index.search(query, depth)
+        if vector_future.cancel():
+            vector_docs = self.store.similarity_search(query, k=depth)
+        else:
+            vector_docs = vector_future.result()
+
+        docs = {doc_id(doc.metadata): doc for doc in vector_docs}
+        fused = reciprocal_rank_fusion([list(docs), [hit for hit, _ in lexical_hits]])
+        missing = [hit for hit in fused[:depth] if hit not in docs]
+        if missing:
+            found = self.store.get(ids=missing)
+            for hit, text, metadata in zip(found["ids"], found["documents"], found["metadatas"]):
+                docs[hit] = Document(page_content=text, metadata=metadata)
+        ranked = [docs[hit] for hit in fused if hit in docs]
+
+        reranker = get_reranker()
+        if reranker is not None and len(ranked) > k:
+            scores = reranker.predict([(query, doc.page_content) for doc in ranked[:depth]])
+            ranked = [doc for _, doc in sorted(zip(scores, ranked), key=lambda pair: -pair[0])]
+        return ranked[:k]
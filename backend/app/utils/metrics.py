@@ -0,0 +1,117 @@
+import bisect
+import threading
+
+from .timing import add_observer, add_counter
+
+
+METRIC_PREFIX = "codewhisper"
+# Seconds; wide enough for a cached lookup at one end and a full ingest flush at the other.
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Stage timings and event counters fed by app.utils.timing, rendered in the
+    Prometheus text exposition format. Gauges (cache and session stats) are not
+    stored here; they are read from their owners at scrape time."""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # (stage, sorted labels) -> [per-bucket counts, sum, count]
+        self.histograms = {}
+        # (counter name, sorted labels) -> total
+        self.counters = {}
+
+    def observe(self, name, seconds, labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect.bisect_left(self.buckets, seconds)
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def count(self, name, amount, labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def install(self):
+        add_observer(self.observe)
+        add_counter(self.count)
+        return self
+
+    def _render_histograms(self, lines):
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines.append(f"# HELP {name} Time spent in each stage of answering a question or ingesting a repo.")
+        lines.append(f"# TYPE {name} histogram")
+        for (stage, labels), (buckets, total, observations) in sorted(self.histograms.items()):
+            labels = (("stage", stage),) + labels
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float("inf"),), buckets + [observations - sum(buckets)]):
+                cumulative += hits
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {observations}")
+
+    def _render_counters(self, lines):
+        by_name = {}
+        for (name, labels), total in sorted(self.counters.items()):
+            by_name.setdefault(name, []).append((labels, total))
+        for name, series in by_name.items():
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for labels, total in series:
+                lines.append(f"{metric}{_labels(labels)} {_number(total)}")
+
+    def render(self, gauges=()):
+        """The exposition text. `gauges` is (name, help, [(labels dict, value)]) triples."""
+        lines = []
+        with self.lock:
+            self._render_histograms(lines)
+            self._render_counters(lines)
+        for name, help_text, series in gauges:
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for labels, value in series:
+                lines.append(f"{metric}{_labels(sorted(labels.items()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def cache_gauges(caches):
+    """Gauges for {cache name: stats dict}; stats with "hits"/"misses" also get a hit ratio."""
+    gauges = []
+    for field, help_text in (
+        ("hits", "Lookups answered from the cache."),
+        ("misses", "Lookups the cache could not answer."),
+        ("hit_rate", "Share of lookups answered from the cache."),
+        ("entries", "Entries held by the cache."),
+        ("bytes", "Bytes held by the cache."),
+    ):
+        series = [({"cache": cache}, stats[field]) for cache, stats in caches.items() if field in stats]
+        if series:
+            gauges.append((f"cache_{field}", help_text, series))
+    return gauges
+
+
+METRICS = Metrics().install()
@@ -0,0 +1,59 @@
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.utils.timing import count
+
+
+load_dotenv()
+# "openai" talks to the real API; "fake" uses deterministic local stand-ins, for benchmarks and offline runs.
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "openai")
+CHAT_MODEL_NAME = os.getenv("CHAT_MODEL_NAME", "provider-3/gpt-4.1-nano")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "provider-3/text-embedding-3-small")
+
+
+class TokenUsage(BaseCallbackHandler):
+    """Counts prompt and completion tokens reported by every call to one chat model."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def on_llm_end(self, response, **kwargs):
+        count("llm_calls", model=self.model)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    count("llm_tokens", usage.get("input_tokens", 0), model=self.model, kind="prompt")
+                    count("llm_tokens", usage.get("output_tokens", 0), model=self.model, kind="completion")
+
+
+# Clients are built on first use and shared, so importing the app stays cheap and every
+# caller reuses one connection pool. langchain_openai is only imported at that point.
+@lru_cache(maxsize=None)
+def chat_model(model=CHAT_MODEL_NAME):
+    if MODEL_BACKEND == "fake":
+        from app.utils.fake_models import FakeChatModel
+        return FakeChatModel(callbacks=[TokenUsage("fake-chat")])
+    from langchain_openai import ChatOpenAI
+    # stream_usage makes streamed answers report their token counts too.
+    return ChatOpenAI(model=model, stream_usage=True, callbacks=[TokenUsage(model)])
+
+
+@lru_cache(maxsize=None)
+def structured_model(schema, model=CHAT_MODEL_NAME):
+    if MODEL_BACKEND == "fake":
+        from app.utils.fake_models import fake_structured
+        return fake_structured(schema)
+    return chat_model(model).with_structured_output(schema)
+
+
+@lru_cache(maxsize=None)
+def embedding_model(model=EMBEDDING_MODEL_NAME):
+    if MODEL_BACKEND == "fake":
+        from app.utils.fake_models import FakeEmbeddings
+        return FakeEmbeddings()
+    from langchain_openai.embeddings import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=model)
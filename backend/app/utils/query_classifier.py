@@ -0,0 +1,111 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+
+FAST_PATH_CONFIDENCE = float(os.getenv("FAST_PATH_CONFIDENCE", "0.8"))
+CLASSIFIER_MEMO_SIZE = int(os.getenv("CLASSIFIER_MEMO_SIZE", "10000"))
+
+ACKNOWLEDGEMENTS = {
+    "thanks", "thank you", "thanks a lot", "thank you so much", "thx", "ty", "ok", "okay", "ok thanks",
+    "okay thanks", "got it", "got it thanks", "i got it", "i see", "cool", "great", "nice", "perfect",
+    "awesome", "makes sense", "that makes sense", "understood", "yes", "no", "sure", "yes please",
+}
+FOLLOWUP_PATTERN = re.compile(
+    r"^(and|also|so|but|what about|how about|why( is that| not)?|can you (explain|elaborate|clarify|expand)|"
+    r"could you (explain|elaborate|clarify|expand|summari[sz]e)|tell me more|more|explain (more|further|that|this|it)|"
+    r"elaborate|go on|continue|summari[sz]e (that|this|it|what you)|what do you mean|in simpler terms|"
+    r"give (me )?an example|yes,? please)\b"
+)
+GENERAL_PATTERN = re.compile(
+    r"\b(this|the) (repo|repository|project|codebase|code base|library|app|application)\b|"
+    r"\b(install|installation|set ?up|build|deploy|contribut\w*|license|dependencies|overview|"
+    r"purpose|architecture|tech stack|getting started|maintain\w*)\b"
+)
+# Shapes that only show up in code identifiers: snake_case, camelCase and PascalCase with inner capitals.
+IDENTIFIER_SHAPE = re.compile(r"^(?:\w*_\w*|[a-z]+[A-Z]\w*|[A-Z][a-z0-9]+[A-Z]\w*)$")
+CODE_WORDS = r"(?:function|func|method|class|struct|interface|enum|trait|module|def|fn)"
+
+
+def normalise(query):
+    return " ".join(re.sub(r"[^\w\s./()-]", " ", query.lower()).split())
+
+
+class QueryClassifier:
+    """Classifies queries from the repo's own file and symbol names, falling back to
+    the LLM only when the local guess is not confident. Results are memoised per repo."""
+
+    def __init__(self, threshold=FAST_PATH_CONFIDENCE, memo_size=CLASSIFIER_MEMO_SIZE):
+        self.threshold = threshold
+        self.memo_size = memo_size
+        self.memo = OrderedDict()
+        self.lock = threading.Lock()
+        self.total = 0
+        self.fast_path_hits = 0
+        self.memo_hits = 0
+
+    def guess(self, query, repo):
+        """Returns (category, confidence)."""
+        text = normalise(query).rstrip(" .!?")
+        if text in ACKNOWLEDGEMENTS:
+            return "FOLLOWUP", 0.95
+
+        files = repo.file_index.mentions(query)
+        symbols = repo.symbol_index.find_in_query(query)
+        code_like = [
+            name for name in symbols
+            if IDENTIFIER_SHAPE.match(name)
+            or re.search(rf"\b{re.escape(name)}\s*\(", query)
+            or re.search(rf"\b{CODE_WORDS}\s+`?{re.escape(name)}\b|\b{re.escape(name)}`?\s+{CODE_WORDS}\b", query, re.IGNORECASE)
+        ]
+
+        if files and not symbols:
+            return "FILE", 0.9
+        if code_like and not files:
+            return "FUNCTION&CLASS", 0.9
+        if files or symbols:
+            # A file and a symbol both named, or a symbol that is also a plain word ("run").
+            return ("FILE" if files else "FUNCTION&CLASS"), 0.6
+        if FOLLOWUP_PATTERN.match(text) and len(text.split()) <= 8:
+            return "FOLLOWUP", 0.85
+        if GENERAL_PATTERN.search(text):
+            return "GENERAL", 0.85
+        return "GENERAL", 0.3
+
+    def fast_path(self, query, repo):
+        """Returns the category if it can be decided locally, otherwise None."""
+        key = (repo.key, repo.commit, normalise(query))
+        with self.lock:
+            self.total += 1
+            if key in self.memo:
+                self.memo.move_to_end(key)
+                self.memo_hits += 1
+                return self.memo[key]
+
+        category, confidence = self.guess(query, repo)
+        if confidence < self.threshold:
+            return None
+        with self.lock:
+            self.fast_path_hits += 1
+        self.remember(query, repo, category)
+        return category
+
+    def remember(self, query, repo, category):
+        key = (repo.key, repo.commit, normalise(query))
+        with self.lock:
+            self.memo[key] = category
+            self.memo.move_to_end(key)
+            while len(self.memo) > self.memo_size:
+                self.memo.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            local = self.fast_path_hits + self.memo_hits
+            return {
+                "queries": self.total,
+                "fast_path": self.fast_path_hits,
+                "memo_hits": self.memo_hits,
+                "llm_fallbacks": self.total - local,
+                "fast_path_hit_rate": round(local / self.total, 4) if self.total else 0.0,
+            }
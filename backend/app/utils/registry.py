@@ -0,0 +1,162 @@
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+
+from .ingest_repo import open_vector_stores
+
+
+INDEX_REGISTRY_DIR = os.path.abspath(os.getenv("INDEX_REGISTRY_DIR", "../index_registry"))
+INDEX_REGISTRY_MAX_BYTES = int(os.getenv("INDEX_REGISTRY_MAX_BYTES", str(20 * 1024 ** 3)))
+# Vector stores share directories between collections, so their size is estimated:
+# a 1536-dim float32 vector plus the chunk text and metadata.
+VECTOR_BYTES_PER_CHUNK = 8 * 1024
+
+
+def directory_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class IndexRegistry:
+    """Completed repo indexes kept on disk between inits, keyed by repo URL and the
+    commit they were built from. An entry owns a checkout, a pair of Chroma
+    collections and a pickle of the in-memory indexes; least recently used
+    entries are deleted once their total size passes `max_bytes`."""
+
+    def __init__(self, root=INDEX_REGISTRY_DIR, max_bytes=INDEX_REGISTRY_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.manifest = os.path.join(root, "registry.json")
+        # Read on first use, so importing the app neither creates the directory nor prunes it.
+        self._entries = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            with self._load_lock:
+                if self._entries is None:
+                    self._load()
+        return self._entries
+
+    def _load(self):
+        os.makedirs(self.root, exist_ok=True)
+        entries = {}
+        if os.path.exists(self.manifest):
+            with open(self.manifest) as f:
+                entries = json.load(f)
+        # Entries whose checkout or state went missing while we were down are useless.
+        for key in [k for k, e in entries.items() if not self._complete(e)]:
+            self._delete(entries.pop(key))
+        self._entries = entries
+        self._save()
+
+    def _state_path(self, key):
+        return os.path.join(self.root, f"{key}.pkl")
+
+    def _complete(self, entry):
+        # A worktree checkout has a .git file rather than a directory.
+        return os.path.exists(os.path.join(entry["path"], ".git")) and os.path.exists(self._state_path(entry["key"]))
+
+    def _save(self):
+        tmp = self.manifest + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.manifest)
+
+    def owns(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def lookup(self, repo_url, commit):
+        """The registered entry for `repo_url` at `commit`, or None."""
+        with self.lock:
+            for entry in self.entries.values():
+                if entry["repo_url"] == repo_url and entry["commit"] == commit and self._complete(entry):
+                    entry["last_used"] = time.time()
+                    self.hits += 1
+                    self._save()
+                    return dict(entry)
+            self.misses += 1
+            return None
+
+    def load_state(self, entry):
+        with open(self._state_path(entry["key"]), "rb") as f:
+            return pickle.load(f)
+
+    def register(self, repo, in_use=()):
+        """Saves a built index and records it under its current commit, replacing any
+        entry for an older commit of the same index (incremental refreshes)."""
+        # Imported on use, like the vector store backends themselves.
+        from .vector_store import count_vectors
+        # Loads the registry, creating its directory, before the state is written into it.
+        entries = self.entries
+        state_path = self._state_path(repo.key)
+        with open(state_path + ".tmp", "wb") as f:
+            pickle.dump(repo.state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(state_path + ".tmp", state_path)
+        chunks = count_vectors(repo.code_store) + count_vectors(repo.noncode_store)
+        size = directory_size(repo.path) + os.path.getsize(state_path) + chunks * VECTOR_BYTES_PER_CHUNK
+        with self.lock:
+            entries[repo.key] = {
+                "key": repo.key,
+                "repo_url": repo.repo_url,
+                "commit": repo.commit,
+                "path": repo.path,
+                "size_bytes": size,
+                "created": time.time(),
+                "last_used": time.time(),
+            }
+            self._save()
+        self.gc(in_use)
+
+    def gc(self, in_use=()):
+        """Deletes least recently used entries not held by a live index until the
+        registry fits its byte budget."""
+        victims = []
+        with self.lock:
+            total = sum(e["size_bytes"] for e in self.entries.values())
+            for entry in sorted(self.entries.values(), key=lambda e: e["last_used"]):
+                if total <= self.max_bytes:
+                    break
+                if entry["key"] in in_use:
+                    continue
+                victims.append(self.entries.pop(entry["key"]))
+                total -= entry["size_bytes"]
+            if victims:
+                self._save()
+        for entry in victims:
+            self._delete(entry)
+        return len(victims)
+
+    def _delete(self, entry):
+        if os.path.exists(entry["path"]):
+            shutil.rmtree(entry["path"], ignore_errors=True)
+        for store in open_vector_stores(entry["key"]):
+            store.delete_collection()
+        if os.path.exists(self._state_path(entry["key"])):
+            os.remove(self._state_path(entry["key"]))
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": sum(e["size_bytes"] for e in self.entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,160 @@
+import os
+from collections import Counter
+from pathlib import Path
+
+from git import GitCommandError, InvalidGitRepositoryError
+
+from .git_sync import tracked_files, path_attributes
+
+
+SCAN_MAX_FILE_BYTES = int(os.getenv("SCAN_MAX_FILE_BYTES", str(1024 ** 2)))
+SCAN_MAX_TOTAL_BYTES = int(os.getenv("SCAN_MAX_TOTAL_BYTES", str(256 * 1024 ** 2)))
+# Installed dependencies, build output and caches, which never hold the repo's own code.
+# Deliberately narrower than file_selection.VENDORED_DIRS: that set only ranks files
+# lower and includes names like .github, bin and gen that are often worth indexing.
+SKIP_DIRS = {
+    "node_modules", "bower_components", "vendor", "dist", "target", "site-packages", "__pycache__",
+    ".venv", "venv", ".tox", ".nox", ".mypy_cache", ".pytest_cache", ".gradle", ".next", ".nuxt",
+}
+# Extra directory names to skip, comma separated, on top of SKIP_DIRS.
+SCAN_SKIP_DIRS = SKIP_DIRS | {d.strip() for d in os.getenv("SCAN_SKIP_DIRS", "").split(",") if d.strip()}
+LOCKFILES = {
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "pipfile.lock", "cargo.lock",
+    "composer.lock", "gemfile.lock", "go.sum", "mix.lock", "pubspec.lock", "packages.lock.json",
+}
+# Binary formats that have a loader and are read on purpose.
+BINARY_DOCUMENTS = {".pdf", ".docx"}
+BINARY_SNIFF_BYTES = 8192
+LINGUIST_ATTRIBUTES = ("linguist-vendored", "linguist-generated")
+SKIP_REPORT_EXAMPLES = 20
+
+
+class ScanReport:
+    """What a scan kept and what it skipped, with a few example paths per reason.
+    Per-path entries let an incremental update forget a file and scan it again."""
+
+    def __init__(self):
+        # rel_path -> size of every kept file, and rel_path -> reason of every skipped one.
+        self.kept = {}
+        self.bytes_kept = 0
+        self.skip_reasons = {}
+        self.skipped = Counter()
+        self.examples = {}
+
+    @property
+    def files_kept(self):
+        return len(self.kept)
+
+    def keep(self, rel_path, size):
+        self.kept[rel_path] = size
+        self.bytes_kept += size
+
+    def skip(self, rel_path, reason):
+        self.skip_reasons[rel_path] = reason
+        self.skipped[reason] += 1
+        examples = self.examples.setdefault(reason, [])
+        if len(examples) < SKIP_REPORT_EXAMPLES:
+            examples.append(rel_path)
+
+    def forget(self, rel_path):
+        """Drops a file that was changed or removed, before it is scanned again."""
+        if rel_path in self.kept:
+            self.bytes_kept -= self.kept.pop(rel_path)
+            return
+        reason = self.skip_reasons.pop(rel_path, None)
+        if reason is None:
+            return
+        self.skipped[reason] -= 1
+        if not self.skipped[reason]:
+            del self.skipped[reason]
+        examples = self.examples.get(reason, [])
+        if rel_path in examples:
+            examples.remove(rel_path)
+        if not examples:
+            self.examples.pop(reason, None)
+
+    def to_dict(self):
+        return {
+            "files_kept": self.files_kept,
+            "bytes_kept": self.bytes_kept,
+            "files_skipped": sum(self.skipped.values()),
+            "skipped_by_reason": dict(self.skipped),
+            "skipped_examples": self.examples,
+        }
+
+
+def is_binary(path):
+    with open(path, "rb") as f:
+        return b"\0" in f.read(BINARY_SNIFF_BYTES)
+
+
+def list_files(repo_path):
+    """Repo-relative paths to consider: the git index when there is one, otherwise a walk."""
+    try:
+        return tracked_files(repo_path)
+    except (GitCommandError, InvalidGitRepositoryError):
+        paths = []
+        for root, dirs, files in os.walk(repo_path):
+            dirs[:] = [d for d in dirs if d != ".git"]
+            for name in files:
+                paths.append(os.path.relpath(os.path.join(root, name), repo_path).replace(os.sep, "/"))
+        return paths
+
+
+def linguist_marked(repo_path, rel_paths, always=False):
+    """Paths marked linguist-vendored or linguist-generated in .gitattributes. A full
+    scan skips asking git when the repo has no .gitattributes at all."""
+    if not always and not any(p == ".gitattributes" or p.endswith("/.gitattributes") for p in rel_paths):
+        return {}
+    try:
+        return path_attributes(repo_path, rel_paths, LINGUIST_ATTRIBUTES)
+    except (GitCommandError, InvalidGitRepositoryError):
+        return {}
+
+
+def skip_reason(repo_path, rel_path, attributes):
+    """Why a file should not be ingested, or None. Checks are ordered cheapest first."""
+    parts = rel_path.split("/")
+    name = parts[-1].lower()
+    if any(part in SCAN_SKIP_DIRS for part in parts[:-1]):
+        return "vendored_dir"
+    if name in LOCKFILES:
+        return "lockfile"
+    if ".min." in name or name.endswith(".map"):
+        return "minified"
+    if "linguist-vendored" in attributes.get(rel_path, {}):
+        return "linguist_vendored"
+    if "linguist-generated" in attributes.get(rel_path, {}):
+        return "linguist_generated"
+    path = Path(repo_path) / rel_path
+    if not path.is_file():
+        # Submodules and symlinks to directories show up in the index too.
+        return "not_a_file"
+    if path.stat().st_size > SCAN_MAX_FILE_BYTES:
+        return "too_large"
+    if path.suffix.lower() not in BINARY_DOCUMENTS and is_binary(path):
+        return "binary"
+    return None
+
+
+def scan_repo(repo_path, report, rel_paths=None):
+    """Yields the absolute paths worth ingesting, recording kept and skipped files in
+    `report`. `rel_paths` restricts the scan to those files (incremental updates, where
+    `report` still holds the rest of the repo and counts towards the byte budget)."""
+    repo_path = Path(repo_path)
+    incremental = rel_paths is not None
+    rel_paths = rel_paths if incremental else list_files(repo_path)
+    attributes = linguist_marked(repo_path, rel_paths, always=incremental)
+    total = report.bytes_kept
+    for rel_path in rel_paths:
+        reason = skip_reason(repo_path, rel_path, attributes)
+        if reason is None:
+            size = (repo_path / rel_path).stat().st_size
+            if total + size > SCAN_MAX_TOTAL_BYTES:
+                reason = "total_bytes_cap"
+            else:
+                total += size
+                report.keep(rel_path, size)
+                yield repo_path / rel_path
+                continue
+        report.skip(rel_path, reason)
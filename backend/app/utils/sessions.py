@@ -0,0 +1,205 @@
+import hashlib
+import os
+import shutil
+import stat
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from .ingest_repo import open_vector_stores, FILE_CACHE
+from .symbol_index import SymbolIndex
+from .file_index import FileIndex
+from .history import ChatHistory
+from .lexical_index import LexicalIndex, HybridRetriever
+
+
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "500"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(2 * 60 * 60)))
+# Fuse BM25 with vector search; set to 0 for embedding similarity only.
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1") == "1"
+WORKSPACE_DIR = os.path.abspath(os.getenv("WORKSPACE_DIR", "workspace"))
+
+
+def on_rm_error(func, path, exc_info):
+    if not os.access(path, os.W_OK):
+        os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+
+def repo_key(repo_url):
+    return hashlib.sha1(repo_url.rstrip("/").lower().encode()).hexdigest()[:16]
+
+
+class RepoIndex:
+    """Everything built for one repository: its checkout, file table, lookup indexes and vector stores.
+    Shared by every session chatting about that repository."""
+
+    # Built state saved with a registry entry; the checkout and vector stores persist on their own.
+    STATE_FIELDS = ("commit", "file_symbol_table", "symbol_index", "code_lexical", "noncode_lexical", "scan_report")
+
+    def __init__(self, repo_url):
+        self.repo_url = repo_url
+        # Unique per instance, so a dropped index being deleted in the background never
+        # collides with a fresh index for the same URL.
+        key = f"{repo_key(repo_url)}_{uuid.uuid4().hex[:8]}"
+        repo_name = repo_url.rstrip("/").split("/")[-1]
+        self.commit = None
+        self.file_symbol_table = []
+        self.symbol_index = SymbolIndex()
+        # What the last full or incremental scan skipped, see scan_policy.
+        self.scan_report = None
+        self.code_lexical = LexicalIndex()
+        self.noncode_lexical = LexicalIndex()
+        self._open(key, os.path.join(WORKSPACE_DIR, f"{repo_name}-{key}"))
+        # Held while cloning or re-ingesting so two inits of the same repo don't interleave.
+        self.lock = threading.Lock()
+        # Inits that are still preparing this repo and hold no session yet.
+        self.pending = 0
+
+    def _open(self, key, path):
+        self.key = key
+        self.path = path
+        self.file_index = FileIndex(self.file_symbol_table, self.path)
+        self.code_store, self.noncode_store = open_vector_stores(self.key)
+        self._open_retrievers()
+
+    def _open_retrievers(self):
+        if HYBRID_RETRIEVAL:
+            self.code_retriever = HybridRetriever(self.code_store, self.code_lexical)
+            self.noncode_retriever = HybridRetriever(self.noncode_store, self.noncode_lexical)
+        else:
+            self.code_retriever = self.code_store.as_retriever()
+            self.noncode_retriever = self.noncode_store.as_retriever()
+
+    def state(self):
+        return {field: getattr(self, field) for field in self.STATE_FIELDS}
+
+    def attach(self, entry, state):
+        """Turns this not-yet-built index into the registered one described by `entry`,
+        discarding the empty collections it was created with."""
+        self.drop()
+        for field in self.STATE_FIELDS:
+            setattr(self, field, state[field])
+        self._open(entry["key"], entry["path"])
+
+    def swap(self, state):
+        """Replaces built lookup state with versions rebuilt beside it (see update_repo).
+        Each field is rebound whole, so a chat reading one never sees it half updated."""
+        for field, value in state.items():
+            setattr(self, field, value)
+        self.file_index = FileIndex(self.file_symbol_table, self.path)
+        self._open_retrievers()
+
+    @property
+    def ready(self):
+        # A worktree checkout (CLONE_STRATEGY=mirror) has a .git file rather than a directory.
+        return self.commit is not None and os.path.exists(os.path.join(self.path, ".git"))
+
+    def remove_checkout(self):
+        FILE_CACHE.discard_under(self.path)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path, onerror=on_rm_error)
+
+    def drop(self):
+        self.remove_checkout()
+        self.code_store.delete_collection()
+        self.noncode_store.delete_collection()
+
+
+class Session:
+    def __init__(self, repo, system_prompt):
+        self.id = uuid.uuid4().hex
+        self.repo = repo
+        self.chat_history = ChatHistory(system_prompt)
+        self.last_used = time.monotonic()
+        # Turns of one conversation are answered in order; different sessions run in parallel.
+        self.lock = threading.Lock()
+
+
+class SessionStore:
+    """Chat sessions with LRU + idle-TTL eviction. A repo index is dropped once no
+    live session refers to it; indexes kept in `registry` stay on disk."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl_seconds=SESSION_TTL_SECONDS, registry=None):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.registry = registry
+        self.sessions = OrderedDict()
+        self.repos = {}
+        self.lock = threading.Lock()
+
+    def acquire_repo(self, repo_url):
+        """Returns the index for `repo_url`, pinned against eviction until
+        `release_repo` is called for it."""
+        with self.lock:
+            repo = self.repos.get(repo_url)
+            if repo is None:
+                repo = RepoIndex(repo_url)
+                self.repos[repo_url] = repo
+            repo.pending += 1
+            return repo
+
+    def release_repo(self, repo):
+        with self.lock:
+            repo.pending -= 1
+
+    def repo_keys(self):
+        """Keys of the indexes held in memory, which registry GC must not delete."""
+        with self.lock:
+            return {repo.key for repo in self.repos.values()}
+
+    def repos_snapshot(self):
+        with self.lock:
+            return list(self.repos.values())
+
+    def create(self, repo, system_prompt):
+        session = Session(repo, system_prompt)
+        with self.lock:
+            self.sessions[session.id] = session
+            dropped = self._evict()
+        self._drop(dropped)
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            dropped = self._evict()
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.monotonic()
+                self.sessions.move_to_end(session_id)
+        self._drop(dropped)
+        return session
+
+    def _evict(self):
+        now = time.monotonic()
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if len(self.sessions) <= self.max_sessions and now - oldest.last_used < self.ttl_seconds:
+                break
+            del self.sessions[oldest.id]
+
+        in_use = {session.repo.repo_url for session in self.sessions.values()}
+        dropped = []
+        for repo_url in list(self.repos):
+            repo = self.repos[repo_url]
+            if repo_url not in in_use and repo.pending == 0:
+                dropped.append(self.repos.pop(repo_url))
+        return dropped
+
+    def _drop(self, repos):
+        # Deleting checkouts and collections is slow, so it happens outside the store lock.
+        for repo in repos:
+            if self.registry is not None and self.registry.owns(repo.key):
+                continue
+            with repo.lock:
+                repo.drop()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "repos": len(self.repos),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+            }
@@ -0,0 +1,28 @@
+import os
+import sys
+import time
+
+
+# Imports that used to happen at startup and are now deferred to first use.
+DEFERRED_MODULES = ("chromadb", "langchain_chroma", "langchain_openai", "openai", "unstructured", "nbformat")
+
+
+def process_age():
+    """Seconds since this process started, or None when psutil is missing."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return time.time() - psutil.Process(os.getpid()).create_time()
+
+
+def startup_report(import_started, import_finished):
+    """How long the app took to import and become ready, and which heavy modules are still unloaded.
+    Both times are perf_counter readings taken at the top and bottom of the app module."""
+    age = process_age()
+    return {
+        "import_seconds": round(import_finished - import_started, 3),
+        "process_start_to_ready_seconds": round(age, 3) if age is not None else None,
+        "modules_loaded": len(sys.modules),
+        "deferred_modules": [name for name in DEFERRED_MODULES if name not in sys.modules],
+    }
@@ -0,0 +1,247 @@
+import ast
+import re
+from collections import defaultdict
+
+
+# Definition patterns for languages without a parser in the standard library.
+# Each pattern captures (kind keyword, name); brace languages find the end of the
+# body by brace matching, ruby by its closing `end`.
+_C_FAMILY_METHOD = r"^\s*(?:[\w\[\]<>,?*&:]+\s+)+?()(\w+)\s*\([^;{}]*\)\s*(?:const\s*)?(?:throws\s+[\w.,\s]+)?\{"
+SYMBOL_PATTERNS = {
+    "js": [
+        r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?(function)\s*\*?\s*(\w+)",
+        r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?(class|interface|enum)\s+(\w+)",
+        r"^\s*(?:export\s+)?(?:const|let|var)\s+()(\w+)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>|\w+\s*=>)",
+        r"^\s+(?:static\s+)?(?:async\s+)?()(\w+)\s*\([^)]*\)\s*\{",
+    ],
+    "java": [
+        r"^\s*(?:[\w@]+\s+)*(class|interface|enum|record|struct|object|trait)\s+(\w+)",
+        r"^\s*(?:[\w@]+\s+)*(fun|func|def)\s+(?:<[^>]*>\s*)?(?:\w+\.)?(\w+)",
+        _C_FAMILY_METHOD,
+    ],
+    "c": [
+        r"^\s*(?:typedef\s+)?(class|struct|namespace|enum)\s+(\w+)\s*(?::[^{;]*)?\{?\s*$",
+        _C_FAMILY_METHOD,
+    ],
+    "go": [
+        r"^\s*(func)\s+(?:\([^)]*\)\s*)?(\w+)",
+        r"^\s*type\s+(\w+)\s+(struct|interface)",
+    ],
+    "rust": [
+        r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?(?:unsafe\s+)?(fn|struct|enum|trait|mod)\s+(\w+)",
+        r"^\s*(impl)(?:<[^>]*>)?\s+(?:[\w:<>]+\s+for\s+)?(\w+)",
+    ],
+    "ruby": [
+        r"^\s*(def)\s+(?:self\.)?(\w+[?!]?)",
+        r"^\s*(class|module)\s+(\w+)",
+    ],
+    "php": [
+        r"^\s*(?:(?:abstract|final|public|private|protected|static)\s+)*(function)\s+&?(\w+)",
+        r"^\s*(?:(?:abstract|final)\s+)*(class|interface|trait)\s+(\w+)",
+    ],
+}
+EXT_TO_SYMBOL_FAMILY = {
+    ".js": "js", ".jsx": "js", ".ts": "js", ".tsx": "js",
+    ".java": "java", ".cs": "java", ".kt": "java", ".scala": "java", ".swift": "java",
+    ".c": "c", ".cpp": "c",
+    ".go": "go",
+    ".rs": "rust",
+    ".rb": "ruby",
+    ".php": "php",
+}
+KIND_NAMES = {"": "function", "def": "function", "fun": "function", "func": "function", "fn": "function"}
+NOT_SYMBOLS = {
+    "if", "for", "while", "switch", "catch", "return", "sizeof", "function", "new", "else",
+    "do", "try", "with", "super", "this", "self", "print", "len", "range", "str", "int",
+}
+CALL_PATTERN = re.compile(r"\b([A-Za-z_]\w*)\s*\(")
+
+
+def _python_symbols(path, text):
+    tree = ast.parse(text)
+    symbols = []
+    calls = []
+
+    def visit(node, parent):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                if isinstance(child, ast.ClassDef):
+                    kind = "class"
+                else:
+                    kind = "method" if parent and parent["kind"] == "class" else "function"
+                symbol = {
+                    "name": child.name,
+                    "kind": kind,
+                    "file": path,
+                    "start_line": min([d.lineno for d in child.decorator_list] + [child.lineno]),
+                    "end_line": child.end_lineno,
+                    "parent": parent["name"] if parent else "",
+                }
+                symbols.append(symbol)
+                visit(child, symbol)
+            else:
+                if isinstance(child, ast.Call):
+                    func = child.func
+                    name = func.id if isinstance(func, ast.Name) else getattr(func, "attr", None)
+                    if name:
+                        calls.append((name, child.lineno))
+                visit(child, parent)
+
+    visit(tree, None)
+    return symbols, calls
+
+
+def _block_end(lines, start, family):
+    if family == "ruby":
+        indent = len(lines[start]) - len(lines[start].lstrip())
+        for i in range(start + 1, len(lines)):
+            stripped = lines[i].strip()
+            if stripped == "end" and len(lines[i]) - len(lines[i].lstrip()) == indent:
+                return i
+        return start
+
+    depth = 0
+    opened = False
+    for i in range(start, len(lines)):
+        for ch in lines[i]:
+            if ch == "{":
+                depth += 1
+                opened = True
+            elif ch == "}":
+                depth -= 1
+        if opened and depth <= 0:
+            return i
+        # A declaration without a body (prototype, abstract method, `type X int`).
+        if not opened and i > start + 2:
+            return start
+    return start
+
+
+def _pattern_symbols(path, text, family):
+    lines = text.splitlines()
+    patterns = [re.compile(p) for p in SYMBOL_PATTERNS[family]]
+    symbols = []
+    calls = []
+    for i, line in enumerate(lines):
+        for pattern in patterns:
+            match = pattern.match(line)
+            if not match:
+                continue
+            kind, name = match.group(1), match.group(2)
+            if family == "go" and pattern.pattern.startswith(r"^\s*type"):
+                kind, name = name, kind
+            if name in NOT_SYMBOLS:
+                continue
+            symbols.append({
+                "name": name,
+                "kind": KIND_NAMES.get(kind, kind),
+                "file": path,
+                "start_line": i + 1,
+                "end_line": _block_end(lines, i, family) + 1,
+                "parent": "",
+            })
+            break
+        for name in CALL_PATTERN.findall(line):
+            if name not in NOT_SYMBOLS:
+                calls.append((name, i + 1))
+    return symbols, calls
+
+
+def extract_symbols(path, text, ext):
+    """Returns (definitions, calls) for one source file. Calls are (callee name, line)."""
+    if ext == ".py":
+        try:
+            return _python_symbols(path, text)
+        except (SyntaxError, ValueError, RecursionError):
+            return [], []
+    family = EXT_TO_SYMBOL_FAMILY.get(ext)
+    if family is None:
+        return [], []
+    return _pattern_symbols(path, text, family)
+
+
+class SymbolIndex:
+    """Definitions and call sites by name, for answering questions about a named
+    function or class without a vector search."""
+
+    def __init__(self):
+        self.definitions = defaultdict(list)
+        self.calls = defaultdict(list)
+        self.by_lower = defaultdict(set)
+        # path -> (names defined in it, names called from it), for removing a file again
+        self.files = {}
+
+    def add_file(self, path, symbols, calls):
+        defined, called = self.files.setdefault(path, (set(), set()))
+        for symbol in symbols:
+            self.definitions[symbol["name"]].append(symbol)
+            self.by_lower[symbol["name"].lower()].add(symbol["name"])
+            defined.add(symbol["name"])
+        for name, line in calls:
+            self.calls[name].append((path, line))
+            called.add(name)
+
+    def remove_file(self, path):
+        if path not in self.files:
+            return
+        defined, called = self.files.pop(path)
+        for name in defined:
+            remaining = [s for s in self.definitions[name] if s["file"] != path]
+            if remaining:
+                self.definitions[name] = remaining
+            else:
+                del self.definitions[name]
+                self.by_lower[name.lower()].discard(name)
+                if not self.by_lower[name.lower()]:
+                    del self.by_lower[name.lower()]
+        for name in called:
+            remaining = [c for c in self.calls[name] if c[0] != path]
+            if remaining:
+                self.calls[name] = remaining
+            else:
+                del self.calls[name]
+
+    def lookup(self, name):
+        return self.definitions.get(name, [])
+
+    def find_in_query(self, query):
+        """Names of known definitions mentioned in the query, exact-case matches first."""
+        found = []
+        for token in re.findall(r"[A-Za-z_][\w$]*", query):
+            if token in self.definitions:
+                found.append(token)
+            elif len(token) > 3 and token.lower() in self.by_lower:
+                found.extend(sorted(self.by_lower[token.lower()]))
+        return list(dict.fromkeys(found))
+
+    def callers(self, name, limit=5):
+        results = []
+        for path, line in self.calls.get(name, []):
+            enclosing = self.enclosing(path, line)
+            # A definition "calling" itself on its own line is just the def.
+            if enclosing and enclosing["name"] == name and enclosing["start_line"] == line:
+                continue
+            results.append((path, line, enclosing))
+            if len(results) >= limit:
+                break
+        return results
+
+    def enclosing(self, path, line):
+        best = None
+        for name in self.files.get(path, (set(), set()))[0]:
+            for symbol in self.definitions[name]:
+                if symbol["file"] == path and symbol["start_line"] <= line <= symbol["end_line"]:
+                    if best is None or symbol["start_line"] >= best["start_line"]:
+                        best = symbol
+        return best
+
+
+def read_lines(path, start, end):
+    lines = []
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for number, line in enumerate(f, 1):
+            if number > end:
+                break
+            if number >= start:
+                lines.append(line)
+    return "".join(lines)
@@ -0,0 +1,44 @@
+import time
+from contextlib import contextmanager
+
+
+# Callables (stage name, seconds, labels) told about every timed stage.
+_observers = []
+# Callables (counter name, amount, labels) told about every counted event.
+_counters = []
+
+
+def add_observer(observer):
+    _observers.append(observer)
+
+
+def remove_observer(observer):
+    _observers.remove(observer)
+
+
+def add_counter(counter):
+    _counters.append(counter)
+
+
+def remove_counter(counter):
+    _counters.remove(counter)
+
+
+def observe(name, seconds, **labels):
+    for observer in list(_observers):
+        observer(name, seconds, labels)
+
+
+def count(name, amount=1, **labels):
+    for counter in list(_counters):
+        counter(name, amount, labels)
+
+
+@contextmanager
+def stage(name, **labels):
+    """Times the enclosed block as one stage of answering a question or ingesting a repo."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
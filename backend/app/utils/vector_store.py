@@ -0,0 +1,291 @@
+import heapq
+import json
+import os
+import shutil
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+
+MMAP_VECTOR_DIR = os.path.abspath(os.getenv("MMAP_VECTOR_DIR", "../vector_db"))
+# "float16" halves float32 storage with no measurable recall loss; "int8" quarters it
+# using one scale per vector.
+MMAP_VECTOR_DTYPE = os.getenv("MMAP_VECTOR_DTYPE", "float16")
+# Rows scored per matrix product, which bounds the float32 scratch memory of a search.
+SEARCH_BLOCK_ROWS = 65536
+# Deleted rows are only masked out; the files are rewritten once this share is dead.
+COMPACT_DEAD_FRACTION = 0.3
+_SQL_BATCH = 500
+
+
+class MmapVectorStore(VectorStore):
+    """A collection of normalised embeddings in a flat memory-mapped file (float16,
+    or int8 plus a float32 scale per row), with texts and metadata in a SQLite
+    table keyed by row number. Search is an exact, blockwise inner product, so
+    memory use is the page cache over the file rather than a resident index.
+
+    Implements the subset of the Chroma API the app uses: add_texts,
+    similarity_search, get(ids=...), as_retriever, reset_collection and
+    delete_collection, plus count() and delete_files() for the private
+    collection calls."""
+
+    def __init__(self, collection_name, embedding_function, root=MMAP_VECTOR_DIR, dtype=MMAP_VECTOR_DTYPE):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported MMAP_VECTOR_DTYPE {dtype!r}")
+        self.collection_name = collection_name
+        self.embedding_function = embedding_function
+        self.path = os.path.join(root, collection_name)
+        self.dtype = dtype
+        self.lock = threading.Lock()
+        # Bumped whenever rows are renumbered, so a search that ran without the lock
+        # can tell whether its row numbers still name the same chunks.
+        self.generation = 0
+        self._open()
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def _open(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.path, "meta.db"), check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, id TEXT NOT NULL, file_path TEXT, document TEXT NOT NULL, "
+            "metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS chunks_id ON chunks(id) WHERE deleted = 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS chunks_file ON chunks(file_path) WHERE deleted = 0")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+        settings = dict(self.conn.execute("SELECT key, value FROM settings"))
+        # An existing collection keeps the dtype it was written with.
+        self.dtype = settings.get("dtype", self.dtype)
+        self.dim = int(settings["dim"]) if "dim" in settings else None
+        self.vectors_path = os.path.join(self.path, f"vectors.{self.dtype}")
+        self.scales_path = os.path.join(self.path, "scales.float32")
+        self.rows = self.conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+        self.alive = np.ones(self.rows, dtype=bool)
+        dead = [row for row, in self.conn.execute("SELECT row FROM chunks WHERE deleted = 1")]
+        self.alive[dead] = False
+        self._matrix = None
+        self._scales = None
+        self.generation += 1
+
+    def _maps(self):
+        """(vectors, scales or None) memory-mapped over the rows written so far."""
+        if self._matrix is None or len(self._matrix) != self.rows:
+            if self.rows == 0:
+                return None, None
+            self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(self.rows, self.dim))
+            if self.dtype == "int8":
+                self._scales = np.memmap(self.scales_path, dtype=np.float32, mode="r", shape=(self.rows,))
+        return self._matrix, self._scales
+
+    @staticmethod
+    def _normalise(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _encode(self, vectors):
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), None
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [f"{self.collection_name}-{self.rows + i}" for i in range(len(texts))]
+        vectors = self._normalise(self.embedding_function.embed_documents(texts))
+        encoded, scales = self._encode(vectors)
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                    [("dim", str(self.dim)), ("dtype", self.dtype)],
+                )
+            # Re-adding an id replaces it, like Chroma's upsert.
+            self._mark_deleted("id", ids)
+            with open(self.vectors_path, "ab") as f:
+                f.write(encoded.tobytes())
+            if scales is not None:
+                with open(self.scales_path, "ab") as f:
+                    f.write(scales.tobytes())
+            first = self.rows
+            self.conn.executemany(
+                "INSERT INTO chunks (row, id, file_path, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (first + i, chunk_id, metadata.get("file_path"), text, json.dumps(metadata))
+                    for i, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas))
+                ],
+            )
+            self.conn.commit()
+            self.rows += len(texts)
+            self.alive = np.concatenate([self.alive, np.ones(len(texts), dtype=bool)])
+        return ids
+
+    def _mark_deleted(self, column, values):
+        rows = []
+        for start in range(0, len(values), _SQL_BATCH):
+            batch = values[start:start + _SQL_BATCH]
+            marks = ",".join("?" * len(batch))
+            rows += [row for row, in self.conn.execute(
+                f"SELECT row FROM chunks WHERE deleted = 0 AND {column} IN ({marks})", batch
+            )]
+        if rows:
+            self.conn.executemany("UPDATE chunks SET deleted = 1 WHERE row = ?", [(row,) for row in rows])
+            self.alive[rows] = False
+        return len(rows)
+
+    def delete(self, ids=None, **kwargs):
+        with self.lock:
+            self._mark_deleted("id", list(ids or []))
+            self.conn.commit()
+        self._maybe_compact()
+        return True
+
+    def delete_files(self, paths):
+        with self.lock:
+            self._mark_deleted("file_path", list(paths))
+            self.conn.commit()
+        self._maybe_compact()
+
+    def count(self):
+        with self.lock:
+            return int(self.alive.sum())
+
+    def _maybe_compact(self):
+        with self.lock:
+            if self.rows == 0 or (~self.alive).sum() < COMPACT_DEAD_FRACTION * self.rows:
+                return
+            matrix, scales = self._maps()
+            keep = np.flatnonzero(self.alive)
+            # Rewrite the live rows, then renumber them in the table to match.
+            for path, data in ((self.vectors_path, matrix), (self.scales_path, scales)):
+                if data is not None:
+                    np.asarray(data[keep]).tofile(path + ".tmp")
+            self._matrix = self._scales = None
+            os.replace(self.vectors_path + ".tmp", self.vectors_path)
+            if scales is not None:
+                os.replace(self.scales_path + ".tmp", self.scales_path)
+            self.conn.execute("DELETE FROM chunks WHERE deleted = 1")
+            self.conn.executemany("UPDATE chunks SET row = ? WHERE row = ?", [(new, int(old)) for new, old in enumerate(keep)])
+            self.conn.commit()
+            self.rows = len(keep)
+            self.alive = np.ones(self.rows, dtype=bool)
+            self.generation += 1
+
+    def _top_k(self, query_vector, k):
+        """(scores, rows, generation) of the k best live rows, best first. The scan runs
+        without the lock; the rows are only valid while `generation` is current."""
+        with self.lock:
+            matrix, scales = self._maps()
+            alive = self.alive
+            generation = self.generation
+        if matrix is None:
+            return [], [], generation
+        best = []
+        for start in range(0, len(matrix), SEARCH_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            scores = block @ query_vector
+            if scales is not None:
+                scores *= scales[start:start + SEARCH_BLOCK_ROWS]
+            scores[~alive[start:start + len(block)]] = -np.inf
+            take = min(k, len(scores))
+            top = np.argpartition(-scores, take - 1)[:take]
+            best.extend((float(scores[i]), start + int(i)) for i in top if scores[i] != -np.inf)
+        best = heapq.nlargest(k, best)
+        return [score for score, _ in best], [row for _, row in best], generation
+
+    def _documents(self, rows):
+        """{row: (id, text, metadata)} for the live rows among `rows`. Call with the lock
+        held, or compaction may renumber the rows in between."""
+        found = {}
+        for start in range(0, len(rows), _SQL_BATCH):
+            batch = rows[start:start + _SQL_BATCH]
+            marks = ",".join("?" * len(batch))
+            for row, chunk_id, text, metadata in self.conn.execute(
+                f"SELECT row, id, document, metadata FROM chunks WHERE deleted = 0 AND row IN ({marks})", batch
+            ):
+                found[row] = (chunk_id, text, json.loads(metadata))
+        return found
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        query_vector = self._normalise(self.embedding_function.embed_query(query))
+        while True:
+            scores, rows, generation = self._top_k(query_vector, k)
+            with self.lock:
+                if generation == self.generation:
+                    found = self._documents(rows)
+                    break
+            # Compacted during the scan: the rows now name other chunks, so search again.
+        # Rows deleted since the scan drop out; every score stays with its own row.
+        return [
+            (Document(page_content=found[row][1], metadata=found[row][2]), score)
+            for score, row in zip(scores, rows)
+            if row in found
+        ]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def get(self, ids=None, **kwargs):
+        """Chroma-style {"ids", "documents", "metadatas"} for the live chunks with `ids`."""
+        rows = []
+        with self.lock:
+            for start in range(0, len(ids or []), _SQL_BATCH):
+                batch = ids[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows += [row for row, in self.conn.execute(
+                    f"SELECT row FROM chunks WHERE deleted = 0 AND id IN ({marks})", batch
+                )]
+            documents = self._documents(rows)
+        found = [documents[row] for row in rows if row in documents]
+        return {
+            "ids": [chunk_id for chunk_id, _, _ in found],
+            "documents": [text for _, text, _ in found],
+            "metadatas": [metadata for _, _, metadata in found],
+        }
+
+    def reset_collection(self):
+        self.delete_collection()
+        with self.lock:
+            self._open()
+
+    def delete_collection(self):
+        with self.lock:
+            self.conn.close()
+            self._matrix = self._scales = None
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, collection_name="default", **kwargs):
+        store = cls(collection_name, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+
+def count_vectors(store):
+    """Chunks held by a vector store of either backend."""
+    if isinstance(store, MmapVectorStore):
+        return store.count()
+    return store._collection.count()
+
+
+def delete_file_vectors(store, paths):
+    """Removes every chunk of `paths` from a vector store of either backend."""
+    if isinstance(store, MmapVectorStore):
+        store.delete_files(paths)
+        return
+    for start in range(0, len(paths), _SQL_BATCH):
+        store._collection.delete(where={"file_path": {"$in": paths[start:start + _SQL_BATCH]}})
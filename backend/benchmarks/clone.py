@@ -0,0 +1,122 @@
+"""Repository acquisition benchmark for the clone strategies.
+
+Builds a local fixture repo (source files plus large binaries and a vendored
+directory), serves it over file:// with partial clone enabled, and times for each
+strategy a cold clone, a second clone of the same commit, and a refresh after a new
+commit. Runs offline.
+
+    cd backend
+    python -m benchmarks.clone --files 2000 --binary-mb 50
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+
+from benchmarks.run import make_repo
+
+
+def add_binaries(path, megabytes, seed=0):
+    """Random (incompressible) images and a committed node_modules directory."""
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(path, "assets"), exist_ok=True)
+    for i in range(max(1, megabytes)):
+        with open(os.path.join(path, "assets", f"image_{i}.png"), "wb") as f:
+            f.write(rng.randbytes(1024 ** 2))
+    os.makedirs(os.path.join(path, "node_modules", "left-pad"), exist_ok=True)
+    with open(os.path.join(path, "node_modules", "left-pad", "index.js"), "w") as f:
+        f.write("module.exports = (s, n) => s.padStart(n);\n" * 2000)
+
+
+def commit(path, message):
+    git = ["git", "-C", path, "-c", "user.name=bench", "-c", "user.email=bench@localhost"]
+    subprocess.run(git + ["add", "-A"], check=True)
+    subprocess.run(git + ["commit", "-qm", message], check=True)
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(r, f)) for r, _, files in os.walk(path) for f in files)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, round(time.perf_counter() - started, 3)
+
+
+def run_strategy(name, url, fixture, root):
+    from app.utils.clone_strategy import clone_strategy
+    from app.utils.git_sync import changed_files, checkout, tracked_files
+
+    cloner = clone_strategy(name, root=os.path.join(root, "mirrors")) if name == "mirror" else clone_strategy(name)
+    first = os.path.join(root, "first")
+    second = os.path.join(root, "second")
+    _, cold = timed(lambda: cloner.clone(url, first))
+    _, warm = timed(lambda: cloner.clone(url, second))
+    files = len(tracked_files(first))
+
+    with open(os.path.join(fixture, "pkg0", "mod0", "module_0.py"), "a") as f:
+        f.write(f"\n\ndef added_for_{name}():\n    return 1\n")
+    commit(fixture, f"change for {name}")
+    old = subprocess.run(["git", "-C", first, "rev-parse", "HEAD"], check=True, stdout=subprocess.PIPE, text=True).stdout.strip()
+
+    def refresh():
+        new = cloner.fetch(url, first)
+        changed, _ = changed_files(first, old, new)
+        checkout(first, new)
+        return changed
+
+    changed, refresh_seconds = timed(refresh)
+    return {
+        "strategy": name,
+        "cold_clone_seconds": cold,
+        "warm_clone_seconds": warm,
+        "refresh_seconds": refresh_seconds,
+        "refresh_changed_files": len(changed),
+        "checked_out_files": files,
+        "disk_mb": round(directory_size(root) / 1024 ** 2, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000, help="source files in the fixture repo")
+    parser.add_argument("--binary-mb", type=int, default=50, help="megabytes of binary assets in the fixture repo")
+    parser.add_argument("--strategies", default="full,partial,mirror")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="clone-bench-") as tmp:
+        # Importing the app opens its caches, so keep them inside the temp directory.
+        os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(tmp, "embedding_cache.db"))
+        os.environ.setdefault("PARSED_TEXT_CACHE_PATH", os.path.join(tmp, "parsed_text_cache.db"))
+        fixture = os.path.join(tmp, "fixture")
+        make_repo(fixture, args.files)
+        add_binaries(fixture, args.binary_mb)
+        commit(fixture, "binaries")
+        # file:// (unlike a plain path) goes through the transport, so --depth and --filter apply.
+        subprocess.run(["git", "-C", fixture, "config", "uploadpack.allowFilter", "true"], check=True)
+        url = f"file://{fixture}"
+        print(f"== fixture: {args.files} source files, {args.binary_mb} MB of binaries ==")
+        for name in args.strategies.split(","):
+            root = os.path.join(tmp, name)
+            os.makedirs(root)
+            result = run_strategy(name, url, fixture, root)
+            results.append(result)
+            print(
+                f"  {name:<8} cold={result['cold_clone_seconds']:>7}s  warm={result['warm_clone_seconds']:>7}s  "
+                f"refresh={result['refresh_seconds']:>7}s  files={result['checked_out_files']:>6}  "
+                f"disk={result['disk_mb']:>7} MB"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Offline ingest and query benchmark.
+
+Runs entirely against the deterministic stand-in models (MODEL_BACKEND=fake), so no
+API key or network is needed. Each repo size runs in its own process so peak RSS
+is measured per size.
+
+    cd backend
+    python -m benchmarks.run --sizes 1000,10000 --queries 200 --llm-latency-ms 300
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+
+EXTENSIONS = [".py"] * 12 + [".js"] * 4 + [".md", ".md", ".json", ".txt"]
+QUERY_MIX = [
+    ("FILE", "What does {module} do?"),
+    ("FUNCTION&CLASS", "How does {function}() work?"),
+    ("GENERAL", "How do I install and run this project?"),
+    ("FOLLOWUP", "tell me more"),
+    # Matches nothing locally, so it exercises the LLM classifier and speculative retrieval.
+    ("LLM", "hmm, where does the data for the records end up eventually"),
+]
+
+
+def source_for(ext, i):
+    if ext == ".py":
+        functions = "".join(
+            f"def func_{i}_{j}(value, limit=10):\n"
+            f"    \"\"\"Scales value for record {i}.\"\"\"\n"
+            f"    total = 0\n"
+            f"    for step in range(limit):\n"
+            f"        total += value * step + {j}\n"
+            f"    return helper_{i}(total)\n\n\n"
+            for j in range(4)
+        )
+        return (
+            f"import os\n\n\ndef helper_{i}(x):\n    return x % {i + 7}\n\n\n{functions}"
+            f"class Service{i}:\n    def __init__(self):\n        self.name = \"service-{i}\"\n\n"
+            f"    def run(self):\n        return func_{i}_0(len(self.name))\n"
+        )
+    if ext == ".js":
+        return (
+            f"export function fetchRecord{i}(id) {{\n  return fetch(`/api/records/${{id}}`).then(r => r.json());\n}}\n\n"
+            f"export class Store{i} {{\n  constructor() {{ this.items = []; }}\n  add(item) {{ this.items.push(item); }}\n}}\n"
+        )
+    if ext == ".md":
+        return f"# Module {i}\n\nThis module handles record {i}. Install with `pip install pkg{i}`.\n\n" * 3
+    if ext == ".json":
+        return json.dumps({"id": i, "name": f"record-{i}", "tags": ["a", "b", "c"], "limits": list(range(20))})
+    return f"Notes for record {i}.\n" * 10
+
+
+def make_repo(path, files, seed=0):
+    """A synthetic git repo of `files` files, 100 per directory."""
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "README.md"), "w") as f:
+        f.write("# Synthetic repo\n\nInstall with `pip install -e .` and run `python -m app`.\n")
+    for i in range(files - 1):
+        ext = rng.choice(EXTENSIONS)
+        directory = os.path.join(path, f"pkg{i // 1000}", f"mod{(i // 100) % 10}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"module_{i}{ext}"), "w") as f:
+            f.write(source_for(ext, i))
+    git = ["git", "-C", path, "-c", "user.name=bench", "-c", "user.email=bench@localhost"]
+    subprocess.run(git + ["init", "-q"], check=True)
+    subprocess.run(git + ["add", "-A"], check=True)
+    subprocess.run(git + ["commit", "-qm", "synthetic"], check=True)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def summarise(samples):
+    return {
+        name: {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+        for name, values in sorted(samples.items())
+    }
+
+
+def run_size(args):
+    """Benchmarks one repo size in this process. The environment must be set before app is imported."""
+    from app.utils.ingest_repo import ingest_repo, IngestProgress
+    from app.utils.git_sync import head_commit
+    from app.utils.sessions import RepoIndex
+    from app.utils.history import ChatHistory
+    from app.utils.chat import LLM_OUTPUT, SYSTEM_PROMPT
+    from app.utils.timing import add_observer
+
+    samples = defaultdict(list)
+
+    def record(name, seconds, labels):
+        label = labels.get("category")
+        samples[f"{name}[{label}]" if label else name].append(seconds)
+
+    add_observer(record)
+
+    class Counts(IngestProgress):
+        def __init__(self):
+            self.counts = defaultdict(int)
+
+        def count(self, **counts):
+            for key, value in counts.items():
+                self.counts[key] += value
+
+    repo = RepoIndex(f"https://github.com/bench/synthetic-{args.size}")
+    started = time.perf_counter()
+    make_repo(repo.path, args.size)
+    generate_seconds = time.perf_counter() - started
+
+    progress = Counts()
+    started = time.perf_counter()
+    ingest_repo(repo.path, repo, workers=args.workers, progress=progress)
+    ingest_seconds = time.perf_counter() - started
+    repo.commit = head_commit(repo.path)
+
+    rng = random.Random(1)
+    py_modules = [e["filename"] for e in repo.file_symbol_table if e["filename"].endswith(".py")]
+    functions = [name for name in repo.symbol_index.definitions if name.startswith("func_")]
+    history = ChatHistory(SYSTEM_PROMPT)
+    query_seconds = []
+    for n in range(args.queries):
+        _, template = QUERY_MIX[n % len(QUERY_MIX)]
+        query = template.format(module=rng.choice(py_modules), function=rng.choice(functions))
+        started = time.perf_counter()
+        LLM_OUTPUT(query, history, repo)
+        query_seconds.append(time.perf_counter() - started)
+    samples["query_total"] = query_seconds
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "files": args.size,
+        "generate_seconds": round(generate_seconds, 2),
+        "ingest_seconds": round(ingest_seconds, 2),
+        "files_indexed": progress.counts["files_chunked"],
+        "chunks_embedded": progress.counts["chunks_embedded"],
+        "files_per_second": round(progress.counts["files_chunked"] / ingest_seconds, 1),
+        "chunks_per_second": round(progress.counts["chunks_embedded"] / ingest_seconds, 1),
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_mb": round(self_usage.ru_maxrss / 1024, 1),
+        "peak_child_rss_mb": round(child_usage.ru_maxrss / 1024, 1),
+        "stages": summarise(samples),
+    }
+
+
+def print_report(results):
+    for result in results:
+        print(f"\n== {result['files']} files ==")
+        print(
+            f"ingest {result['ingest_seconds']}s  {result['files_per_second']} files/s  "
+            f"{result['chunks_per_second']} chunks/s  peak RSS {result['peak_rss_mb']} MB "
+            f"(chunk workers {result['peak_child_rss_mb']} MB)"
+        )
+        for name, stats in result["stages"].items():
+            print(f"  {name:<28} n={stats['count']:<5} p50={stats['p50_ms']:>9} ms  p99={stats['p99_ms']:>9} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated repo sizes in files")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--llm-latency-ms", type=float, default=0)
+    parser.add_argument("--token-latency-ms", type=float, default=0)
+    parser.add_argument("--embed-latency-ms", type=float, default=0)
+    parser.add_argument("--embed-dim", type=int, default=1536)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.size is not None:
+        # Child mode: one size, results as JSON on the last line of stdout.
+        print(json.dumps(run_size(args)))
+        return
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        with tempfile.TemporaryDirectory(prefix=f"bench-{size}-") as root:
+            env = dict(
+                os.environ,
+                MODEL_BACKEND="fake",
+                FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms),
+                FAKE_LLM_TOKEN_MS=str(args.token_latency_ms),
+                FAKE_EMBED_LATENCY_MS=str(args.embed_latency_ms),
+                FAKE_EMBED_DIM=str(args.embed_dim),
+                EMBEDDING_CACHE_PATH=os.path.join(root, "embedding_cache.db"),
+                PARSED_TEXT_CACHE_PATH=os.path.join(root, "parsed_text_cache.db"),
+                # The query mix repeats, so cached answers would hide the pipeline's latency.
+                ANSWER_CACHE="0",
+                CHROMA_CODE_DIR=os.path.join(root, "chroma_code_db"),
+                CHROMA_NONCODE_DIR=os.path.join(root, "chroma_noncode_db"),
+                PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            )
+            command = [
+                sys.executable, "-m", "benchmarks.run", "--size", str(size),
+                "--queries", str(args.queries), "--workers", str(args.workers),
+            ]
+            # The workspace directory is relative to the working directory, so run inside the temp root.
+            output = subprocess.run(command, env=env, cwd=root, check=True, stdout=subprocess.PIPE, text=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        print_report(results[-1:])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
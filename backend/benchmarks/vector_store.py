@@ -0,0 +1,169 @@
+"""Vector store backend benchmark: Chroma against the memory-mapped store.
+
+Stores the same clustered, normalised vectors in each backend and measures
+recall@k against exact float32 search, query latency, time to open the store
+in a fresh process, disk footprint and peak RSS. Building and querying each
+run in their own process so open time and RSS are not flattered by warm state.
+
+    cd backend
+    python -m benchmarks.vector_store --sizes 10000,100000 --dim 1536 --queries 200
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.run import percentile
+
+
+BACKENDS = ["chroma", "mmap-float16", "mmap-int8"]
+BUILD_BATCH = 1000
+
+
+def make_vectors(size, queries, dim, seed=0):
+    """Clustered vectors (about 50 per cluster, like chunks of related files) and
+    queries that are noisy copies of stored vectors."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, size // 50), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), size)] + 0.6 * rng.standard_normal((size, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picks = vectors[rng.integers(0, size, queries)]
+    # Noise of about half the vector's norm.
+    targets = picks + 0.5 * rng.standard_normal((queries, dim)).astype(np.float32) / np.sqrt(dim)
+    targets /= np.linalg.norm(targets, axis=1, keepdims=True)
+    return vectors, targets
+
+
+class Precomputed:
+    """Embeddings that look texts "v<i>" and "q<j>" up in the generated arrays."""
+
+    def __init__(self, vectors, queries):
+        self.vectors = vectors
+        self.queries = queries
+        self.model = "precomputed"
+
+    def embed_documents(self, texts):
+        return [self.vectors[int(text[1:])].tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.queries[int(text[1:])].tolist()
+
+
+def open_store(backend, root, embeddings):
+    if backend == "chroma":
+        import chromadb
+        from langchain_chroma import Chroma
+        return Chroma(
+            collection_name="bench",
+            embedding_function=embeddings,
+            client=chromadb.PersistentClient(path=os.path.join(root, "chroma")),
+        )
+    from app.utils.vector_store import MmapVectorStore
+    return MmapVectorStore("bench", embeddings, root=os.path.join(root, "mmap"), dtype=backend.split("-", 1)[1])
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(r, f)) for r, _, files in os.walk(path) for f in files)
+
+
+def build(args):
+    data = np.load(os.path.join(args.root, "data.npz"))
+    embeddings = Precomputed(data["vectors"], data["queries"])
+    store = open_store(args.backend, args.root, embeddings)
+    started = time.perf_counter()
+    for start in range(0, len(data["vectors"]), BUILD_BATCH):
+        rows = range(start, min(start + BUILD_BATCH, len(data["vectors"])))
+        store.add_texts(
+            texts=[f"v{i}" for i in rows],
+            metadatas=[{"file_path": f"file_{i // 20}", "chunk_id": i} for i in rows],
+            ids=[f"v{i}" for i in rows],
+        )
+    return {"build_seconds": round(time.perf_counter() - started, 2)}
+
+
+def query(args):
+    data = np.load(os.path.join(args.root, "data.npz"))
+    embeddings = Precomputed(data["vectors"], data["queries"])
+    started = time.perf_counter()
+    store = open_store(args.backend, args.root, embeddings)
+    # The first search pays for loading (Chroma) or faulting in (mmap) the index.
+    store.similarity_search("q0", k=args.k)
+    open_seconds = time.perf_counter() - started
+
+    latencies = []
+    recalls = []
+    for j in range(len(data["queries"])):
+        started = time.perf_counter()
+        docs = store.similarity_search(f"q{j}", k=args.k)
+        latencies.append(time.perf_counter() - started)
+        found = {doc.metadata["chunk_id"] for doc in docs}
+        recalls.append(len(found & set(data["truth"][j].tolist())) / args.k)
+    return {
+        "open_seconds": round(open_seconds, 3),
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def child(root, backend, mode, k):
+    command = [sys.executable, "-m", "benchmarks.vector_store", "--root", root, "--backend", backend, "--mode", mode, "--k", str(k)]
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="comma separated vector counts")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--root", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        # Child mode: results as JSON on the last line of stdout.
+        print(json.dumps(build(args) if args.mode == "build" else query(args)))
+        return
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        with tempfile.TemporaryDirectory(prefix=f"vector-bench-{size}-") as root:
+            vectors, queries = make_vectors(size, args.queries, args.dim)
+            truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+            np.savez(os.path.join(root, "data.npz"), vectors=vectors, queries=queries, truth=truth)
+            print(f"\n== {size} vectors of {args.dim} dims, k={args.k} ==")
+            for backend in args.backends.split(","):
+                backend_root = os.path.join(root, backend)
+                os.makedirs(backend_root)
+                os.link(os.path.join(root, "data.npz"), os.path.join(backend_root, "data.npz"))
+                result = {"backend": backend, "vectors": size, **child(backend_root, backend, "build", args.k)}
+                result.update(child(backend_root, backend, "query", args.k))
+                result["disk_mb"] = round((directory_size(backend_root) - os.path.getsize(os.path.join(root, "data.npz"))) / 1024 ** 2, 1)
+                results.append(result)
+                print(
+                    f"  {backend:<14} recall@{args.k}={result['recall_at_k']:<7} p50={result['p50_ms']:>8} ms  "
+                    f"p99={result['p99_ms']:>8} ms  open={result['open_seconds']:>6}s  build={result['build_seconds']:>7}s  "
+                    f"disk={result['disk_mb']:>8} MB  peak RSS={result['peak_rss_mb']:>7} MB"
+                )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""The app reads its configuration when it is imported, so every path it writes to
+is pointed at a throwaway directory here, before any test imports it. Models are
+the deterministic stand-ins from fake_models, so no test needs network access."""
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+
+ROOT = tempfile.mkdtemp(prefix="codewhisper-tests-")
+os.environ.update({
+    "MODEL_BACKEND": "fake",
+    "OPENAI_API_KEY": "test",
+    "VECTOR_BACKEND": "mmap",
+    "EMBEDDING_CACHE_PATH": os.path.join(ROOT, "embedding_cache.db"),
+    "PARSED_TEXT_CACHE_PATH": os.path.join(ROOT, "parsed_text_cache.db"),
+    "CHROMA_CODE_DIR": os.path.join(ROOT, "chroma_code_db"),
+    "CHROMA_NONCODE_DIR": os.path.join(ROOT, "chroma_noncode_db"),
+    "MMAP_VECTOR_DIR": os.path.join(ROOT, "vector_db"),
+    "INDEX_REGISTRY_DIR": os.path.join(ROOT, "index_registry"),
+    "MIRROR_CACHE_DIR": os.path.join(ROOT, "repo_mirrors"),
+    "WORKSPACE_DIR": os.path.join(ROOT, "workspace"),
+    "ANSWER_CACHE": "0",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def git(path, *args):
+    command = ["git", "-C", str(path), "-c", "user.name=test", "-c", "user.email=test@localhost", *args]
+    return subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout.strip()
+
+
+def write_files(root, files):
+    for rel_path, content in files.items():
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb" if isinstance(content, bytes) else "w") as f:
+            f.write(content)
+
+
+@pytest.fixture
+def make_git_repo(tmp_path):
+    """Builds a committed repo from {relative path: str or bytes}, serving partial clones
+    over file:// like a real host would."""
+    def make(files, name="fixture"):
+        path = tmp_path / name
+        path.mkdir()
+        write_files(path, files)
+        git(path, "init", "-q", "-b", "main")
+        git(path, "config", "uploadpack.allowFilter", "true")
+        git(path, "add", "-A")
+        git(path, "commit", "-qm", "initial")
+        return path
+    return make
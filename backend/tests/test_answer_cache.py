@@ -0,0 +1,92 @@
+import time
+from types import SimpleNamespace
+
+from app.utils.answer_cache import AnswerCache
+from app.utils.fake_models import FakeEmbeddings
+
+
+REPO = SimpleNamespace(repo_url="file:///repo", commit="c1")
+
+
+def make_cache(**kwargs):
+    # The test environment turns the cache off for the app; these build their own.
+    return AnswerCache(FakeEmbeddings(), **{"enabled": True, **kwargs})
+
+
+def test_same_question_hits_after_normalising():
+    cache = make_cache()
+    cache.put("What does config.py do?", "FILE", "It configures.", "ctx", REPO)
+    assert cache.get("what does config.py do", REPO) == ("It configures.", "ctx")
+    assert cache.stats()["hits"] == 1 and cache.stats()["similar_hits"] == 0
+
+
+def test_similar_question_hits_above_the_threshold():
+    cache = make_cache(similarity=0.9)
+    cache.put("how is the config loader tested", "GENERAL", "With fixtures.", "ctx", REPO)
+    assert cache.get("how is the config loader tested here", REPO) == ("With fixtures.", "ctx")
+    assert cache.get("where are the docs deployed", REPO) is None
+    assert cache.stats()["similar_hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_answers_are_scoped_to_commit_and_k():
+    cache = make_cache()
+    cache.put("what is main", "FUNCTION&CLASS", "The entry point.", "ctx", REPO, k=4)
+    assert cache.get("what is main", SimpleNamespace(repo_url=REPO.repo_url, commit="c2"), k=4) is None
+    assert cache.get("what is main", REPO, k=8) is None
+    assert cache.get("what is main", REPO, k=4) is not None
+
+
+def test_only_history_independent_answers_are_cached():
+    cache = make_cache()
+    cache.put("tell me more", "FOLLOWUP", "More.", "ctx", REPO)
+    cache.put("what is main", "FUNCTION&CLASS", "", "ctx", REPO)
+    cache.put("what is main", "FUNCTION&CLASS", "Main.", "ctx", SimpleNamespace(repo_url="file:///repo", commit=None))
+    assert cache.stats()["entries"] == 0
+    assert not make_cache(enabled=False).get("what is main", REPO)
+
+
+def test_least_recently_used_entries_go_past_max_entries():
+    cache = make_cache(max_entries=2)
+    cache.put("alpha question", "GENERAL", "A", "", REPO)
+    cache.put("bravo question", "GENERAL", "B", "", REPO)
+    cache.get("alpha question", REPO)
+    cache.put("charlie question", "GENERAL", "C", "", REPO)
+    assert cache.get("bravo question", REPO) is None
+    assert cache.get("alpha question", REPO) == ("A", "")
+    assert len(cache.by_scope[cache.scope(REPO)]) == 2
+
+
+def test_entries_expire_after_the_ttl():
+    cache = make_cache(ttl_seconds=0)
+    cache.put("alpha question", "GENERAL", "A", "", REPO)
+    assert cache.get("alpha question", REPO) is None
+    assert cache.by_scope == {}
+
+
+def test_a_hit_does_not_extend_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = make_cache(ttl_seconds=1, similarity=0.9)
+    cache.put("alpha question", "GENERAL", "A", "", REPO)
+    now[0] += 0.3
+    cache.put("bravo question", "GENERAL", "B", "", REPO)
+    now[0] += 0.3
+    # Moves alpha behind the newer bravo in the LRU order.
+    assert cache.get("alpha question", REPO) == ("A", "")
+    now[0] += 0.6
+    assert cache.get("alpha question", REPO) is None
+    assert cache.get("alpha question here", REPO) is None
+    assert cache.get("bravo question", REPO) == ("B", "")
+    assert cache.stats()["entries"] == 1
+
+
+def test_total_bytes_are_bounded():
+    cache = make_cache(max_bytes=25)
+    cache.put("alpha question", "GENERAL", "A" * 10, "ctx", REPO)
+    cache.put("bravo question", "GENERAL", "B" * 10, "ctx", REPO)
+    assert cache.get("alpha question", REPO) is None
+    assert cache.stats()["bytes"] == 13
+    # Storing the same question again replaces its entry instead of counting it twice.
+    cache.put("bravo question", "GENERAL", "b" * 10, "ctx", REPO)
+    assert cache.stats()["bytes"] == 13
+    assert cache.get("bravo question", REPO) == ("b" * 10, "ctx")
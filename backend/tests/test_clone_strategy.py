@@ -0,0 +1,235 @@
+import fcntl
+import os
+import shutil
+import threading
+import time
+
+import pytest
+from git import GitCommandError
+
+from app.utils import clone_strategy as cs
+from app.utils.git_sync import GitCancelled, GitTimeout, changed_files, checkout, deadline_after, head_commit, remote_head, run_git, tracked_files
+from app.utils.jobs import JobError, JobScheduler
+from conftest import git, write_files
+
+
+FILES = {
+    "src/app.py": "def main():\n    return 1\n",
+    "README.md": "# Fixture\n",
+    "assets/logo.png": b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 64,
+    "node_modules/left-pad/index.js": "module.exports = 1;\n",
+    ".github/workflows/ci.yml": "on: push\n",
+}
+
+
+@pytest.fixture
+def upstream(make_git_repo):
+    path = make_git_repo(FILES)
+    return path, f"file://{path}"
+
+
+def make_cloner(name, tmp_path, **kwargs):
+    if name == "mirror":
+        return cs.clone_strategy(name, root=str(tmp_path / "mirrors"), **kwargs)
+    return cs.clone_strategy(name, **kwargs)
+
+
+@pytest.mark.parametrize("name", ["full", "partial", "mirror"])
+def test_clone_checks_out_head(name, upstream, tmp_path):
+    path, url = upstream
+    target = str(tmp_path / "checkout")
+    make_cloner(name, tmp_path).clone(url, target)
+    assert head_commit(target) == git(path, "rev-parse", "HEAD")
+    with open(os.path.join(target, "src", "app.py")) as f:
+        assert "def main" in f.read()
+
+
+@pytest.mark.parametrize("name", ["partial", "mirror"])
+def test_sparse_checkout_leaves_out_binaries_and_vendored_dirs(name, upstream, tmp_path):
+    _, url = upstream
+    target = str(tmp_path / "checkout")
+    make_cloner(name, tmp_path).clone(url, target)
+    assert not os.path.exists(os.path.join(target, "assets", "logo.png"))
+    assert not os.path.exists(os.path.join(target, "node_modules"))
+    assert sorted(tracked_files(target)) == [".github/workflows/ci.yml", "README.md", "src/app.py"]
+
+
+def test_full_clone_checks_out_everything(upstream, tmp_path):
+    _, url = upstream
+    target = str(tmp_path / "checkout")
+    make_cloner("full", tmp_path).clone(url, target)
+    assert sorted(tracked_files(target)) == sorted(FILES)
+
+
+def test_ingested_sparse_mode_keeps_only_chunked_extensions(upstream, tmp_path):
+    _, url = upstream
+    target = str(tmp_path / "checkout")
+    make_cloner("partial", tmp_path, sparse="ingested").clone(url, target)
+    # .js is chunked too, so only the directory the scan skips keeps it out in "text" mode.
+    assert sorted(tracked_files(target)) == [
+        ".github/workflows/ci.yml", "README.md", "node_modules/left-pad/index.js", "src/app.py",
+    ]
+
+
+def test_mirror_checkout_is_a_worktree(upstream, tmp_path):
+    _, url = upstream
+    cloner = make_cloner("mirror", tmp_path)
+    target = str(tmp_path / "checkout")
+    cloner.clone(url, target)
+    assert os.path.isfile(os.path.join(target, ".git"))
+    assert os.path.isdir(cloner.mirror_path(url))
+
+
+def test_mirror_url_variants_share_one_mirror(tmp_path):
+    cloner = make_cloner("mirror", tmp_path)
+    assert cloner.mirror_path("https://github.com/a/b") == cloner.mirror_path("https://github.com/a/b.git/")
+    assert cloner.mirror_path("https://github.com/a/b") != cloner.mirror_path("https://github.com/a/c")
+
+
+def test_mirror_skips_fetch_at_known_commit(upstream, tmp_path, monkeypatch):
+    path, url = upstream
+    cloner = make_cloner("mirror", tmp_path)
+    cloner.clone(url, str(tmp_path / "first"))
+
+    def no_fetch(*args, **kwargs):
+        raise AssertionError("fetched although the mirror already had the commit")
+
+    monkeypatch.setattr(cs, "fetch_latest", no_fetch)
+    second = str(tmp_path / "second")
+    cloner.clone(url, second, commit=git(path, "rev-parse", "HEAD"))
+    assert os.path.exists(os.path.join(second, "src", "app.py"))
+
+
+def test_mirror_reuses_a_deleted_checkout_path(upstream, tmp_path):
+    _, url = upstream
+    cloner = make_cloner("mirror", tmp_path)
+    target = str(tmp_path / "checkout")
+    cloner.clone(url, target)
+    # Like RepoIndex.remove_checkout: the mirror still lists the worktree afterwards.
+    shutil.rmtree(target)
+    cloner.clone(url, target)
+    assert os.path.exists(os.path.join(target, "src", "app.py"))
+
+
+@pytest.mark.parametrize("name", ["full", "partial", "mirror"])
+def test_fetch_brings_in_new_commits(name, upstream, tmp_path):
+    path, url = upstream
+    cloner = make_cloner(name, tmp_path)
+    target = str(tmp_path / "checkout")
+    cloner.clone(url, target)
+    old = head_commit(target)
+
+    write_files(path, {"src/app.py": "def main():\n    return 2\n", "src/new.py": "X = 1\n"})
+    os.remove(path / "README.md")
+    git(path, "add", "-A")
+    git(path, "commit", "-qm", "change")
+
+    new = cloner.fetch(url, target)
+    assert new == git(path, "rev-parse", "HEAD")
+    changed, removed = changed_files(target, old, new)
+    assert sorted(os.path.relpath(p, target) for p in changed) == [os.path.join("src", "app.py"), os.path.join("src", "new.py")]
+    assert [os.path.relpath(p, target) for p in removed] == ["README.md"]
+    checkout(target, new)
+    with open(os.path.join(target, "src", "app.py")) as f:
+        assert "return 2" in f.read()
+
+
+def test_run_git_times_out_and_kills_git():
+    started = time.monotonic()
+    with pytest.raises(GitTimeout):
+        run_git(["-c", "alias.hang=!sleep 30", "hang"], deadline=deadline_after(0.3))
+    assert time.monotonic() - started < 5
+
+
+def test_run_git_stops_when_cancelled():
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    started = time.monotonic()
+    with pytest.raises(GitCancelled):
+        run_git(["-c", "alias.hang=!sleep 30", "hang"], cancel=cancel)
+    assert time.monotonic() - started < 5
+
+
+def test_mirror_lock_wait_times_out_and_cancels(upstream, tmp_path):
+    _, url = upstream
+    cloner = make_cloner("mirror", tmp_path, timeout=0.3)
+    os.makedirs(cloner.root, exist_ok=True)
+    with open(cloner.mirror_path(url) + ".lock", "w") as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        with pytest.raises(GitTimeout):
+            cloner.clone(url, str(tmp_path / "a"))
+        cancel = threading.Event()
+        cancel.set()
+        with pytest.raises(GitCancelled):
+            make_cloner("mirror", tmp_path).clone(url, str(tmp_path / "b"), cancel=cancel)
+
+
+def test_remote_head_resolves_and_can_be_cancelled(upstream):
+    path, url = upstream
+    assert remote_head(url) == git(path, "rev-parse", "HEAD")
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(GitCancelled):
+        remote_head(url, cancel)
+
+
+def test_every_strategy_must_implement_clone():
+    with pytest.raises(TypeError):
+        cs.CloneStrategy()
+
+
+def test_git_failure_raises_git_command_error(tmp_path):
+    with pytest.raises(GitCommandError):
+        make_cloner("full", tmp_path).clone(f"file://{tmp_path}/missing", str(tmp_path / "checkout"))
+
+
+def test_cancelled_job_reports_cancelled():
+    scheduler = JobScheduler(max_workers=1)
+    started = threading.Event()
+
+    def work(job):
+        started.set()
+        job.cancelled.wait(5)
+        raise JobError(409, "Job cancelled")
+
+    job, _ = scheduler.submit("file:///repo", work)
+    started.wait(5)
+    scheduler.cancel(job.id)
+    for _ in range(50):
+        if job.finished_at:
+            break
+        time.sleep(0.1)
+    assert job.to_dict()["status"] == "cancelled"
+    assert job.error == {"status_code": 409, "detail": "Job cancelled"}
+
+
+def test_mirror_checkout_makes_repo_ready(upstream, tmp_path):
+    from app.utils.sessions import SessionStore
+    _, url = upstream
+    store = SessionStore()
+    repo = store.acquire_repo(url)
+    make_cloner("mirror", tmp_path).clone(url, repo.path)
+    repo.commit = head_commit(repo.path)
+    assert repo.ready
+
+
+def test_init_then_refresh_through_the_app(upstream, monkeypatch):
+    from app import main
+    from app.utils.jobs import Job
+    path, url = upstream
+    monkeypatch.setattr(main, "CLONER", cs.clone_strategy("mirror"))
+
+    repo = main.SESSIONS.acquire_repo(url)
+    result = main.prepare_repo(repo, Job(url))
+    assert result["message"] == "Repository cloned successfully"
+    assert repo.ready
+
+    write_files(path, {"src/extra.py": "def extra():\n    return 3\n"})
+    git(path, "add", "-A")
+    git(path, "commit", "-qm", "extra")
+    result = main.prepare_repo(main.SESSIONS.acquire_repo(url), Job(url))
+    assert result["message"] == "Repository updated incrementally"
+    assert result["changed_files"] == 1
+    # The report still covers the whole repo, not just the changed file.
+    assert result["scan"]["files_kept"] == 4
+    assert repo.commit == git(path, "rev-parse", "HEAD")
@@ -0,0 +1,74 @@
+from app.utils.code_chunker import chunk_code
+from app.utils.symbol_index import extract_symbols
+
+
+def function(name, body_lines=2):
+    return f"def {name}():\n" + "".join(f"    x_{i} = {i}\n" for i in range(body_lines)) + "\n\n"
+
+
+def chunk(text, ext=".py", **kwargs):
+    symbols, _ = extract_symbols("a" + ext, text, ext)
+    return chunk_code(text, symbols, **kwargs)
+
+
+def test_chunks_cover_the_file_in_order_without_overlap():
+    text = "import os\n\n\n" + "".join(function(f"f{i}", 5) for i in range(8))
+    chunks = chunk(text, target_chars=200, max_chars=300)
+    assert len(chunks) > 1
+    lines = text.splitlines()
+    covered = []
+    for c in chunks:
+        assert c["text"] == "\n".join(lines[c["start_line"] - 1:c["end_line"]])
+        covered.extend(range(c["start_line"], c["end_line"] + 1))
+    assert covered == sorted(set(covered))
+    assert all(line.strip() == "" for i, line in enumerate(lines, 1) if i not in covered)
+
+
+def test_definitions_are_never_split_while_they_fit():
+    text = "".join(function(f"f{i}", 5) for i in range(6))
+    for c in chunk(text, target_chars=150, max_chars=300):
+        assert c["text"].count("def ") == len(c["symbols"].split(","))
+        assert c["text"].lstrip().startswith("def ")
+
+
+def test_small_file_is_one_chunk_with_every_symbol():
+    chunks = chunk(function("alpha") + function("beta"))
+    assert len(chunks) == 1
+    assert (chunks[0]["symbol"], chunks[0]["symbols"]) == ("alpha", "alpha,beta")
+    assert (chunks[0]["start_line"], chunks[0]["end_line"]) == (1, 10)
+
+
+def test_leading_comments_stay_with_their_definition():
+    text = "X = 1\n\n# Adds one.\n# Really.\n" + function("add_one", 30)
+    chunks = chunk(text, target_chars=20, max_chars=1000)
+    assert chunks[1]["text"].startswith("# Adds one.\n# Really.\ndef add_one")
+    assert chunks[1]["start_line"] == 3
+
+
+def test_oversized_class_is_cut_at_its_methods():
+    methods = "".join(f"    def m{i}(self):\n" + "".join(f"        y_{j} = {j}\n" for j in range(10)) + "\n" for i in range(4))
+    text = "class Big:\n    \"\"\"Doc.\"\"\"\n\n" + methods
+    chunks = chunk(text, target_chars=250, max_chars=300)
+    assert [c["symbol"] for c in chunks] == ["Big", "Big.m1", "Big.m2", "Big.m3"]
+    # The class header travels with the first method.
+    assert chunks[0]["symbols"] == "Big,Big.m0"
+    assert chunks[0]["text"].startswith("class Big:")
+    assert all(c["text"].count("def ") == 1 for c in chunks)
+
+
+def test_oversized_function_without_members_is_cut_at_blank_lines():
+    body = "".join(f"    a_{i} = {i}\n" + ("\n" if i % 5 == 4 else "") for i in range(40))
+    chunks = chunk("def long():\n" + body, target_chars=100, max_chars=150)
+    assert len(chunks) > 1
+    assert all(len(c["text"]) <= 150 for c in chunks)
+    assert all(c["symbol"] == "long" for c in chunks)
+    # Every cut but the last falls right after a blank line.
+    assert all(c["text"].endswith("\n") for c in chunks[:-1])
+
+
+def test_pattern_languages_nest_methods_by_line_span():
+    methods = "".join(f"  m{i}() {{\n" + "".join(f"    let v{j} = {j};\n" for j in range(8)) + "  }\n" for i in range(3))
+    text = "class Widget {\n" + methods + "}\n"
+    chunks = chunk(text, ".js", target_chars=160, max_chars=200)
+    assert [c["symbols"] for c in chunks] == ["Widget,Widget.m0", "Widget.m1", "Widget.m2,Widget"]
+    assert chunks[-1]["text"].endswith("  }\n}")
@@ -0,0 +1,69 @@
+from app.utils import context_budget
+from app.utils.context_budget import assemble_file_context, read_file_within_budget, select_segments
+from app.utils.tokens import count_tokens
+
+
+def filler(n, word="padding"):
+    return "".join(f"{word} line {i}\n" for i in range(n))
+
+
+def test_a_file_that_fits_is_returned_whole(tmp_path):
+    path = tmp_path / "small.py"
+    path.write_text("def add(a, b):\n    return a + b\n")
+    assert read_file_within_budget(str(path), "what does add do", 1000) == ("def add(a, b):\n    return a + b\n", "small.py")
+
+
+def test_a_large_file_is_cut_to_the_segments_about_the_query(tmp_path):
+    path = tmp_path / "big.txt"
+    path.write_text("header\n" + filler(2000) + "the retry budget lives here\n" + filler(2000))
+    text, _ = read_file_within_budget(str(path), "retry budget", 1500)
+    assert text.startswith("header\n")
+    assert "the retry budget lives here" in text
+    assert "... (omitted, resumes at line" in text
+    assert text.rstrip().endswith("... (rest of file omitted) ...")
+    assert count_tokens(text) < 1700
+
+
+class Recorded:
+    """A segment stream that remembers how far it was read."""
+
+    def __init__(self, segments):
+        self.segments = segments
+        self.read = 0
+
+    def __iter__(self):
+        for segment in self.segments:
+            self.read += 1
+            yield segment
+
+
+def test_reading_stops_once_best_matches_fill_the_budget():
+    segments = Recorded([(i + 1, f"retry budget {i}\n" * 20) for i in range(1000)])
+    chosen = select_segments(segments, "retry budget", 200)
+    assert segments.read < 20
+    assert [position for position, _, _ in chosen] == list(range(len(chosen)))
+
+
+def test_reading_goes_on_while_a_better_segment_may_follow():
+    segments = Recorded([(i + 1, f"padding {i}\n" * 20) for i in range(200)] + [(201, "retry budget\n")])
+    chosen = select_segments(segments, "retry budget", 200)
+    assert segments.read == 201
+    assert any(text == "retry budget\n" for _, _, text in chosen)
+
+
+def test_early_stop_still_marks_the_unread_rest(tmp_path, monkeypatch):
+    monkeypatch.setattr(context_budget, "SEGMENT_BYTES", 64)
+    path = tmp_path / "log.txt"
+    path.write_text(filler(500))
+    text, _ = read_file_within_budget(str(path), "padding line", 100)
+    assert text.rstrip().endswith("... (rest of file omitted) ...")
+
+
+def test_files_share_the_budget(tmp_path):
+    small, big = tmp_path / "small.py", tmp_path / "big.txt"
+    small.write_text("X = 1\n")
+    big.write_text(filler(5000))
+    output = assemble_file_context("padding", [str(small), str(big)], token_budget=800)
+    assert output.startswith("1.  Filename: small.py")
+    assert "2.  Filename: big.txt" in output
+    assert count_tokens(output) <= 900
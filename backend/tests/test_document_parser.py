@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+
+from app.utils.document_parser import DocumentParser, ParsedTextCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParsedTextCache(str(tmp_path / "parsed.db"))
+
+
+@pytest.fixture
+def parser(cache):
+    with DocumentParser(cache, workers=1, timeout=10) as parser:
+        yield parser
+
+
+def test_failed_loader_falls_back_to_plain_text(parser, tmp_path):
+    path = tmp_path / "notes.md"
+    path.write_text("# Notes\n\nSome text.\n")
+    assert parser.parse(path, ".md", "NoSuchLoader") == "# Notes\n\nSome text.\n"
+
+
+def test_notebook_fallback_keeps_cell_sources(parser, tmp_path):
+    path = tmp_path / "book.ipynb"
+    path.write_text('{"cells": [{"source": ["x = 1\\n", "y = 2"]}, {"source": "print(x)"}]}')
+    assert parser.parse(path, ".ipynb", "NoSuchLoader") == "x = 1\ny = 2\n\nprint(x)"
+
+
+def test_unparseable_file_becomes_empty_text_and_is_tried_again(parser, cache, tmp_path, monkeypatch):
+    path = tmp_path / "broken.ipynb"
+    path.write_text("{not json")
+    assert parser.parse(path, ".ipynb", "NoSuchLoader") == ""
+    assert cache.stats()["entries"] == 0
+    # Fixed in place: the next parse reads it rather than a cached failure.
+    path.write_text('{"cells": [{"source": "x = 1"}]}')
+    assert parser.parse(path, ".ipynb", "NoSuchLoader") == "x = 1"
+
+
+def test_cache_is_keyed_by_content(parser, cache, tmp_path):
+    first, second = tmp_path / "a.md", tmp_path / "b.md"
+    first.write_text("same\n")
+    second.write_text("same\n")
+    parser.parse(first, ".md", "NoSuchLoader")
+    parser.parse(second, ".md", "NoSuchLoader")
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_worker_is_killed_when_it_overruns(cache, tmp_path):
+    # Opening a FIFO that nobody writes to blocks the worker for good.
+    fifo = tmp_path / "stuck.md"
+    os.mkfifo(fifo)
+    with DocumentParser(cache, workers=1, timeout=0.5) as parser:
+        started = time.monotonic()
+        result = parser._run((str(fifo), ".md", "NoSuchLoader", "plain"))
+        assert time.monotonic() - started < 5
+        assert result == (False, "timed out after 0.5s", True)
+        assert parser.idle == []
+
+
+def test_overrun_loader_falls_back_to_plain_text_without_caching_it(parser, cache, tmp_path, monkeypatch):
+    path = tmp_path / "slow.md"
+    path.write_text("plain\n")
+    run = parser._run
+
+    def loader_times_out(request):
+        if request[3] == "loader":
+            return False, "timed out after 10s", True
+        return run(request)
+
+    monkeypatch.setattr(parser, "_run", loader_times_out)
+    assert parser.parse(path, ".md", "UnstructuredMarkdownLoader") == "plain\n"
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction_keeps_recent_entries(tmp_path):
+    cache = ParsedTextCache(str(tmp_path / "parsed.db"), max_bytes=100)
+    cache.put("old", "x" * 40)
+    cache.put("recent", "y" * 40)
+    assert cache.get("old") is not None
+    cache.put("new", "z" * 40)
+    assert cache.get("recent") is None
+    assert cache.get("old") == "x" * 40
+    assert cache.stats()["bytes"] <= 100
@@ -0,0 +1,77 @@
+import pytest
+
+from app.utils.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings:
+    model = "counting"
+
+    def __init__(self):
+        self.documents = []
+        self.queries = []
+
+    def embed_documents(self, texts):
+        self.documents.append(list(texts))
+        return [[float(len(text)), 1.0, 0.0, 0.0] for text in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 0.0, 1.0, 0.0]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(str(tmp_path / "embeddings.db"))
+
+
+def test_only_missing_texts_reach_the_model(cache):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(lambda: model, cache)
+    first = embeddings.embed_documents(["a", "bb", "a"])
+    second = embeddings.embed_documents(["bb", "ccc"])
+    assert model.documents == [["a", "bb"], ["ccc"]]
+    assert first == [[1.0, 1.0, 0.0, 0.0], [2.0, 1.0, 0.0, 0.0], [1.0, 1.0, 0.0, 0.0]]
+    assert second[0] == first[1]
+    assert cache.stats()["entries"] == 3
+
+
+def test_queries_are_cached_apart_from_documents(cache):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(lambda: model, cache)
+    embeddings.embed_documents(["where"])
+    assert embeddings.embed_query("where") == [5.0, 0.0, 1.0, 0.0]
+    assert embeddings.embed_query("where") == [5.0, 0.0, 1.0, 0.0]
+    assert model.queries == ["where"]
+
+
+def test_model_is_built_on_first_use(cache):
+    built = []
+    embeddings = CachedEmbeddings(lambda: built.append(1) or CountingEmbeddings(), cache)
+    assert built == []
+    embeddings.embed_documents(["x"])
+    embeddings.embed_documents(["y"])
+    assert built == [1]
+
+
+def test_keys_depend_on_the_model():
+    assert EmbeddingCache.key("a", "text") != EmbeddingCache.key("b", "text")
+
+
+def test_lru_eviction_keeps_recent_vectors(tmp_path):
+    # Four float32 values are 16 bytes a vector.
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"), max_bytes=40)
+    cache.put_many({"old": [1.0] * 4})
+    cache.put_many({"recent": [2.0] * 4})
+    assert cache.get_many(["old"]) == {"old": [1.0] * 4}
+    cache.put_many({"new": [3.0] * 4})
+    assert set(cache.get_many(["old", "recent", "new"])) == {"old", "new"}
+    assert cache.stats()["bytes"] == 32
+
+
+def test_reopened_cache_keeps_vectors_and_size(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    EmbeddingCache(path).put_many({"k": [0.5] * 4})
+    reopened = EmbeddingCache(path)
+    assert reopened.total_bytes == 16
+    assert reopened.get_many(["k", "missing"]) == {"k": [0.5] * 4}
+    assert (reopened.hits, reopened.misses) == (1, 1)
@@ -0,0 +1,73 @@
+import os
+
+from app.utils import ingest_repo
+from app.utils.file_cache import FileContentCache, file_version
+
+
+def test_cached_text_is_served_until_the_file_changes(tmp_path):
+    cache = FileContentCache()
+    path = tmp_path / "a.py"
+    path.write_text("one\n")
+    cache.put(path, "one\n", "a.py")
+    assert cache.get(path) == ("one\n", "a.py")
+
+    path.write_text("changed\n")
+    os.utime(path, ns=(1, 1))
+    assert cache.get(path) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_text_is_keyed_by_the_version_read_not_the_one_stored(tmp_path):
+    cache = FileContentCache()
+    path = tmp_path / "a.py"
+    path.write_text("old\n")
+    version = file_version(path)
+    # The file changes between reading it and caching what was read.
+    path.write_text("newer text\n")
+    cache.put(path, "old\n", "a.py", version)
+    assert cache.get(path) is None
+
+
+def test_least_recently_used_files_go_past_the_byte_budget(tmp_path):
+    cache = FileContentCache(max_bytes=40)
+    paths = {}
+    for name in "abcde":
+        paths[name] = tmp_path / name
+        paths[name].write_text(name * 10)
+    for name in "abcd":
+        cache.put(paths[name], name * 10, name)
+    cache.get(paths["a"])
+    cache.put(paths["e"], "e" * 10, "e")
+    assert cache.get(paths["b"]) is None
+    assert cache.get(paths["a"]) == ("a" * 10, "a")
+    assert cache.stats()["bytes"] == 40
+
+    # Over a quarter of the budget: never cached, so it can't flush everything else.
+    cache.put(paths["b"], "b" * 11, "b")
+    assert cache.get(paths["b"]) is None
+    assert cache.stats()["entries"] == 4
+
+
+def test_discard_under_drops_a_checkout(tmp_path):
+    cache = FileContentCache()
+    for rel in ("repo/a.py", "repo/sub/b.py", "repo2/c.py"):
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x\n")
+        cache.put(path, "x\n", path.name)
+    cache.discard_under(tmp_path / "repo")
+    assert cache.stats()["entries"] == 1 and cache.stats()["bytes"] == 2
+    assert cache.get(tmp_path / "repo2" / "c.py") == ("x\n", "c.py")
+
+
+def test_reading_a_file_twice_decodes_it_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_repo, "FILE_CACHE", FileContentCache())
+    path = tmp_path / "notes.txt"
+    path.write_text("hello\n")
+    assert ingest_repo.validate_and_read_file(str(path)) == ("hello\n", "notes.txt")
+
+    def no_load(filepath, ext):
+        raise AssertionError("decoded a cached file again")
+
+    monkeypatch.setattr(ingest_repo, "load_documents", no_load)
+    assert ingest_repo.validate_and_read_file(str(path)) == ("hello\n", "notes.txt")
@@ -0,0 +1,53 @@
+from app.utils.file_index import FileIndex, words
+
+
+PATHS = [
+    "/repo/src/utils/helpers.py",
+    "/repo/tests/utils/helpers.py",
+    "/repo/src/app.config.js",
+    "/repo/README.md",
+    "/repo/src/DataLoader.ts",
+]
+
+
+def make_index():
+    table = [{"path": path, "language": "", "filename": path.split("/")[-1]} for path in PATHS]
+    return FileIndex(table, "/repo")
+
+
+def resolved(index, query):
+    return [index.relpaths[i] for i in index.resolve(query)]
+
+
+def test_exact_path_beats_shared_basename():
+    index = make_index()
+    assert resolved(index, "what is in src/utils/helpers.py") == ["src/utils/helpers.py"]
+    assert resolved(index, "what is in helpers.py") == ["src/utils/helpers.py", "tests/utils/helpers.py"]
+
+
+def test_path_suffix_and_case():
+    index = make_index()
+    assert resolved(index, "explain Tests/Utils/helpers.py") == ["tests/utils/helpers.py"]
+    assert resolved(index, "explain utils/helpers.py") == ["src/utils/helpers.py", "tests/utils/helpers.py"]
+
+
+def test_stem_then_fuzzy_tiers():
+    index = make_index()
+    assert resolved(index, "what does the app module configure") == ["src/app.config.js"]
+    assert resolved(index, "what does helpres.py do") == ["src/utils/helpers.py", "tests/utils/helpers.py"]
+    # Fuzzy matching only applies to tokens that look like file names.
+    assert resolved(index, "what does helpres do") == []
+
+
+def test_mentions_only_counts_exact_names():
+    index = make_index()
+    assert [index.relpaths[i] for i in index.mentions("compare README.md and app.config.js")] == ["README.md", "src/app.config.js"]
+    assert index.mentions("what does the app do") == []
+
+
+def test_index_of_and_path_words():
+    index = make_index()
+    assert index.index_of("/repo/src/DataLoader.ts") == 4
+    assert index.index_of("/elsewhere/x.py") is None
+    assert index.path_words[4] == {"src", "data", "loader", "ts"}
+    assert words("getHTTPResponse_v10") == {"get", "http", "response", "10"}
@@ -0,0 +1,50 @@
+from app.utils.file_index import FileIndex
+from app.utils.file_selection import directory_summary, format_shortlist, shortlist_files
+
+
+ROOT = "/repo"
+
+
+def index_of(*relpaths):
+    table = [{"path": f"{ROOT}/{relpath}", "language": "", "filename": relpath.split("/")[-1]} for relpath in relpaths]
+    return FileIndex(table, ROOT)
+
+
+def names(index, indices):
+    return [index.relpaths[i] for i in indices]
+
+
+def test_path_words_and_overview_files_rank_first():
+    index = index_of("src/auth/login.py", "src/billing/invoice.py", "README.md", "docs/deep/nested/README.md", "node_modules/auth/index.js")
+    shortlist = names(index, shortlist_files("how does auth login work", index, top_n=3))
+    assert shortlist[0] == "src/auth/login.py"
+    # The top-level README beats a nested one; vendored code never makes the list.
+    assert shortlist.index("README.md") < shortlist.index("docs/deep/nested/README.md")
+    assert "node_modules/auth/index.js" not in shortlist
+
+
+def test_vector_hits_lift_files_the_words_miss():
+    index = index_of("src/a.py", "src/b.py", "src/c.py")
+    assert names(index, shortlist_files("payment flow", index, vector_hits=[2, 2, 1], top_n=2)) == ["src/c.py", "src/b.py"]
+
+
+def test_no_match_falls_back_to_the_shallowest_files():
+    index = index_of("a/b/c/deep.py", "top.py", "a/mid.py")
+    assert names(index, shortlist_files("zzz", index)) == ["top.py", "a/mid.py", "a/b/c/deep.py"]
+
+
+def test_directory_summary_collapses_vendored_dirs_and_folds_deep_ones():
+    index = index_of("src/app/main.py", "src/app/deep/x.py", "node_modules/pkg/a.js", "node_modules/pkg/b.js", "README.md")
+    summary = directory_summary(index).splitlines()
+    assert summary[0] == "./ (5 files)"
+    assert "node_modules/ (2 files, vendored/generated, collapsed)" in summary
+    assert summary[2:] == ["src/ (2 files)", "  app/ (2 files)"]
+    assert not any("deep" in line for line in summary)
+
+
+def test_format_shortlist_stops_at_the_token_budget():
+    index = index_of(*[f"src/module_{i}.py" for i in range(50)])
+    text, kept = format_shortlist(list(range(50)), index, token_budget=60)
+    assert 0 < len(kept) < 50
+    assert text.splitlines()[0] == "1.  Path: src/module_0.py"
+    assert len(text.splitlines()) == len(kept)
@@ -0,0 +1,59 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from app.utils.history import ChatHistory
+from app.utils.tokens import count_tokens
+
+
+def turn(i):
+    return f"question {i} " + "word " * 40, f"answer {i} " + "word " * 40
+
+
+def filled(n, token_budget):
+    history = ChatHistory("system", token_budget=token_budget, keep_turns=2)
+    for i in range(n):
+        history.add_turn(*turn(i), context=f"context {i}")
+    return history
+
+
+def test_turns_keep_question_and_answer_but_not_context():
+    history = filled(2, token_budget=10_000)
+    messages = history.messages("next")
+    assert [type(m) for m in messages] == [SystemMessage, HumanMessage, AIMessage, HumanMessage, AIMessage, HumanMessage]
+    assert not any("context" in m.content for m in messages)
+    # The last context stays around for a follow-up question.
+    assert history.last_context == "context 1"
+
+
+def test_oldest_turns_fold_into_a_summary_past_the_budget():
+    per_turn = sum(count_tokens(text) for text in turn(0))
+    history = filled(6, token_budget=per_turn * 4)
+    calls = []
+
+    def summarise(summary, turns):
+        calls.append([question.split()[1] for question, _, _ in turns])
+        return "SUMMARY"
+
+    history.compact(summarise)
+    assert calls == [["0", "1", "2", "3"]]
+    assert len(history) == 2 and history.summary == "SUMMARY"
+    assert "Summary of the earlier conversation:\nSUMMARY" in history.messages("next")[1].content
+    history.compact(summarise)
+    assert len(calls) == 1
+
+
+def test_the_most_recent_turns_are_never_folded():
+    history = filled(2, token_budget=1)
+    assert history.pending_compaction() == []
+
+
+def test_a_failed_summariser_falls_back_to_the_questions():
+    history = filled(5, token_budget=200)
+
+    async def failing(summary, turns):
+        raise RuntimeError("model down")
+
+    asyncio.run(history.acompact(failing))
+    assert history.summary.startswith("- User asked: question 0")
+    assert len(history) == 2
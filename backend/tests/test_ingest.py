@@ -0,0 +1,105 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from app.utils import ingest_repo as ingest_module
+from app.utils.ingest_repo import chunk_file, chunk_files, ingest_repo, update_repo
+from app.utils.jobs import Job
+from app.utils.sessions import RepoIndex
+from app.utils.vector_store import count_vectors
+from conftest import write_files
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_a_file_that_fails_to_chunk_is_skipped_and_counted(workers, tmp_path):
+    write_files(tmp_path, {"good.py": "def good():\n    return 1\n", "notes.txt": "notes\n"})
+    # A directory with a source extension: opening it fails inside the chunking process.
+    (tmp_path / "broken.py").mkdir()
+    progress = Job("file:///repo")
+    paths = [tmp_path / "good.py", tmp_path / "broken.py", tmp_path / "notes.txt"]
+
+    results = {Path(path).name: code_chunks for path, _, code_chunks, *_ in chunk_files(paths, workers, progress)}
+
+    assert sorted(results) == ["good.py", "notes.txt"]
+    assert "def good" in results["good.py"][0]["text"]
+    assert progress.counts["files_failed"] == 1
+
+
+def chunk_or_die(filepath):
+    # Stands in for chunk_file in the chunking processes. Chunking die.py takes its
+    # process down the way a segfault or the OOM killer would.
+    if Path(filepath).name == "die.py":
+        os._exit(1)
+    return chunk_file(filepath)
+
+
+def test_a_file_that_kills_its_chunking_process_is_skipped(monkeypatch, tmp_path):
+    files = {f"good{i}.py": f"def good{i}():\n    return {i}\n" for i in range(6)}
+    write_files(tmp_path, {**files, "die.py": "def die():\n    pass\n"})
+    monkeypatch.setattr(ingest_module, "chunk_file", chunk_or_die)
+    progress = Job("file:///repo")
+    paths = sorted(tmp_path.iterdir())
+
+    chunked = sorted(Path(path).name for path, *_ in chunk_files(paths, 2, progress))
+
+    assert chunked == sorted(files)
+    assert progress.counts["files_failed"] == 1
+
+
+class Phases(Job):
+    def __init__(self):
+        super().__init__("file:///repo")
+        self.phases = []
+
+    def phase(self, name):
+        self.phases.append(name)
+
+
+def test_ingest_reports_scan_chunk_and_embed_phases(make_git_repo):
+    path = make_git_repo({"src/app.py": "def main():\n    return 1\n", "README.md": "# Fixture\n"})
+    index = RepoIndex(f"file://{path}")
+    progress = Phases()
+    ingest_repo(path, index, workers=1, progress=progress)
+    assert progress.phases == ["scan", "chunk", "embed"]
+    assert progress.counts["files_chunked"] == 2
+
+
+class Reader(Job):
+    """Looks at the live index every time the update reports progress, like a chat would."""
+
+    def __init__(self, index):
+        super().__init__("file:///repo")
+        self.index = index
+        self.seen = []
+
+    def count(self, **counts):
+        super().count(**counts)
+        index = self.index
+        self.seen.append((
+            sorted(entry["filename"] for entry in index.file_symbol_table),
+            bool(index.symbol_index.lookup("old_name")),
+            bool(index.symbol_index.lookup("new_name")),
+            [doc.metadata["file_path"] for doc in index.code_retriever.get_relevant_documents("old_name", k=1)],
+            bool(index.file_index.resolve("b.py")),
+        ))
+
+
+def test_chats_see_the_old_index_until_an_update_is_swapped_in(make_git_repo):
+    path = make_git_repo({"a.py": "def old_name():\n    return 1\n", "b.py": "def other():\n    return 2\n"})
+    index = RepoIndex(f"file://{path}")
+    ingest_repo(path, index, workers=1)
+    write_files(path, {"a.py": "def new_name():\n    return 3\n"})
+    (path / "b.py").unlink()
+    reader = Reader(index)
+
+    update_repo([path / "a.py"], [path / "b.py"], index, workers=1, progress=reader)
+
+    assert reader.seen
+    assert all(seen == (["a.py", "b.py"], True, False, [str(path / "a.py")], True) for seen in reader.seen)
+    assert [entry["filename"] for entry in index.file_symbol_table] == ["a.py"]
+    assert not index.symbol_index.lookup("old_name") and index.symbol_index.lookup("new_name")
+    assert "new_name" in index.code_retriever.get_relevant_documents("old_name", k=1)[0].page_content
+    assert not index.file_index.resolve("b.py")
+    assert count_vectors(index.code_store) == 1
+    assert index.scan_report.files_kept == 1
@@ -0,0 +1,115 @@
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+from app.utils.lexical_index import HybridRetriever, LexicalIndex, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("getUserName(user_id)") == ["getusername", "get", "user", "name", "user_id", "user", "id"]
+    assert tokenize("x = 42") == ["x", "42"]
+
+
+def build(chunks):
+    index = LexicalIndex()
+    for doc_id, (path, text) in chunks.items():
+        index.add(doc_id, path, text)
+    return index
+
+
+def test_bm25_prefers_rare_terms_and_short_documents():
+    index = build({
+        "a.py::0": ("a.py", "def parse_config(): return config"),
+        "b.py::0": ("b.py", "config config loader"),
+        "c.py::0": ("c.py", "config " + "padding " * 50),
+        "d.py::0": ("d.py", "unrelated words only"),
+    })
+    ranked = [doc_id for doc_id, _ in index.search("parse config", 4)]
+    # Only a.py has the rare "parse"; the long c.py ranks below the short b.py for "config".
+    assert ranked == ["a.py::0", "b.py::0", "c.py::0"]
+    assert [doc_id for doc_id, _ in index.search("parse config", 1)] == ["a.py::0"]
+    assert index.search("nothing matches", 3) == []
+
+
+def test_readding_and_removing_files():
+    index = build({"a.py::0": ("a.py", "alpha"), "a.py::1": ("a.py", "beta"), "b.py::0": ("b.py", "alpha")})
+    index.add("b.py::0", "b.py", "gamma")
+    assert index.by_file["b.py"] == ["b.py::0"]
+    assert [doc_id for doc_id, _ in index.search("alpha", 5)] == ["a.py::0"]
+    index.remove_file("a.py")
+    assert len(index) == 1
+    assert index.search("alpha beta", 5) == []
+    assert index.total_length == 1
+
+
+def test_index_survives_pickling():
+    index = pickle.loads(pickle.dumps(build({"a.py::0": ("a.py", "alpha beta")})))
+    index.add("b.py::0", "b.py", "beta")
+    assert {doc_id for doc_id, _ in index.search("beta", 5)} == {"a.py::0", "b.py::0"}
+
+
+def test_rrf_rewards_agreement_between_rankers():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["d", "b", "e"]])
+    assert fused[0] == "b"
+    assert set(fused[1:3]) == {"a", "d"}
+    assert set(fused[3:]) == {"c", "e"}
+
+
+class StubStore:
+    """Vector search returns a fixed ranking; get() serves any chunk by id."""
+
+    def __init__(self, chunks, ranking):
+        self.chunks = chunks
+        self.ranking = ranking
+        self.threads = []
+
+    def similarity_search(self, query, k):
+        self.threads.append(threading.current_thread().name)
+        return [self._doc(chunk_id) for chunk_id in self.ranking[:k]]
+
+    def get(self, ids):
+        return {
+            "ids": list(ids),
+            "documents": [self.chunks[chunk_id] for chunk_id in ids],
+            "metadatas": [self._doc(chunk_id).metadata for chunk_id in ids],
+        }
+
+    def _doc(self, chunk_id):
+        path, chunk = chunk_id.split("::")
+        return Document(page_content=self.chunks[chunk_id], metadata={"file_path": path, "chunk_id": int(chunk)})
+
+
+def test_hybrid_retriever_fuses_and_fetches_lexical_only_hits():
+    chunks = {
+        "a.py::0": "def load_settings(path): read the settings file",
+        "b.py::0": "settings loader",
+        "c.py::0": "unrelated content about rendering",
+        "d.py::0": "more rendering",
+    }
+    index = build({chunk_id: (chunk_id.split("::")[0], text) for chunk_id, text in chunks.items()})
+    # The vector side misses a.py entirely; BM25 ranks it first for the exact identifier.
+    store = StubStore(chunks, ["b.py::0", "c.py::0", "d.py::0"])
+    docs = HybridRetriever(store, index, fanout=1).get_relevant_documents("load_settings", k=3)
+    assert [doc.metadata["file_path"] for doc in docs] == ["b.py", "a.py", "c.py"]
+    assert docs[1].page_content == chunks["a.py::0"]
+
+
+def test_vector_search_runs_on_the_pool_unless_the_pool_is_busy(monkeypatch):
+    chunks = {"a.py::0": "alpha", "b.py::0": "beta"}
+    index = build({chunk_id: (chunk_id.split("::")[0], text) for chunk_id, text in chunks.items()})
+    store = StubStore(chunks, ["a.py::0", "b.py::0"])
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="pool") as pool:
+        retriever = HybridRetriever(store, index, pool=pool)
+        # Called from the pool's only thread, the search can't be queued behind itself.
+        docs = pool.submit(retriever.get_relevant_documents, "beta", k=1).result(timeout=5)
+        assert docs[0].page_content == "beta"
+
+        # BM25 holds on until the vector search has started, so that it overlaps with it.
+        started = threading.Event()
+        search, similarity_search = index.search, store.similarity_search
+        monkeypatch.setattr(index, "search", lambda query, k: started.wait(5) and search(query, k))
+        monkeypatch.setattr(store, "similarity_search", lambda query, k: started.set() or similarity_search(query, k))
+        assert retriever.get_relevant_documents("alpha", k=1)[0].page_content == "alpha"
+        assert store.threads[-1].startswith("pool")
@@ -0,0 +1,69 @@
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from app.utils.metrics import METRICS, Metrics, cache_gauges
+from app.utils.models import TokenUsage
+from app.utils.timing import add_counter, add_observer, remove_counter, remove_observer, stage
+
+
+def installed(metrics):
+    add_observer(metrics.observe)
+    add_counter(metrics.count)
+    return metrics
+
+
+def uninstall(metrics):
+    remove_observer(metrics.observe)
+    remove_counter(metrics.count)
+
+
+def test_stage_timings_render_as_cumulative_histograms():
+    metrics = Metrics(buckets=(0.1, 1))
+    metrics.observe("retrieve", 0.05, {"category": "GENERAL"})
+    metrics.observe("retrieve", 0.5, {"category": "GENERAL"})
+    metrics.observe("retrieve", 5, {"category": "GENERAL"})
+    lines = metrics.render().splitlines()
+    labels = 'stage="retrieve",category="GENERAL"'
+    assert f'codewhisper_stage_seconds_bucket{{{labels},le="0.1"}} 1' in lines
+    assert f'codewhisper_stage_seconds_bucket{{{labels},le="1"}} 2' in lines
+    assert f'codewhisper_stage_seconds_bucket{{{labels},le="+Inf"}} 3' in lines
+    assert f"codewhisper_stage_seconds_sum{{{labels}}} 5.55" in lines
+    assert f"codewhisper_stage_seconds_count{{{labels}}} 3" in lines
+
+
+def test_stages_and_token_usage_reach_installed_metrics():
+    metrics = installed(Metrics())
+    try:
+        with stage("classify"):
+            pass
+        message = AIMessage(content="hi", usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 15})
+        TokenUsage("gpt").on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]))
+    finally:
+        uninstall(metrics)
+    text = metrics.render()
+    assert 'codewhisper_stage_seconds_count{stage="classify"} 1' in text
+    assert 'codewhisper_llm_calls_total{model="gpt"} 1' in text
+    assert 'codewhisper_llm_tokens_total{kind="prompt",model="gpt"} 12' in text
+    assert 'codewhisper_llm_tokens_total{kind="completion",model="gpt"} 3' in text
+
+
+def test_gauges_and_label_values_are_escaped():
+    gauges = cache_gauges({'odd"name': {"hits": 3, "misses": 1, "hit_rate": 0.75}})
+    lines = Metrics().render(gauges).splitlines()
+    assert "# TYPE codewhisper_cache_hits gauge" in lines
+    assert 'codewhisper_cache_hit_rate{cache="odd\\"name"} 0.75' in lines
+    assert not any(line.startswith("codewhisper_cache_bytes") for line in lines)
+
+
+def test_metrics_endpoint_serves_the_exposition_format():
+    from app import main
+    with stage("answer_cache"):
+        pass
+    response = TestClient(main.app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'codewhisper_stage_seconds_count{stage="answer_cache"}' in response.text
+    assert 'codewhisper_cache_entries{cache="answer"} 0' in response.text
+    assert "codewhisper_sessions " in response.text
+    assert METRICS.render().startswith("# HELP codewhisper_stage_seconds")
@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import chat
+
+
+class Retriever:
+    def __init__(self, name, calls, gate=None):
+        self.name = name
+        self.calls = calls
+        self.gate = gate
+
+    def get_relevant_documents(self, query, k=4):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.calls.append(self.name)
+        return [f"{self.name}-{i}" for i in range(k)]
+
+
+def make_repo(calls, gate=None):
+    return SimpleNamespace(
+        code_retriever=Retriever("code", calls, gate),
+        noncode_retriever=Retriever("non_code", calls),
+        symbol_index=SimpleNamespace(find_in_query=lambda query: []),
+        file_index=SimpleNamespace(resolve=lambda query: calls.append("files") or []),
+    )
+
+
+def test_cancel_drops_the_lookups_still_queued(monkeypatch):
+    calls = []
+    gate = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        monkeypatch.setattr(chat, "RETRIEVAL_POOL", pool)
+        prefetch = chat.Prefetch("how does login work", make_repo(calls, gate))
+        prefetch.cancel()
+        gate.set()
+    # Only the code search had started; the rest never ran.
+    assert calls == ["code"]
+    assert prefetch.futures["files"].cancelled()
+
+
+def test_vector_search_reuses_a_deep_enough_prefetch():
+    calls = []
+    repo = make_repo(calls)
+    prefetch = chat.Prefetch("how does login work", repo, k=5)
+    for future in prefetch.futures.values():
+        future.result()
+    calls.clear()
+    code, non_code = chat.vector_search("how does login work", repo, 3, prefetch)
+    assert (code, non_code) == (["code-0", "code-1", "code-2"], ["non_code-0", "non_code-1", "non_code-2"])
+    assert calls == []
+    # Asking for more than was prefetched searches again.
+    chat.vector_search("how does login work", repo, prefetch.k + 1, prefetch)
+    assert sorted(calls) == ["code", "non_code"]
+
+
+def test_llm_output_cancels_the_prefetch_when_retrieval_fails(monkeypatch):
+    prefetch = SimpleNamespace(cancelled=False)
+    prefetch.cancel = lambda: setattr(prefetch, "cancelled", True)
+    monkeypatch.setattr(chat, "classify", lambda query, repo, k=None: ("GENERAL", prefetch))
+
+    def fail(inputs):
+        raise RuntimeError("retrieval failed")
+
+    monkeypatch.setattr(chat, "branched_chain", SimpleNamespace(invoke=fail))
+    repo = SimpleNamespace(file_symbol_table=[])
+    with pytest.raises(RuntimeError):
+        chat.LLM_OUTPUT("what is this repo", SimpleNamespace(), repo, use_cache=False)
+    assert prefetch.cancelled
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils.file_index import FileIndex
+from app.utils.query_classifier import QueryClassifier
+from app.utils.symbol_index import SymbolIndex, extract_symbols
+
+
+SOURCE = "def load_config(path):\n    return path\n\n\ndef run():\n    pass\n\n\nclass Router:\n    pass\n"
+
+
+def make_repo(commit="c1"):
+    symbols = SymbolIndex()
+    symbols.add_file("/repo/app/config.py", *extract_symbols("/repo/app/config.py", SOURCE, ".py"))
+    table = [
+        {"path": "/repo/app/config.py", "language": ".py", "filename": "config.py"},
+        {"path": "/repo/README.md", "language": ".md", "filename": "README.md"},
+    ]
+    return SimpleNamespace(key="repo", commit=commit, symbol_index=symbols, file_index=FileIndex(table, "/repo"))
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("thanks!", ("FOLLOWUP", 0.95)),
+    ("What does config.py do?", ("FILE", 0.9)),
+    ("How does load_config work?", ("FUNCTION&CLASS", 0.9)),
+    ("Explain the Router class", ("FUNCTION&CLASS", 0.9)),
+    ("explain run() please", ("FUNCTION&CLASS", 0.9)),
+    # "run" is a plain word as well as a function name.
+    ("how do I run the tests", ("FUNCTION&CLASS", 0.6)),
+    ("does load_config in config.py validate", ("FILE", 0.6)),
+    ("tell me more about that", ("FOLLOWUP", 0.85)),
+    ("How do I install this project?", ("GENERAL", 0.85)),
+    ("where does the data end up", ("GENERAL", 0.3)),
+])
+def test_guess(query, expected):
+    assert QueryClassifier().guess(query, make_repo()) == expected
+
+
+def test_fast_path_defers_unsure_queries_to_the_llm():
+    classifier = QueryClassifier()
+    repo = make_repo()
+    assert classifier.fast_path("What does config.py do?", repo) == "FILE"
+    assert classifier.fast_path("where does the data end up", repo) is None
+    assert classifier.stats()["llm_fallbacks"] == 1
+
+
+def test_memo_is_keyed_by_commit_and_evicts_oldest():
+    classifier = QueryClassifier(memo_size=2)
+    repo = make_repo()
+    classifier.remember("where does the data end up", repo, "GENERAL")
+    assert classifier.fast_path("Where does the data end up?", repo) == "GENERAL"
+    assert classifier.fast_path("where does the data end up", make_repo("c2")) is None
+
+    classifier.remember("a", repo, "GENERAL")
+    classifier.remember("b", repo, "GENERAL")
+    assert classifier.fast_path("where does the data end up", repo) is None
+    assert classifier.stats()["memo_hits"] == 1
@@ -0,0 +1,113 @@
+import os
+import shutil
+
+import pytest
+
+from app.utils.git_sync import head_commit
+from app.utils.ingest_repo import ingest_repo
+from app.utils.registry import IndexRegistry
+from app.utils.sessions import RepoIndex, SessionStore
+
+
+FILES = {"src/app.py": "def main():\n    return helper()\n\n\ndef helper():\n    return 1\n", "README.md": "# Fixture\n"}
+
+
+@pytest.fixture
+def build(make_git_repo):
+    """A built RepoIndex for a fresh fixture repo, checked out where the app would put it."""
+    def build(name):
+        source = make_git_repo(FILES, name=name)
+        repo = RepoIndex(f"file://{source}")
+        shutil.copytree(source, repo.path)
+        ingest_repo(repo.path, repo, workers=1)
+        repo.commit = head_commit(repo.path)
+        return repo
+    return build
+
+
+def test_registered_index_attaches_to_a_fresh_one(build, tmp_path):
+    registry = IndexRegistry(root=str(tmp_path / "registry"))
+    built = build("one")
+    registry.register(built)
+
+    assert registry.lookup(built.repo_url, "0" * 40) is None
+    entry = registry.lookup(built.repo_url, built.commit)
+    fresh = RepoIndex(built.repo_url)
+    fresh.attach(entry, registry.load_state(entry))
+
+    assert fresh.key == built.key and fresh.path == built.path
+    assert fresh.ready
+    assert [s["file"] for s in fresh.symbol_index.lookup("helper")] == [os.path.join(built.path, "src", "app.py")]
+    assert fresh.scan_report.files_kept == 2
+    assert fresh.code_retriever.get_relevant_documents("helper", k=1)[0].metadata["file_path"].endswith("app.py")
+    assert registry.stats()["hits"] == 1 and registry.stats()["misses"] == 1
+
+
+def test_sessions_keep_registered_indexes_on_disk(build, tmp_path):
+    registry = IndexRegistry(root=str(tmp_path / "registry"))
+    sessions = SessionStore(registry=registry)
+    kept, dropped = build("kept"), build("dropped")
+    registry.register(kept)
+    # Neither has a session or a pending init, so the next lookup evicts both.
+    sessions.repos.update({kept.repo_url: kept, dropped.repo_url: dropped})
+    sessions.get("no-such-session")
+    assert sessions.repos == {}
+    assert os.path.isdir(kept.path)
+    assert not os.path.exists(dropped.path)
+
+
+def test_gc_deletes_least_recently_used_entries_not_in_use(build, tmp_path):
+    registry = IndexRegistry(root=str(tmp_path / "registry"))
+    old, used, new = build("old"), build("used"), build("new")
+    for repo in (old, used, new):
+        registry.register(repo)
+    size = {key: entry["size_bytes"] for key, entry in registry.entries.items()}
+
+    registry.max_bytes = size[used.key] + size[new.key]
+    assert registry.gc() == 1
+    assert not registry.owns(old.key)
+    assert not os.path.exists(old.path)
+
+    # A lookup makes `used` the most recently used entry.
+    registry.lookup(used.repo_url, used.commit)
+    registry.max_bytes = size[used.key]
+    assert registry.gc() == 1
+    assert not registry.owns(new.key) and registry.owns(used.key)
+
+    # Indexes held in memory are never collected, however far over budget.
+    registry.max_bytes = 1
+    assert registry.gc(in_use={used.key}) == 0
+    assert os.path.isdir(used.path)
+    assert registry.gc() == 1
+    assert registry.stats()["entries"] == 0
+
+
+def test_reopened_registry_forgets_incomplete_entries(build, tmp_path):
+    root = str(tmp_path / "registry")
+    registry = IndexRegistry(root=root)
+    kept, lost = build("kept"), build("lost")
+    registry.register(kept)
+    registry.register(lost)
+    shutil.rmtree(lost.path)
+
+    reopened = IndexRegistry(root=root)
+    assert reopened.owns(kept.key)
+    assert not reopened.owns(lost.key)
+    assert reopened.lookup(kept.repo_url, kept.commit)["path"] == kept.path
+
+
+def test_registry_is_read_on_first_use(build, tmp_path):
+    root = tmp_path / "registry"
+    registry = IndexRegistry(root=str(root))
+    assert not root.exists()
+    built = build("lazy")
+    registry.register(built)
+    lost = build("lost")
+    registry.register(lost)
+    shutil.rmtree(lost.path)
+
+    reopened = IndexRegistry(root=str(root))
+    # Pruning waits for the first lookup too.
+    assert "lost" in (root / "registry.json").read_text()
+    assert reopened.lookup(built.repo_url, built.commit)["key"] == built.key
+    assert "lost" not in (root / "registry.json").read_text()
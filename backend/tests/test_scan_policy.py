@@ -0,0 +1,85 @@
+import os
+
+from app.utils import scan_policy
+from app.utils.scan_policy import ScanReport, scan_repo
+from conftest import write_files
+
+
+FILES = {
+    "src/app.py": "def main():\n    return 1\n",
+    "node_modules/left-pad/index.js": "module.exports = 1;\n",
+    "package-lock.json": "{}\n",
+    "static/app.min.js": "var a=1;\n",
+    "static/app.js.map": "{}\n",
+    "third/lib.py": "X = 1\n",
+    "models/schema_pb2.py": "Y = 2\n",
+    ".github/workflows/ci.yml": "on: push\n",
+    "gen/parser.py": "Z = 3\n",
+    "assets/blob.dat": b"\0\1\2" * 100,
+    "data/huge.txt": "x" * 2048,
+    ".gitattributes": "third/** linguist-vendored\nmodels/** linguist-generated\n",
+}
+
+
+def scanned(path, report, rel_paths=None):
+    return sorted(os.path.relpath(p, path).replace(os.sep, "/") for p in scan_repo(path, report, rel_paths))
+
+
+def test_scan_skips_each_kind_of_noise(make_git_repo, monkeypatch):
+    monkeypatch.setattr(scan_policy, "SCAN_MAX_FILE_BYTES", 1024)
+    path = make_git_repo(FILES)
+    report = ScanReport()
+    # Directories that are only ranked lower for overview questions are still indexed.
+    assert scanned(path, report) == [".gitattributes", ".github/workflows/ci.yml", "gen/parser.py", "src/app.py"]
+    assert report.to_dict()["skipped_by_reason"] == {
+        "vendored_dir": 1,
+        "lockfile": 1,
+        "minified": 2,
+        "linguist_vendored": 1,
+        "linguist_generated": 1,
+        "binary": 1,
+        "too_large": 1,
+    }
+    assert report.examples["lockfile"] == ["package-lock.json"]
+
+
+def test_scan_walks_directories_without_git(tmp_path):
+    write_files(tmp_path, {"a.py": "A = 1\n", "node_modules/b.js": "b\n"})
+    report = ScanReport()
+    assert scanned(tmp_path, report) == ["a.py"]
+    assert report.skipped == {"vendored_dir": 1}
+
+
+def test_total_byte_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(scan_policy, "SCAN_MAX_TOTAL_BYTES", 25)
+    write_files(tmp_path, {"a.py": "a" * 10, "b.py": "b" * 10, "c.py": "c" * 10})
+    report = ScanReport()
+    assert len(scanned(tmp_path, report)) == 2
+    assert report.skipped == {"total_bytes_cap": 1}
+    assert report.bytes_kept == 20
+
+
+def test_incremental_scan_updates_the_existing_report(tmp_path, monkeypatch):
+    monkeypatch.setattr(scan_policy, "SCAN_MAX_TOTAL_BYTES", 30)
+    write_files(tmp_path, {"a.py": "a" * 10, "b.py": "b" * 10, "c.min.js": "c"})
+    report = ScanReport()
+    scanned(tmp_path, report)
+    assert (report.files_kept, report.bytes_kept) == (2, 20)
+
+    # a.py grows, c.min.js is deleted and d.py is new: the budget counts b.py too.
+    write_files(tmp_path, {"a.py": "a" * 12, "d.py": "d" * 10})
+    os.remove(tmp_path / "c.min.js")
+    for rel_path in ("a.py", "c.min.js", "d.py"):
+        report.forget(rel_path)
+    assert scanned(tmp_path, report, ["a.py", "d.py"]) == ["a.py"]
+    assert report.kept == {"a.py": 12, "b.py": 10}
+    assert report.bytes_kept == 22
+    assert report.to_dict()["skipped_by_reason"] == {"total_bytes_cap": 1}
+    assert report.examples == {"total_bytes_cap": ["d.py"]}
+
+
+def test_forget_unknown_path_is_a_no_op():
+    report = ScanReport()
+    report.keep("a.py", 5)
+    report.forget("missing.py")
+    assert report.to_dict()["files_kept"] == 1
@@ -0,0 +1,61 @@
+import os
+import time
+
+from app.utils.sessions import SessionStore
+
+
+def test_sessions_on_one_repo_share_its_index_but_not_their_history():
+    store = SessionStore()
+    first = store.create(store.acquire_repo("https://github.com/a/one"), "system")
+    second = store.create(store.acquire_repo("https://github.com/a/one"), "system")
+    other = store.create(store.acquire_repo("https://github.com/a/two"), "system")
+
+    assert first.repo is second.repo
+    assert other.repo is not first.repo and other.repo.path != first.repo.path
+    first.chat_history.add_turn("q", "a", "ctx")
+    assert len(first.chat_history) == 1 and len(second.chat_history) == 0
+    assert store.stats()["sessions"] == 3 and store.stats()["repos"] == 2
+
+
+def test_least_recently_used_session_goes_and_takes_its_unused_repo():
+    store = SessionStore(max_sessions=2)
+    old_repo = store.acquire_repo("https://github.com/a/old")
+    old = store.create(old_repo, "system")
+    store.release_repo(old_repo)
+    os.makedirs(old_repo.path)
+    kept_repo = store.acquire_repo("https://github.com/a/kept")
+    kept = store.create(kept_repo, "system")
+    store.release_repo(kept_repo)
+
+    store.get(old.id)
+    store.get(kept.id)
+    new_repo = store.acquire_repo("https://github.com/a/new")
+    store.create(new_repo, "system")
+
+    assert store.get(old.id) is None
+    assert store.get(kept.id) is kept
+    assert set(store.repos) == {"https://github.com/a/kept", "https://github.com/a/new"}
+    assert not os.path.exists(old_repo.path)
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(ttl_seconds=0.05)
+    repo = store.acquire_repo("https://github.com/a/idle")
+    session = store.create(repo, "system")
+    store.release_repo(repo)
+    time.sleep(0.1)
+    assert store.get(session.id) is None
+    assert store.repos == {}
+
+
+def test_a_pending_init_keeps_its_repo_without_sessions():
+    store = SessionStore(ttl_seconds=0)
+    repo = store.acquire_repo("https://github.com/a/pending")
+    store.get("anything")
+    assert store.repos == {"https://github.com/a/pending": repo}
+    # A second init for the same URL gets the same index, not a fresh one.
+    assert store.acquire_repo("https://github.com/a/pending") is repo
+    store.release_repo(repo)
+    store.release_repo(repo)
+    store.get("anything")
+    assert store.repos == {}
@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+
+from app.utils.startup import DEFERRED_MODULES, startup_report
+
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Every path the app writes to, as the environment variable that moves it.
+PATH_VARIABLES = (
+    "EMBEDDING_CACHE_PATH", "PARSED_TEXT_CACHE_PATH", "CHROMA_CODE_DIR", "CHROMA_NONCODE_DIR",
+    "MMAP_VECTOR_DIR", "INDEX_REGISTRY_DIR", "MIRROR_CACHE_DIR", "WORKSPACE_DIR",
+)
+
+
+def import_app(root):
+    """Imports the app in a fresh interpreter with every path under `root`, returning its startup report."""
+    env = {**os.environ, **{name: os.path.join(root, name.lower()) for name in PATH_VARIABLES}}
+    script = (
+        "import json, app.main as main; from app.utils.startup import startup_report; "
+        "print(json.dumps(startup_report(main.IMPORT_STARTED, main.IMPORT_FINISHED)))"
+    )
+    output = subprocess.run([sys.executable, "-c", script], cwd=BACKEND, env=env, check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def test_importing_the_app_touches_no_files_and_defers_heavy_modules(tmp_path):
+    report = import_app(str(tmp_path))
+    # Caches open on first use, not when a server or a chunking process imports them.
+    assert not os.path.exists(tmp_path / "embedding_cache_path")
+    assert not os.path.exists(tmp_path / "parsed_text_cache_path")
+    assert not os.path.exists(tmp_path / "index_registry_dir")
+    # The fake models and the mmap store need none of the heavy optional stacks.
+    assert report["deferred_modules"] == list(DEFERRED_MODULES)
+    assert 0 < report["import_seconds"]
+
+
+def test_import_time_ends_when_the_module_does():
+    report = startup_report(10.0, 12.5)
+    assert report["import_seconds"] == 2.5
+    assert report["modules_loaded"] > 0
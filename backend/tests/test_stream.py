@@ -0,0 +1,108 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+
+
+@pytest.fixture
+def session():
+    session = main.SESSIONS.create(SimpleNamespace(repo_url="file:///stream", ready=True), "system")
+    yield session
+    main.SESSIONS.sessions.pop(session.id, None)
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    """Replaces the model with one that streams two tokens and then hangs."""
+    log = []
+
+    async def stream(query, history, repo, k=None, use_cache=True):
+        try:
+            yield "Hello"
+            yield " there"
+            log.append("hanging")
+            await asyncio.sleep(60)
+        finally:
+            log.append("closed")
+
+    monkeypatch.setattr(main, "LLM_OUTPUT_STREAM", stream)
+    return log
+
+
+async def post_stream(session_id, disconnect_after):
+    """Drives the endpoint like a client that hangs up after `disconnect_after` tokens."""
+    body = json.dumps({"session_id": session_id, "query": "hi"}).encode()
+    tokens = 0
+    hang_up = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await hang_up.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal tokens
+        if message["type"] == "http.response.body" and b"event: token" in message.get("body", b""):
+            tokens += 1
+            if tokens >= disconnect_after:
+                hang_up.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/start-chat/stream", "raw_path": b"/start-chat/stream", "query_string": b"",
+        "headers": [(b"content-type", b"application/json")], "client": ("test", 1), "server": ("test", 80),
+    }
+    await asyncio.wait_for(main.app(scope, receive, send), timeout=10)
+    return tokens
+
+
+def test_a_client_hanging_up_mid_answer_releases_the_session(session, answers):
+    assert asyncio.run(post_stream(session.id, disconnect_after=2)) == 2
+    assert answers == ["hanging", "closed"]
+    assert not session.lock.locked()
+
+
+def test_a_finished_answer_releases_the_session(session, monkeypatch):
+    async def stream(query, history, repo, k=None, use_cache=True):
+        yield "Hello"
+
+    monkeypatch.setattr(main, "LLM_OUTPUT_STREAM", stream)
+    client = TestClient(main.app)
+    response = client.post("/start-chat/stream", json={"session_id": session.id, "query": "hi"})
+    assert 'event: done\ndata: {"message": "Hello"}' in response.text
+    assert not session.lock.locked()
+
+
+def test_a_busy_session_answers_409(session, monkeypatch):
+    async def busy(session):
+        return False
+
+    monkeypatch.setattr(main, "acquire_turn", busy)
+    response = TestClient(main.app).post("/start-chat/stream", json={"session_id": session.id, "query": "hi"})
+    assert response.status_code == 409
+
+
+def test_a_turn_cancelled_while_waiting_never_takes_the_lock(session):
+    async def scenario():
+        session.lock.acquire()
+        waiting = asyncio.ensure_future(main.acquire_turn(session, timeout=5))
+        await asyncio.sleep(0.1)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        session.lock.release()
+        assert await main.acquire_turn(session, timeout=0)
+        session.lock.release()
+        session.lock.acquire()
+        assert not await main.acquire_turn(session, timeout=0.1)
+        session.lock.release()
+
+    asyncio.run(scenario())
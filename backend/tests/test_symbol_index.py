@@ -0,0 +1,130 @@
+from app.utils.symbol_index import SymbolIndex, extract_symbols, read_lines
+
+
+PYTHON = '''import os
+
+
+class Loader:
+    @staticmethod
+    def load(path):
+        return parse(path)
+
+
+def parse(path):
+    with open(path) as f:
+        return f.read()
+'''
+
+JS = '''export function start(config) {
+  const server = createServer(config);
+  if (config.debug) {
+    log("debug");
+  }
+  return server;
+}
+
+class Router {
+  route(path) {
+    return match(path);
+  }
+}
+'''
+
+GO = '''type Config struct {
+	Port int
+}
+
+func (s *Server) Serve(c Config) error {
+	return listen(c.Port)
+}
+'''
+
+RUBY = '''class Greeter
+  def greet(name)
+    puts name
+  end
+end
+'''
+
+
+def spans(symbols):
+    return {symbol["name"]: (symbol["kind"], symbol["start_line"], symbol["end_line"], symbol["parent"]) for symbol in symbols}
+
+
+def test_python_symbols_and_spans():
+    symbols, calls = extract_symbols("a.py", PYTHON, ".py")
+    # A decorated definition starts at its first decorator.
+    assert spans(symbols) == {
+        "Loader": ("class", 4, 7, ""),
+        "load": ("method", 5, 7, "Loader"),
+        "parse": ("function", 10, 12, ""),
+    }
+    assert ("parse", 7) in calls
+    assert ("open", 11) in calls
+
+
+def test_brace_language_spans():
+    symbols, calls = extract_symbols("a.js", JS, ".js")
+    assert spans(symbols) == {
+        "start": ("function", 1, 7, ""),
+        "Router": ("class", 9, 13, ""),
+        "route": ("function", 10, 12, ""),
+    }
+    names = [name for name, _ in calls]
+    assert "createServer" in names and "match" in names
+    assert "if" not in names
+
+
+def test_go_types_and_methods():
+    assert spans(extract_symbols("a.go", GO, ".go")[0]) == {
+        "Config": ("struct", 1, 3, ""),
+        "Serve": ("function", 5, 7, ""),
+    }
+
+
+def test_ruby_blocks_end_at_their_end():
+    assert spans(extract_symbols("a.rb", RUBY, ".rb")[0]) == {
+        "Greeter": ("class", 1, 5, ""),
+        "greet": ("function", 2, 4, ""),
+    }
+
+
+def test_unparseable_or_unknown_files_have_no_symbols():
+    assert extract_symbols("a.py", "def broken(:\n", ".py") == ([], [])
+    assert extract_symbols("a.txt", "def x(): pass\n", ".txt") == ([], [])
+
+
+def build_index():
+    index = SymbolIndex()
+    index.add_file("a.py", *extract_symbols("a.py", PYTHON, ".py"))
+    index.add_file("b.py", *extract_symbols("b.py", "from a import parse\n\n\ndef main():\n    parse('x')\n", ".py"))
+    return index
+
+
+def test_lookup_and_query_matching():
+    index = build_index()
+    assert [symbol["file"] for symbol in index.lookup("parse")] == ["a.py"]
+    assert index.find_in_query("What does parse do in Loader?") == ["parse", "Loader"]
+    # Case-insensitive only for names longer than three characters.
+    assert index.find_in_query("how is the loader used") == ["Loader"]
+    assert index.find_in_query("what is main") == ["main"]
+
+
+def test_callers_name_their_enclosing_definition():
+    callers = build_index().callers("parse")
+    assert [(path, line, enclosing["name"]) for path, line, enclosing in callers] == [("a.py", 7, "load"), ("b.py", 5, "main")]
+
+
+def test_remove_file_drops_its_definitions_and_calls():
+    index = build_index()
+    index.remove_file("b.py")
+    assert index.lookup("main") == []
+    assert [path for path, _, _ in index.callers("parse")] == ["a.py"]
+    assert index.find_in_query("main") == []
+    index.remove_file("b.py")
+
+
+def test_read_lines_returns_the_span(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_text(PYTHON)
+    assert read_lines(path, 10, 12) == "def parse(path):\n    with open(path) as f:\n        return f.read()\n"
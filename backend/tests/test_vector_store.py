@@ -0,0 +1,98 @@
+import pytest
+
+from app.utils import vector_store
+from app.utils.fake_models import FakeEmbeddings
+from app.utils.vector_store import MmapVectorStore
+
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "kilo", "india", "juliet"]
+
+
+def add_files(store, words=WORDS):
+    store.add_texts(
+        [f"{word} {word} {word}" for word in words],
+        metadatas=[{"file_path": f"{word}.py"} for word in words],
+        ids=[f"{word}-0" for word in words],
+    )
+
+
+@pytest.fixture(params=["float16", "int8"])
+def store(request, tmp_path):
+    return MmapVectorStore("test", FakeEmbeddings(), root=str(tmp_path), dtype=request.param)
+
+
+def test_search_returns_the_matching_chunk_first(store):
+    add_files(store)
+    results = store.similarity_search_with_score("delta delta", k=3)
+    assert results[0][0].page_content == "delta delta delta"
+    assert results[0][0].metadata == {"file_path": "delta.py"}
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+    assert results[0][1] == pytest.approx(1.0, abs=0.02)
+
+
+def test_deleted_chunks_are_not_returned(store):
+    add_files(store)
+    store.delete_files(["delta.py"])
+    assert store.count() == len(WORDS) - 1
+    assert all(doc.metadata["file_path"] != "delta.py" for doc in store.similarity_search("delta", k=len(WORDS)))
+
+
+def test_readding_an_id_replaces_it(store):
+    add_files(store, ["alpha"])
+    store.add_texts(["zulu zulu"], metadatas=[{"file_path": "alpha.py"}], ids=["alpha-0"])
+    assert store.count() == 1
+    assert store.get(ids=["alpha-0"])["documents"] == ["zulu zulu"]
+
+
+def test_compaction_renumbers_rows_and_keeps_search_correct(store, tmp_path):
+    add_files(store)
+    store.delete_files([f"{word}.py" for word in WORDS[:4]])
+    # Four of ten rows dead is past COMPACT_DEAD_FRACTION, so the files were rewritten.
+    assert store.rows == len(WORDS) - 4
+    assert store.alive.all()
+    for word in WORDS[4:]:
+        doc, score = store.similarity_search_with_score(word, k=1)[0]
+        assert doc.metadata["file_path"] == f"{word}.py"
+    assert store.get(ids=["golf-0", "alpha-0"])["ids"] == ["golf-0"]
+
+    reopened = MmapVectorStore("test", FakeEmbeddings(), root=str(tmp_path))
+    assert reopened.dtype == store.dtype
+    assert reopened.similarity_search("kilo", k=1)[0].page_content == "kilo kilo kilo"
+
+
+def test_search_retries_when_compacted_mid_scan(store, monkeypatch):
+    add_files(store)
+    scan = MmapVectorStore._top_k
+    calls = []
+
+    def compacting_scan(self, query_vector, k):
+        result = scan(self, query_vector, k)
+        if not calls:
+            # Another request deletes files and compacts between the scan and the lookup.
+            self.delete_files([f"{word}.py" for word in WORDS[:4]])
+        calls.append(result)
+        return result
+
+    monkeypatch.setattr(MmapVectorStore, "_top_k", compacting_scan)
+    doc, score = store.similarity_search_with_score("kilo", k=1)[0]
+    assert len(calls) == 2
+    assert calls[0][2] != calls[1][2]
+    assert doc.page_content == "kilo kilo kilo"
+
+
+def test_rows_deleted_after_the_scan_keep_their_own_scores(store, monkeypatch):
+    monkeypatch.setattr(vector_store, "COMPACT_DEAD_FRACTION", 1.0)
+    add_files(store)
+    scan = MmapVectorStore._top_k
+
+    def deleting_scan(self, query_vector, k):
+        result = scan(self, query_vector, k)
+        self.delete_files(["alpha.py"])
+        return result
+
+    monkeypatch.setattr(MmapVectorStore, "_top_k", deleting_scan)
+    results = store.similarity_search_with_score("alpha bravo bravo", k=2)
+    # alpha's row is gone, so bravo keeps its own (best) score instead of taking alpha's place.
+    assert [doc.metadata["file_path"] for doc, _ in results] == ["bravo.py"]
+    assert results[0][1] == pytest.approx(store.similarity_search_with_score("alpha bravo bravo", k=1)[0][1])
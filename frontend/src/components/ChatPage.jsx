@@ -7,6 +7,7 @@ function ChatPage() {
   const [loading, setLoading] = useState(false);
   const [darkMode, setDarkMode] = useState(true);
   const messagesEndRef = useRef(null);
+  const sessionId = new URLSearchParams(window.location.search).get("session");
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -25,24 +26,57 @@ function ChatPage() {
 
   try {
     const BASE_URL = import.meta.env.VITE_API_URL;
-    const response = await fetch(`${BASE_URL}/start-chat`, {
+    const response = await fetch(`${BASE_URL}/start-chat/stream`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ query: input }),
+      body: JSON.stringify({ session_id: sessionId, query: input }),
     });
 
     if (!response.ok) {
       throw new Error(`Server returned ${response.status} ${response.statusText}`);
     }
 
-    const data = await response.json();
+    // The answer arrives as server-sent events: "token" events, then "done" or "error".
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let answer = "";
+    let started = false;
 
-    if (!data.message) {
-      throw new Error("Response does not contain a message.");
+    const showAnswer = (text) => {
+      if (!started) {
+        started = true;
+        setLoading(false);
+        setMessages((prev) => [...prev, { sender: "bot", text }]);
+      } else {
+        setMessages((prev) => [...prev.slice(0, -1), { sender: "bot", text }]);
+      }
+    };
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split("\n\n");
+      buffer = events.pop();
+
+      for (const raw of events) {
+        const event = raw.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] ?? "{}");
+        if (event === "token") {
+          answer += data.token;
+          showAnswer(answer);
+        } else if (event === "done") {
+          showAnswer(data.message);
+        } else if (event === "error") {
+          throw new Error(data.detail);
+        }
+      }
     }
 
-    const botMessage = { sender: "bot", text: data.message };
-    setMessages((prev) => [...prev, botMessage]);
+    if (!started) {
+      throw new Error("Response does not contain a message.");
+    }
   } catch (err) {
     setMessages((prev) => [
       ...prev,
@@ -5,6 +5,7 @@ import Spinner from "./Spinner"
 function HomePage() {
   const [githubUrl, setGithubUrl] = useState("");
   const [loading, setLoading] = useState(false);
+  const [progress, setProgress] = useState("");
 
   const handleSubmit = async () => {
     if (!githubUrl) return alert("Please enter a GitHub URL.");
@@ -30,14 +31,29 @@ function HomePage() {
 
       //console.log("API response:", data);
 
-      setTimeout(() => {
-        setLoading(false);
-        window.open("/chat", "_blank");
-      }, 5000);
+      // Ingestion runs as a background job; poll it until the repo is ready to chat.
+      while (true) {
+        const jobResponse = await fetch(`${BASE_URL}/jobs/${data.job_id}`);
+        const job = await jobResponse.json();
+        if (!jobResponse.ok) {
+          throw new Error(`Server returned ${jobResponse.status} ${job.detail}`);
+        }
+        if (job.status === "failed" || job.status === "cancelled") {
+          throw new Error(job.error.detail);
+        }
+        if (job.status === "done") break;
+        setProgress(`${job.phase}: ${job.files_chunked}/${job.files_found} files, ${job.chunks_embedded}/${job.chunks_total} chunks`);
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+      }
+
+      setLoading(false);
+      setProgress("");
+      window.open(`/chat?session=${encodeURIComponent(data.session_id)}`, "_blank");
     } catch (error) {
       //console.error(error);
       alert(`Error: ${error}`);
       setLoading(false);
+      setProgress("");
     }
   };
 
@@ -68,6 +84,7 @@ function HomePage() {
         <div className="loading-overlay">
           <Spinner />
           <p className="loading-text">Analyzing repository, please wait...</p>
+          {progress && <p className="loading-text">{progress}</p>}
         </div>
       )}
     </div>